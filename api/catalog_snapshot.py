@@ -0,0 +1,260 @@
+"""
+商品目录的二进制快照
+
+文件布局（小端）：
+
+    头部     magic(8) 版本(u32) 记录长度(u32) 记录数(u64) 字符串表偏移(u64)
+    记录区   按商品ID升序的定长记录：id(i64) price(f64) stock(i64) reserved(i64)
+             名称偏移(u32) 名称长度(u32) 分类偏移(u32) 分类长度(u32)
+    字符串表 UTF-8 字节，分类在写入时去重
+
+购物车只保存在内存中，重启后不存在，因此 reserved 总是写为 0：快照里的 stock 全部可售，
+否则被预占的库存在加载后再也无法释放。字段保留在记录中以保持格式稳定。
+
+加载时只 mmap 文件并校验头部，不解析任何记录，启动时间与商品数量无关。SnapshotCatalog 把快照包装成
+MutableMapping：记录在第一次访问时才解码并放入 overlay（调用方会原地修改拿到的 dict，
+同一商品必须始终返回同一个对象），新建的商品也写入 overlay，删除快照中的商品记在 deleted 里；
+快照文件本身只读，需要持久化当前目录时用 write_catalog() 重写整个文件。
+"""
+import mmap
+import os
+import struct
+import threading
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Union
+
+MAGIC = b"ECATSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<qdqqIIII")
+_ID = struct.Struct("<q")
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+class CatalogFile:
+    """只读的 mmap 快照文件，按下标或商品ID读取记录"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise CatalogFormatError(f"{self.path}: file too short")
+        magic, version, record_size, count, strings_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise CatalogFormatError(f"{self.path}: not a version {VERSION} catalog snapshot")
+        if strings_offset != HEADER.size + count * RECORD.size or strings_offset > len(self._mmap):
+            raise CatalogFormatError(f"{self.path}: truncated record area")
+        self.count = count
+        self._strings = strings_offset
+        self.first_id = self.id_at(0) if count else 0
+        self.last_id = self.id_at(count - 1) if count else 0
+
+    def id_at(self, index: int) -> int:
+        return _ID.unpack_from(self._mmap, HEADER.size + index * RECORD.size)[0]
+
+    def find(self, product_id: int) -> int:
+        """商品ID对应的下标，不存在时为 -1；ID 连续时一次读取即可命中，否则二分"""
+        if not self.count or product_id < self.first_id or product_id > self.last_id:
+            return -1
+        index = product_id - self.first_id
+        if index < self.count and self.id_at(index) == product_id:
+            return index
+        low, high = 0, min(index, self.count - 1)
+        while low <= high:
+            middle = (low + high) // 2
+            current = self.id_at(middle)
+            if current < product_id:
+                low = middle + 1
+            elif current > product_id:
+                high = middle - 1
+            else:
+                return middle
+        return -1
+
+    def decode(self, index: int) -> dict:
+        product_id, price, stock, reserved, name_offset, name_length, category_offset, category_length = \
+            RECORD.unpack_from(self._mmap, HEADER.size + index * RECORD.size)
+        return {
+            "id": product_id,
+            "name": self._string(name_offset, name_length),
+            "price": price,
+            "stock": stock,
+            "reserved": reserved,
+            "category": self._string(category_offset, category_length),
+        }
+
+    def ids(self) -> Iterator[int]:
+        for index in range(self.count):
+            yield self.id_at(index)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings + offset
+        return self._mmap[start:start + length].decode("utf-8")
+
+
+def write_catalog(path: Union[str, Path], products: Iterable[dict]) -> int:
+    """按商品ID升序写入快照，先写临时文件再原子替换；预占数量不写入（见模块说明），返回写入的记录数"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    strings = bytearray()
+    interned: Dict[str, tuple] = {}
+    count = 0
+    last_id = None
+    with open(temporary, "wb") as file:
+        file.write(bytes(HEADER.size))
+        for product in products:
+            if last_id is not None and product["id"] <= last_id:
+                raise ValueError("products must be sorted by id")
+            last_id = product["id"]
+            name = product["name"].encode("utf-8")
+            name_ref = (len(strings), len(name))
+            strings += name
+            category_ref = interned.get(product["category"])
+            if category_ref is None:
+                category = product["category"].encode("utf-8")
+                category_ref = interned[product["category"]] = (len(strings), len(category))
+                strings += category
+            file.write(RECORD.pack(product["id"], product["price"], product["stock"], 0,
+                                   *name_ref, *category_ref))
+            count += 1
+        if len(strings) > 0xFFFFFFFF:
+            raise ValueError("string table exceeds 4 GiB")
+        file.write(strings)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count, HEADER.size + count * RECORD.size))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    return count
+
+
+class SnapshotCatalog(MutableMapping):
+    """以 mmap 快照为底、overlay 记录修改的商品目录"""
+
+    def __init__(self, products: Optional[Dict[int, dict]] = None, base: Optional[CatalogFile] = None):
+        self._base = base
+        self._overlay: Dict[int, dict] = {}
+        self._deleted: Set[int] = set()
+        # overlay 中不在快照里的商品数
+        self._added = 0
+        self._lock = threading.Lock()
+        if products:
+            self.update(products)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "SnapshotCatalog":
+        return cls(base=CatalogFile(path))
+
+    def _in_base(self, product_id: int) -> bool:
+        return self._base is not None and self._base.find(product_id) >= 0
+
+    def __getitem__(self, product_id: int) -> dict:
+        product = self._overlay.get(product_id)
+        if product is not None:
+            return product
+        with self._lock:
+            product = self._overlay.get(product_id)
+            if product is not None:
+                return product
+            if self._base is None or product_id in self._deleted:
+                raise KeyError(product_id)
+            index = self._base.find(product_id)
+            if index < 0:
+                raise KeyError(product_id)
+            product = self._overlay[product_id] = self._base.decode(index)
+            return product
+
+    def get(self, product_id: int, default=None):
+        try:
+            return self[product_id]
+        except KeyError:
+            return default
+
+    def peek(self, product_id: int) -> Optional[dict]:
+        """读取商品但不放入 overlay，供导出等只读的全量遍历使用；返回的 dict 不能修改"""
+        product = self._overlay.get(product_id)
+        if product is not None or self._base is None or product_id in self._deleted:
+            return product
+        index = self._base.find(product_id)
+        return self._base.decode(index) if index >= 0 else None
+
+    def __setitem__(self, product_id: int, product: dict) -> None:
+        with self._lock:
+            if self._in_base(product_id):
+                self._deleted.discard(product_id)
+            elif product_id not in self._overlay:
+                self._added += 1
+            self._overlay[product_id] = product
+
+    def __delitem__(self, product_id: int) -> None:
+        with self._lock:
+            if self._in_base(product_id):
+                if product_id in self._deleted:
+                    raise KeyError(product_id)
+                self._deleted.add(product_id)
+                self._overlay.pop(product_id, None)
+            elif self._overlay.pop(product_id, None) is not None:
+                self._added -= 1
+            else:
+                raise KeyError(product_id)
+
+    def __contains__(self, product_id: object) -> bool:
+        if product_id in self._overlay:
+            return True
+        return isinstance(product_id, int) and product_id not in self._deleted and self._in_base(product_id)
+
+    def __iter__(self) -> Iterator[int]:
+        """先按ID顺序产出快照中的商品，再按插入顺序产出新建的商品"""
+        if self._base is not None:
+            for product_id in self._base.ids():
+                if product_id not in self._deleted:
+                    yield product_id
+        for product_id in list(self._overlay):
+            if not self._in_base(product_id) and product_id in self._overlay:
+                yield product_id
+
+    def __len__(self) -> int:
+        base = self._base.count if self._base is not None else 0
+        return base - len(self._deleted) + self._added
+
+    def clear(self) -> None:
+        """丢弃快照与全部修改"""
+        with self._lock:
+            self._base = None
+            self._overlay.clear()
+            self._deleted.clear()
+            self._added = 0
+
+    def iter_records(self) -> Iterator[dict]:
+        """只读遍历全部商品，不会把快照中的记录放入 overlay"""
+        for product_id in self:
+            product = self.peek(product_id)
+            if product is not None:
+                yield product
+
+    def max_key(self) -> int:
+        """当前最大的商品ID，没有商品时为 0"""
+        largest = max(self._overlay, default=0)
+        if self._base is not None:
+            for index in range(self._base.count - 1, -1, -1):
+                product_id = self._base.id_at(index)
+                if product_id <= largest:
+                    break
+                if product_id not in self._deleted:
+                    return product_id
+        return largest
+
+    def stats(self) -> dict:
+        return {
+            "snapshot": str(self._base.path) if self._base is not None else None,
+            "snapshot_records": self._base.count if self._base is not None else 0,
+            "materialized": len(self._overlay) - self._added,
+            "added": self._added,
+            "deleted": len(self._deleted),
+        }
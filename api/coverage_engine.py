@@ -0,0 +1,226 @@
+"""
+低开销的行覆盖率收集
+
+Python 3.12+ 使用 sys.monitoring（PEP 669）：只为项目内的代码对象开启 LINE 事件，
+每一行第一次执行后返回 DISABLE，之后该行不再产生任何回调。
+更早的版本回退到 sys.settrace，但只为项目内文件的帧安装行级追踪函数。
+
+可执行行由编译后的代码对象（co_lines）预先计算，注释、空行和续行不会计入分母。
+
+switch_context() 把之后执行的行记到另一个上下文下（例如每个测试用例一个上下文）；
+sys.monitoring 下切换时调用 restart_events()，让已经 DISABLE 的行在新上下文中重新上报一次。
+"""
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+_EXCLUDED_DIRS = ("site-packages", "venv", ".venv")
+
+_executable_cache: Dict[str, Tuple[int, int, FrozenSet[int]]] = {}
+
+
+def _code_lines(code) -> Iterable[int]:
+    for _, _, line in code.co_lines():
+        if line is not None:
+            yield line
+    for const in code.co_consts:
+        if hasattr(const, "co_lines"):
+            yield from _code_lines(const)
+
+
+def executable_lines(path: str) -> FrozenSet[int]:
+    """返回源文件中可执行的行号集合，按 (mtime, size) 缓存"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return frozenset()
+    cached = _executable_cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    try:
+        source = Path(path).read_text(encoding="utf-8")
+        code = compile(source, path, "exec", dont_inherit=True)
+    except (OSError, SyntaxError, ValueError):
+        lines: FrozenSet[int] = frozenset()
+    else:
+        # 模块代码对象的第 0 行是 RESUME 等伪指令
+        lines = frozenset(line for line in _code_lines(code) if line > 0)
+    _executable_cache[path] = (stat.st_mtime_ns, stat.st_size, lines)
+    return lines
+
+
+class CoverageData:
+    """文件路径 -> 已执行行号集合，可合并、可序列化后在进程间传递"""
+
+    def __init__(self, lines: Optional[Dict[str, Set[int]]] = None):
+        self.lines: Dict[str, Set[int]] = lines or {}
+
+    def add_lines(self, filename: str, lines: Iterable[int]) -> None:
+        self.lines.setdefault(filename, set()).update(lines)
+
+    def update(self, other: "CoverageData") -> None:
+        for filename, lines in other.lines.items():
+            self.add_lines(filename, lines)
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        return {filename: sorted(lines) for filename, lines in self.lines.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[int]]) -> "CoverageData":
+        return cls({filename: set(lines) for filename, lines in data.items()})
+
+    def summary(self) -> dict:
+        """按可执行行统计每个文件与整体的覆盖率"""
+        files = {}
+        total_executable = total_executed = 0
+        for filename in sorted(self.lines):
+            executable = executable_lines(filename)
+            if not executable:
+                continue
+            executed = len(self.lines[filename] & executable)
+            total_executable += len(executable)
+            total_executed += executed
+            files[filename] = {
+                "executable": len(executable),
+                "executed": executed,
+                "percent": round(executed / len(executable) * 100, 2),
+            }
+        percent = round(total_executed / total_executable * 100, 2) if total_executable else None
+        return {"percent": percent, "executable": total_executable, "executed": total_executed, "files": files}
+
+
+class CoverageCollector:
+    """收集 source_root 下文件的行覆盖率，start()/stop() 之间的执行会被记录"""
+
+    TOOL_NAME = "ecommerce-coverage"
+
+    def __init__(self, source_root: Path = PROJECT_ROOT):
+        self.source_root = str(Path(source_root).resolve()) + os.sep
+        self._tracked: Dict[str, bool] = {}
+        self._contexts: Dict[Optional[str], Dict[str, Set[int]]] = {None: {}}
+        # 当前上下文的 文件 -> 行号集合
+        self._lines: Dict[str, Set[int]] = self._contexts[None]
+        self._tool_id: Optional[int] = None
+        self._previous_trace = None
+        self.use_monitoring = hasattr(sys, "monitoring")
+
+    def _should_track(self, filename: str) -> bool:
+        tracked = self._tracked.get(filename)
+        if tracked is None:
+            # "<string>"、"<attrs generated ...>" 等动态生成的代码没有源文件，realpath 会把它们拼到当前目录下
+            path = os.path.realpath(filename)
+            tracked = not filename.startswith("<") and path.startswith(self.source_root) and not any(
+                part in _EXCLUDED_DIRS for part in Path(path).parts
+            )
+            self._tracked[filename] = tracked
+        return tracked
+
+    # ---------- 启停 ----------
+
+    # 收集器可以嵌套使用（例如测试任务中运行本模块自己的测试），停止时恢复外层的追踪函数
+
+    def start(self) -> None:
+        if self.use_monitoring:
+            self._start_monitoring()
+        else:
+            self._previous_trace = (sys.gettrace(), threading.gettrace())
+            threading.settrace(self._global_trace)
+            sys.settrace(self._global_trace)
+
+    def stop(self) -> None:
+        if self.use_monitoring:
+            self._stop_monitoring()
+        elif self._previous_trace is not None:
+            previous, previous_threading = self._previous_trace
+            self._previous_trace = None
+            sys.settrace(previous)
+            threading.settrace(previous_threading)
+
+    def switch_context(self, name: Optional[str]) -> None:
+        """之后执行的行记到上下文 name 下，None 为默认上下文"""
+        self._lines = self._contexts.setdefault(name, {})
+        if self.use_monitoring and self._tool_id is not None:
+            sys.monitoring.restart_events()
+
+    @staticmethod
+    def _normalize(contexts: Iterable[Dict[str, Set[int]]]) -> CoverageData:
+        lines: Dict[str, Set[int]] = {}
+        for context in contexts:
+            for filename, hits in context.items():
+                lines.setdefault(os.path.realpath(filename), set()).update(hits)
+        return CoverageData(lines)
+
+    @property
+    def data(self) -> CoverageData:
+        """所有上下文合并后的覆盖率"""
+        return self._normalize(self._contexts.values())
+
+    def context_data(self) -> Dict[Optional[str], CoverageData]:
+        return {name: self._normalize([lines]) for name, lines in self._contexts.items()}
+
+    # ---------- sys.monitoring（3.12+） ----------
+
+    def _start_monitoring(self) -> None:
+        monitoring = sys.monitoring
+        # COVERAGE_ID 被占用时使用其他空闲的工具 ID（0-5 为 CPython 预留给工具的编号）
+        free_ids = [tool_id for tool_id in range(6) if monitoring.get_tool(tool_id) is None]
+        if not free_ids:
+            raise RuntimeError("no free sys.monitoring tool id")
+        tool_id = monitoring.COVERAGE_ID if monitoring.COVERAGE_ID in free_ids else free_ids[0]
+        monitoring.use_tool_id(tool_id, self.TOOL_NAME)
+        self._tool_id = tool_id
+        monitoring.register_callback(tool_id, monitoring.events.PY_START, self._on_py_start)
+        monitoring.register_callback(tool_id, monitoring.events.LINE, self._on_line)
+        monitoring.set_events(tool_id, monitoring.events.PY_START)
+        monitoring.restart_events()
+
+    def _stop_monitoring(self) -> None:
+        monitoring = sys.monitoring
+        tool_id = self._tool_id
+        if tool_id is None:
+            return
+        monitoring.set_events(tool_id, 0)
+        clear_tool_id = getattr(monitoring, "clear_tool_id", None)
+        if clear_tool_id is not None:
+            clear_tool_id(tool_id)
+        monitoring.register_callback(tool_id, monitoring.events.PY_START, None)
+        monitoring.register_callback(tool_id, monitoring.events.LINE, None)
+        monitoring.free_tool_id(tool_id)
+        self._tool_id = None
+
+    def _on_py_start(self, code, instruction_offset):
+        if self._should_track(code.co_filename):
+            self._lines.setdefault(code.co_filename, set())
+            sys.monitoring.set_local_events(self._tool_id, code, sys.monitoring.events.LINE)
+        return sys.monitoring.DISABLE
+
+    def _on_line(self, code, line_number):
+        lines = self._lines.get(code.co_filename)
+        if lines is None:
+            # 之前的收集器为该代码对象开启的本地事件可能仍然有效
+            if not self._should_track(code.co_filename):
+                return sys.monitoring.DISABLE
+            lines = self._lines.setdefault(code.co_filename, set())
+        lines.add(line_number)
+        return sys.monitoring.DISABLE
+
+    # ---------- sys.settrace 回退 ----------
+
+    def _global_trace(self, frame, event, arg):
+        filename = frame.f_code.co_filename
+        if not self._should_track(filename):
+            return None
+
+        # 每次都从当前上下文取集合：生成器等帧可能跨越上下文切换
+        def _local_trace(frame, event, arg):
+            if event == "line":
+                lines = self._lines.get(filename)
+                if lines is None:
+                    lines = self._lines.setdefault(filename, set())
+                lines.add(frame.f_lineno)
+            return _local_trace
+
+        return _local_trace
@@ -0,0 +1,316 @@
+"""
+覆盖率 HTML 报告
+
+为每个源文件生成逐行标注的页面：可执行行按 CoverageData 标记为已执行/未执行，
+分支数据由字节码中的条件跳转静态推出——每个条件跳转的两个去向各对应一行，
+去向行执行过即视为该分支被走过（近似的分支覆盖，不需要在运行时记录行与行之间的跳转）。
+
+报告增量生成：manifest.json 记录每个页面的指纹（源码 mtime/size 与已执行行），
+指纹不变的页面不会重新渲染。只有完整运行整个套件后（prune=True）才删除已不在数据中的文件的页面；
+只运行了部分用例时数据中缺少的文件保留上次的页面与统计。
+"""
+import dis
+import hashlib
+import html
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from api.coverage_engine import PROJECT_ROOT, CoverageData, executable_lines
+
+REPORT_VERSION = 2
+FILES_DIR = "files"
+MANIFEST_NAME = "manifest.json"
+
+_branch_cache: Dict[str, Tuple[int, int, Dict[int, FrozenSet[int]]]] = {}
+
+_STYLE = """
+body { font-family: sans-serif; margin: 20px; }
+table { border-collapse: collapse; }
+th, td { padding: 2px 8px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+.source td { text-align: left; font-family: monospace; white-space: pre; padding: 0 8px; }
+.source td.num { text-align: right; color: #999; }
+.run { background: #dfd; }
+.miss { background: #fdd; }
+.partial { background: #ffd; }
+pre { background: #f5f5f5; padding: 8px; overflow-x: auto; }
+"""
+
+
+# ---------- 静态分支分析 ----------
+
+def _code_objects(code) -> Iterator:
+    yield code
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            yield from _code_objects(const)
+
+
+def _is_conditional_jump(opname: str) -> bool:
+    opname = opname.replace("INSTRUMENTED_", "")
+    return "_IF_" in opname or opname == "FOR_ITER"
+
+
+def _next_line(instructions: List[dis.Instruction], lines: List[Optional[int]], index: int,
+               source_line: int) -> Optional[int]:
+    """从第 index 条指令开始顺序向后，找到第一条位于其他行的指令所在行"""
+    for position in range(index, len(instructions)):
+        line = lines[position]
+        if line is not None and line > 0 and line != source_line:
+            return line
+    return None
+
+
+def _code_branches(code) -> Dict[int, Set[int]]:
+    instructions = list(dis.get_instructions(code))
+    lines: List[Optional[int]] = []
+    for instruction in instructions:
+        positions = getattr(instruction, "positions", None)
+        if positions is not None:
+            lines.append(positions.lineno)
+        else:  # Python 3.10
+            lines.append(instruction.starts_line if instruction.starts_line else (lines[-1] if lines else None))
+    index_by_offset = {instruction.offset: index for index, instruction in enumerate(instructions)}
+    branches: Dict[int, Set[int]] = {}
+    for index, instruction in enumerate(instructions):
+        source_line = lines[index]
+        if not source_line or not _is_conditional_jump(instruction.opname):
+            continue
+        target = index_by_offset.get(instruction.argval)
+        destinations = {
+            _next_line(instructions, lines, index + 1, source_line),
+            _next_line(instructions, lines, target, source_line) if target is not None else None,
+        }
+        destinations.discard(None)
+        if destinations:
+            branches.setdefault(source_line, set()).update(destinations)
+    return branches
+
+
+def static_branches(path: str) -> Dict[int, FrozenSet[int]]:
+    """返回 {条件跳转所在行: 可能的去向行}，只保留至少两个去向的行，按 (mtime, size) 缓存"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {}
+    cached = _branch_cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    try:
+        code = compile(Path(path).read_text(encoding="utf-8"), path, "exec", dont_inherit=True)
+    except (OSError, SyntaxError, ValueError):
+        branches: Dict[int, FrozenSet[int]] = {}
+    else:
+        merged: Dict[int, Set[int]] = {}
+        for code_object in _code_objects(code):
+            for line, destinations in _code_branches(code_object).items():
+                merged.setdefault(line, set()).update(destinations)
+        branches = {line: frozenset(destinations) for line, destinations in merged.items() if len(destinations) > 1}
+    _branch_cache[path] = (stat.st_mtime_ns, stat.st_size, branches)
+    return branches
+
+
+# ---------- 单个文件 ----------
+
+def _page_name(relative_path: str) -> str:
+    # api/a_b.py 与 api_a/b.py 替换分隔符后相同，加上路径哈希区分
+    digest = hashlib.sha1(relative_path.encode("utf-8")).hexdigest()[:8]
+    return f"{relative_path.replace('/', '_').replace('.', '_')}_{digest}.html"
+
+
+def _relative(filename: str, root: Path) -> str:
+    relative = os.path.relpath(filename, root)
+    if relative.startswith(".."):
+        return filename
+    return Path(relative).as_posix()
+
+
+def analyze_file(filename: str, executed: Set[int]) -> dict:
+    """统计单个文件的语句与分支覆盖"""
+    executable = executable_lines(filename)
+    branches = static_branches(filename)
+    branch_total = branch_covered = 0
+    partial: Dict[int, List[int]] = {}
+    for line, destinations in branches.items():
+        branch_total += len(destinations)
+        if line not in executed:
+            # 分支所在行没有执行过时，所有去向都计为未覆盖，但不单独标注
+            continue
+        missed = sorted(destination for destination in destinations if destination not in executed)
+        branch_covered += len(destinations) - len(missed)
+        if missed:
+            partial[line] = missed
+    hit = executed & executable
+    return {
+        "statements": len(executable),
+        "executed": len(hit),
+        "missing": sorted(executable - hit),
+        "percent": round(len(hit) / len(executable) * 100, 2) if executable else None,
+        "branches": branch_total,
+        "branches_covered": branch_covered,
+        "partial": partial,
+    }
+
+
+def _render_file(relative_path: str, filename: str, executed: Set[int], stats: dict) -> str:
+    executable = executable_lines(filename)
+    try:
+        source_lines = Path(filename).read_text(encoding="utf-8").splitlines()
+    except OSError:
+        source_lines = []
+    rows = []
+    for number, text in enumerate(source_lines, start=1):
+        css = title = ""
+        if number in stats["partial"]:
+            css = "partial"
+            title = "未走到的分支去向: " + ", ".join(str(line) for line in stats["partial"][number])
+        elif number in executable:
+            css = "run" if number in executed else "miss"
+        rows.append(
+            f'<tr class="{css}" title="{html.escape(title)}"><td class="num">{number}</td>'
+            f"<td>{html.escape(text)}</td></tr>"
+        )
+    percent = stats["percent"] if stats["percent"] is not None else "-"
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(relative_path)}</title><style>{_STYLE}</style></head>
+<body>
+<p><a href="../index.html">返回汇总</a></p>
+<h1>{html.escape(relative_path)}</h1>
+<p>语句 {stats["executed"]}/{stats["statements"]}（{percent}%），分支 {stats["branches_covered"]}/{stats["branches"]}</p>
+<table class="source">
+{chr(10).join(rows)}
+</table>
+</body></html>
+"""
+
+
+def _fingerprint(filename: str, executed: Set[int]) -> str:
+    try:
+        stat = os.stat(filename)
+        source_key = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except OSError:
+        source_key = "missing"
+    digest = hashlib.sha256(f"{REPORT_VERSION}:{source_key}:".encode())
+    digest.update(",".join(map(str, sorted(executed))).encode())
+    return digest.hexdigest()
+
+
+# ---------- 整体报告 ----------
+
+def _load_manifest(path: Path) -> Dict[str, dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != REPORT_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def generate_html_report(coverage: Optional[CoverageData], output_dir: Path, stdout: str = "", stderr: str = "",
+                         root: Path = PROJECT_ROOT, prune: bool = True) -> dict:
+    """
+    生成 index.html 与每个文件的标注页面，只重新渲染数据有变化的文件
+
+    prune=False 时数据中没有的文件沿用上次的页面，用于只运行了部分用例的情况。
+    返回本次生成的统计：渲染/跳过/删除的页面数与耗时。
+    """
+    started = time.perf_counter()
+    output_dir = Path(output_dir)
+    files_dir = output_dir / FILES_DIR
+    files_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    previous = _load_manifest(manifest_path)
+
+    lines = coverage.lines if coverage is not None else {}
+    entries: Dict[str, dict] = {}
+    rendered = skipped = 0
+    for filename in sorted(lines):
+        executed = lines[filename]
+        if not executable_lines(filename):
+            continue
+        relative_path = _relative(filename, root)
+        page = _page_name(relative_path)
+        fingerprint = _fingerprint(filename, executed)
+        cached = previous.get(relative_path)
+        if cached is not None and cached["fingerprint"] == fingerprint and (files_dir / page).exists():
+            entries[relative_path] = cached
+            skipped += 1
+            continue
+        stats = analyze_file(filename, executed)
+        (files_dir / page).write_text(_render_file(relative_path, filename, executed, stats), encoding="utf-8")
+        entries[relative_path] = {
+            "fingerprint": fingerprint,
+            "page": page,
+            "statements": stats["statements"],
+            "executed": stats["executed"],
+            "branches": stats["branches"],
+            "branches_covered": stats["branches_covered"],
+        }
+        rendered += 1
+
+    removed = 0
+    if prune:
+        # 按目录清理而不是按 manifest：版本升级后旧 manifest 被丢弃，其中的页面也要删除
+        pages = {entry["page"] for entry in entries.values()}
+        for page in files_dir.glob("*.html"):
+            if page.name not in pages:
+                page.unlink(missing_ok=True)
+                removed += 1
+    else:
+        for relative_path, entry in previous.items():
+            if relative_path not in entries and (files_dir / entry["page"]).exists():
+                entries[relative_path] = entry
+
+    _write_index(output_dir, entries, stdout, stderr)
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"version": REPORT_VERSION, "files": entries}, ensure_ascii=False),
+                        encoding="utf-8")
+    os.replace(tmp_path, manifest_path)
+    return {
+        "files": len(entries),
+        "rendered": rendered,
+        "skipped": skipped,
+        "removed": removed,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def _percent(part: int, total: int) -> str:
+    return f"{part / total * 100:.2f}%" if total else "-"
+
+
+def _write_index(output_dir: Path, entries: Dict[str, dict], stdout: str, stderr: str) -> None:
+    statements = sum(entry["statements"] for entry in entries.values())
+    executed = sum(entry["executed"] for entry in entries.values())
+    branches = sum(entry["branches"] for entry in entries.values())
+    branches_covered = sum(entry["branches_covered"] for entry in entries.values())
+    rows = [
+        f'<tr><td><a href="{FILES_DIR}/{entry["page"]}">{html.escape(path)}</a></td>'
+        f'<td>{entry["statements"]}</td><td>{entry["statements"] - entry["executed"]}</td>'
+        f'<td>{_percent(entry["executed"], entry["statements"])}</td>'
+        f'<td>{entry["branches_covered"]}/{entry["branches"]}</td>'
+        f'<td>{_percent(entry["branches_covered"], entry["branches"])}</td></tr>'
+        for path, entry in sorted(entries.items())
+    ]
+    (output_dir / "index.html").write_text(
+        f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>测试覆盖率</title><style>{_STYLE}</style></head>
+<body>
+<h1>测试覆盖率</h1>
+<p>覆盖率: {_percent(executed, statements) if entries else '未知'}（语句 {executed}/{statements}，分支 {branches_covered}/{branches}）</p>
+<table>
+<tr><th>文件</th><th>语句</th><th>未执行</th><th>覆盖率</th><th>分支</th><th>分支覆盖率</th></tr>
+{chr(10).join(rows)}
+</table>
+<h2>Pytest 输出</h2>
+<pre>{html.escape(stdout)}</pre>
+<h2>Pytest 错误</h2>
+<pre>{html.escape(stderr)}</pre>
+</body></html>
+""",
+        encoding="utf-8",
+    )
@@ -0,0 +1,139 @@
+"""
+诊断接口：锁竞争分析、调用栈采样、测试面板与测试任务
+
+这些接口只在排查问题或运行测试面板时使用，测试运行器还会引入多进程、覆盖率与用例选择等模块。
+ecommerce_api 在应用启动（lifespan）时才导入本模块并挂载 router，单纯 import ecommerce_api
+（例如离线测试客户端与每次测试收集）不必付出这部分开销。
+"""
+import json
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from api.ecommerce_api import COVERAGE_DIR, STATIC_DIR, ensure_admin, get_current_user
+from api.lock_profiler import DEFAULT_CAPACITY, PROFILER
+from api.sampling_profiler import SAMPLER, to_collapsed
+from api.test_runner import JobLimitError, PytestJobManager
+
+router = APIRouter()
+
+
+class LockProfileConfig(BaseModel):
+    enabled: bool = Field(..., description="开启时清空已有数据并重新记录，关闭时保留数据")
+    capacity: int = Field(default=DEFAULT_CAPACITY, ge=1, le=10000, description="每把锁保留的热点键数量")
+
+
+@router.get("/api/admin/lock-profile")
+def get_lock_profile(limit: Annotated[Optional[int], Query(ge=1)] = None,
+                     current_user: dict = Depends(get_current_user)):
+    """查看锁竞争分析结果：按锁名列出累计等待时间最长的键（商品 ID）（仅管理员）"""
+    ensure_admin(current_user)
+    return PROFILER.snapshot(limit)
+
+
+@router.post("/api/admin/lock-profile")
+def configure_lock_profile(config: LockProfileConfig, current_user: dict = Depends(get_current_user)):
+    """开启或关闭锁竞争分析（仅管理员）"""
+    ensure_admin(current_user)
+    if config.enabled:
+        PROFILER.start(config.capacity)
+    else:
+        PROFILER.stop()
+    return PROFILER.snapshot(0)
+
+
+@router.get("/api/admin/profile")
+def sample_profile(seconds: Annotated[float, Query(gt=0, le=60)] = 5.0,
+                   interval_ms: Annotated[float, Query(ge=1, le=1000)] = 10.0,
+                   format: Annotated[str, Query(pattern="^(json|collapsed)$")] = "json",
+                   include_idle: Annotated[bool, Query()] = False,
+                   current_user: dict = Depends(get_current_user)):
+    """
+    对所有线程做 seconds 秒的调用栈采样（仅管理员）
+
+    format=collapsed 返回 flamegraph.pl 可用的折叠栈文本；默认 JSON 中还包含按自身/累计样本数排序的热点函数。
+    """
+    ensure_admin(current_user)
+    result = SAMPLER.run(seconds, interval_ms / 1000, include_idle)
+    if result is None:
+        raise HTTPException(status_code=409, detail="已有采样正在进行")
+    if format == "collapsed":
+        return Response(to_collapsed(result), media_type="text/plain; charset=utf-8")
+    return result
+
+
+@router.get("/test_dashboard")
+def serve_test_dashboard():
+    dashboard_path = STATIC_DIR / "test_dashboard.html"
+    if dashboard_path.exists():
+        return FileResponse(dashboard_path)
+    return HTMLResponse("<h1>Test dashboard not found</h1>", status_code=404)
+
+
+# ========== 测试任务接口 ==========
+# pytest 在独立的 worker 进程中运行，接口只负责提交任务、查询结果与推送进度
+test_jobs = PytestJobManager(COVERAGE_DIR)
+
+
+def _get_test_job_or_404(job_id: str):
+    job = test_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="测试任务不存在")
+    return job
+
+
+@router.post("/api/tests/run", status_code=status.HTTP_202_ACCEPTED)
+def run_tests(workers: Annotated[Optional[int], Query(ge=1)] = None,
+              incremental: Annotated[bool, Query()] = True):
+    """
+    提交一次 pytest + 覆盖率任务，立即返回任务 ID
+
+    workers 指定并行的 worker 进程数，默认按 CPU 核数；incremental 为真时只运行受源码修改影响的用例，
+    没有历史覆盖映射等情况下自动回退为全量运行。已有任务在运行时返回 409。
+    """
+    try:
+        job = test_jobs.submit(workers=workers or test_jobs.max_workers, incremental=incremental)
+    except JobLimitError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "workers": job.workers,
+        "selection": job.selection,
+        "events": f"/api/tests/jobs/{job.id}/events",
+        "result": f"/api/tests/jobs/{job.id}",
+    }
+
+
+@router.get("/api/tests/jobs")
+def list_test_jobs():
+    return {"jobs": [job.to_dict(include_result=False) for job in test_jobs.list_jobs()]}
+
+
+@router.get("/api/tests/jobs/{job_id}")
+def get_test_job(job_id: str):
+    """查询任务状态、每个用例的结果与最终输出"""
+    return _get_test_job_or_404(job_id).to_dict()
+
+
+async def _sse_test_events(job_id: str, start: int):
+    # 异步生成器直接在事件循环中等待进度，打开的测试面板不占用线程池
+    async for event in test_jobs.aiter_events(job_id, start=start):
+        if event is None:
+            yield ": keep-alive\n\n"
+            continue
+        yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@router.get("/api/tests/jobs/{job_id}/events")
+def stream_test_job(job_id: str, last_event_id: Annotated[Optional[str], Header()] = None):
+    """以 SSE 推送任务进度，断线重连时根据 Last-Event-ID 续传"""
+    _get_test_job_or_404(job_id)
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        _sse_test_events(job_id, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -1,51 +1,112 @@
+import inspect
+import itertools
 import os
-from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
+from typing import Annotated, Any, Callable, List, Dict, Literal, Optional, Tuple
 from datetime import datetime, timedelta
 from threading import Lock
 
-import pytest
-from pydantic import BaseModel, Field
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.responses import FileResponse, HTMLResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.staticfiles import StaticFiles
 import base64
 import hashlib
 import hmac
-from contextlib import redirect_stdout, redirect_stderr
-import html
-import io
 import json
 import time
 from pathlib import Path
-from trace import Trace
+
+from api import json_response
+from api.json_response import FastJSONResponse
+from api.catalog_snapshot import SnapshotCatalog, write_catalog
+from api.event_stream import EventRing, format_sse, resume_position
+from api.export import SnapshotStore, gzip_stream, ndjson_stream
+from api.flash_sale import DEFAULT_SHARDS, SaleClosed, ShardedStock
+from api.group_commit import GroupCommitQueue, QueueClosed
+from api.idempotency import IdempotencyMismatch, IdempotencyStore, fingerprint
+from api.lock_profiler import PROFILER
+from api.low_stock import LowStockMonitor
+from api.metrics import AUTH_DECODE, REGISTRY, InstrumentedLock, MetricsMiddleware
+from api.order_archive import OrderArchive
+from api.response_cache import ResponseCache
+from api.search_index import SearchIndex
+from api.sorted_index import SortedIndex
 
 """
 电商测试API，实现基础的商品、购物车、促销和订单接口1
 实现简单的鉴权与鉴权检查，防止用户越权访问其他用户的资源，同时限制敏感操作例如商品管理，仅管理员可用
 """
-app = FastAPI(title="电商测试API")
-
 STATIC_DIR = Path(__file__).parent.parent / "assets"
 COVERAGE_DIR = Path(__file__).parent.parent / "coverage_html"
-STATIC_DIR.mkdir(parents=True, exist_ok=True)
-COVERAGE_DIR.mkdir(parents=True, exist_ok=True)
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-app.mount("/coverage", StaticFiles(directory=COVERAGE_DIR, html=True), name="coverage")
+
+
+def install_diagnostics(application: FastAPI) -> None:
+    """创建静态目录并挂载诊断接口（锁分析、采样、测试任务），见 api/diagnostics.py；重复调用无副作用"""
+    if getattr(application.state, "diagnostics_installed", False):
+        return
+    STATIC_DIR.mkdir(parents=True, exist_ok=True)
+    COVERAGE_DIR.mkdir(parents=True, exist_ok=True)
+    from api import diagnostics
+
+    application.include_router(diagnostics.router)
+    application.state.diagnostics_installed = True
+
+
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    # import 本模块不创建目录、不导入诊断接口，这些推迟到服务启动
+    install_diagnostics(application)
+    yield
+
+
+app = FastAPI(title="电商测试API", default_response_class=FastJSONResponse, lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+# check_dir=False：目录在启动时才创建，挂载本身不访问文件系统
+app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+app.mount("/coverage", StaticFiles(directory=COVERAGE_DIR, html=True, check_dir=False), name="coverage")
 SECRET_KEY = "test-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 24*60
 bearer_scheme = HTTPBearer(auto_error=False)
-global_lock = Lock()
-product_locks: Dict[int, Lock] = {}
+# 全局锁与商品锁记录等待/持有时间，见 /api/metrics
+global_lock = InstrumentedLock("global")
+product_locks: Dict[int, InstrumentedLock] = {}
 product_lock_manager = Lock()
+# 购物车级锁：所有修改购物车的路径都要持有；加锁顺序为 global_lock -> 购物车锁 -> 商品锁
+cart_locks: Dict[int, InstrumentedLock] = {}
+order_id_lock = Lock()
 
 BASE_PRODUCTS: Dict[int, dict] = {
     1: {"id": 1, "name": "iPhone 15", "price": 5999.0, "stock": 50, "reserved": 0, "category": "电子产品"},
     2: {"id": 2, "name": "MacBook Pro", "price": 12999.0, "stock": 30, "reserved": 0, "category": "电子产品"},
     3: {"id": 3, "name": "AirPods Pro", "price": 1899.0, "stock": 100, "reserved": 0, "category": "配件"},
 }
-products_db: Dict[int, dict] = {pid: product.copy() for pid, product in BASE_PRODUCTS.items()}
+# 商品目录：配置了 ECOMMERCE_CATALOG_SNAPSHOT 且文件存在时直接 mmap 加载，记录在第一次访问时才解码，
+# 见 api/catalog_snapshot.py；未配置时不读写任何快照，测试始终从 BASE_PRODUCTS 开始
+_catalog_snapshot_env = os.environ.get("ECOMMERCE_CATALOG_SNAPSHOT")
+CATALOG_SNAPSHOT_PATH: Optional[Path] = Path(_catalog_snapshot_env) if _catalog_snapshot_env else None
+if CATALOG_SNAPSHOT_PATH is not None and CATALOG_SNAPSHOT_PATH.exists():
+    products_db = SnapshotCatalog.open(CATALOG_SNAPSHOT_PATH)
+else:
+    products_db = SnapshotCatalog({pid: product.copy() for pid, product in BASE_PRODUCTS.items()})
+catalog_snapshot_lock = Lock()
+# 商品名称与分类的倒排索引，商品增删改时增量维护，见 api/search_index.py
+search_index = SearchIndex()
+# 价格与库存的有序索引，随 _product_changed 更新，见 api/sorted_index.py
+sorted_indexes: Dict[str, SortedIndex] = {field: SortedIndex(field) for field in ("price", "stock")}
+# 两类索引在第一次查询时才建立（见 _ensure_indexes），启动时不遍历商品目录
+_indexes_ready = False
+# 设置了阈值的商品可用库存跌破阈值时发布事件，见 api/low_stock.py
+low_stock_events = EventRing(capacity=1024)
+low_stock = LowStockMonitor(low_stock_events)
+# 商品、库存与订单的变更事件，下游服务按序号订阅 GET /api/events，不再轮询商品列表
+CHANGE_FEED_CAPACITY = int(os.environ.get("ECOMMERCE_CHANGE_FEED_CAPACITY", "10000"))
+CHANGE_FEED_TOPICS = ("product", "stock", "order")
+change_feed = EventRing(capacity=CHANGE_FEED_CAPACITY)
 
 carts_db: Dict[int, dict] = {}
 promotions_db: Dict[int, dict] = {
@@ -54,6 +115,33 @@ promotions_db: Dict[int, dict] = {
 }
 orders_db: Dict[int, dict] = {}
 order_counter = 1
+# 创建超过 ORDER_ARCHIVE_AGE 秒的订单可移到磁盘上的压缩分段，get_order 与导出透明读取，见 api/order_archive.py
+ORDER_ARCHIVE_AGE = int(os.environ.get("ECOMMERCE_ORDER_ARCHIVE_AGE", str(7 * 24 * 3600)))
+order_archive = OrderArchive(os.environ.get("ECOMMERCE_ORDER_ARCHIVE_DIR"),
+                             encode=lambda order: json_response.dumps(order))
+# 导出用的写时复制快照：修改、删除或创建商品之前先调用 product_snapshots.preserve()，见 api/export.py
+product_snapshots = SnapshotStore(products_db)
+order_snapshots = SnapshotStore(orders_db, fallback=order_archive.get)
+EXPORT_CHUNK_SIZE = 1000
+# 开启秒杀模式的商品，库存由分片计数管理，见 api/flash_sale.py
+flash_sales: Dict[int, ShardedStock] = {}
+# 开启组提交后下单请求由单个提交线程按批处理，见 api/group_commit.py
+checkout_pipeline: Optional[GroupCommitQueue] = None
+CHECKOUT_BATCH_SIZE = REGISTRY.histogram("checkout_batch_size", "组提交每批的订单数", (),
+                                         buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+# 下单与加购的 Idempotency-Key 记录，见 api/idempotency.py
+idempotency_store = IdempotencyStore()
+IDEMPOTENCY_WAIT_TIMEOUT = 30.0
+IDEMPOTENCY_REPLAYS = REGISTRY.counter("idempotency_replays_total", "按 Idempotency-Key 直接返回已有结果的次数",
+                                       ("endpoint",))
+# 版本号用于生成 ETag：商品每次写入都从全局单调计数器取新版本，目录版本随之更新
+_ETAG_EPOCH = f"{time.time_ns():x}"
+_version_counter = itertools.count(1)
+product_versions: Dict[int, int] = {}
+catalog_version = 0
+promotions_version = 0
+# 商品列表的序列化结果缓存，写接口按分类精确失效
+product_list_cache = ResponseCache()
 # 设置简单的用户与令牌映射，便于接口鉴权演示
 users_db: Dict[str, dict] = {
     "admin": {"user_id": 1, "role": "admin", "name": "Admin", "password": "adminpass"},
@@ -92,13 +180,142 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
     expires_in: int
 
-def _get_product_lock(product_id:int) -> Lock:
+
+class BatchItem(BaseModel):
+    method: str = Field(..., description="HTTP 方法")
+    path: str = Field(..., description="接口路径，例如 /api/products/1")
+    params: Dict[str, Any] = Field(default_factory=dict, description="查询参数")
+    body: Optional[Dict[str, Any]] = Field(default=None, description="请求体")
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., max_length=100, description="按顺序执行的子请求，最多 100 个")
+
+
+class CheckoutPipelineConfig(BaseModel):
+    enabled: bool = Field(..., description="是否开启下单组提交")
+    max_batch: int = Field(default=64, ge=1, le=1024, description="每批最多处理的订单数")
+    max_wait_ms: float = Field(default=2.0, ge=0, le=1000, description="凑批时最多等待的毫秒数")
+
+
+class OrderArchiveRequest(BaseModel):
+    older_than_seconds: Optional[int] = Field(default=None, ge=0, description="归档创建超过该秒数的订单，默认 ORDER_ARCHIVE_AGE")
+
+
+class FlashSaleConfig(BaseModel):
+    shards: int = Field(default=DEFAULT_SHARDS, ge=1, le=256, description="库存分片数")
+
+
+class LowStockThreshold(BaseModel):
+    threshold: int = Field(..., ge=1, description="可用库存（stock - reserved）低于该值时预警")
+
+def _get_product_lock(product_id:int) -> InstrumentedLock:
     """获取商品级锁， 确保锁字典的线程安全创建"""
     with product_lock_manager:
         if product_id not in product_locks:
-            product_locks[product_id] = Lock()
+            product_locks[product_id] = InstrumentedLock("product", product_id)
         return product_locks[product_id]
 
+
+def _get_cart_lock(user_id: int) -> InstrumentedLock:
+    with product_lock_manager:
+        lock = cart_locks.get(user_id)
+        if lock is None:
+            lock = cart_locks[user_id] = InstrumentedLock("cart", user_id)
+        return lock
+
+
+def _next_order_id() -> int:
+    global order_counter
+    with order_id_lock:
+        order_id = order_counter
+        order_counter += 1
+        return order_id
+
+def _ensure_indexes() -> None:
+    """
+    第一次搜索或范围查询时建立搜索索引与有序索引
+
+    建立期间持有 global_lock；秒杀路径不经过 global_lock，建立完成后再在各自的商品锁下补齐秒杀商品的库存。
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with global_lock:
+        if _indexes_ready:
+            return
+        search_index.rebuild(products_db.iter_records())
+        for index in sorted_indexes.values():
+            index.rebuild(products_db.iter_records())
+        _indexes_ready = True
+        for product_id in list(flash_sales):
+            with _get_product_lock(product_id):
+                product = products_db.get(product_id)
+                if product is not None:
+                    sorted_indexes["stock"].update(product_id, product["stock"])
+
+
+def _product_changed(product_id: int, *categories: str, change: str = "stock_changed") -> None:
+    """
+    商品（含库存、预留量）发生写入后调用：刷新商品与目录的版本号，更新各索引，失效相关分类的列表缓存，
+    并向变更事件流发布 change 类型的事件
+
+    categories 为受影响的分类，未传入时使用商品当前的分类；删除或修改分类时需显式传入旧分类。
+    """
+    global catalog_version
+    version = next(_version_counter)
+    product_versions[product_id] = version
+    catalog_version = version
+    product = products_db.get(product_id)
+    for index in sorted_indexes.values() if _indexes_ready else ():
+        if product is None:
+            index.remove(product_id)
+        else:
+            index.update(product_id, product[index.field])
+    if product is None:
+        low_stock.clear_threshold(product_id)
+    else:
+        low_stock.update(product_id, product["stock"] - product.get("reserved", 0))
+    if not categories and product is not None:
+        categories = (product["category"],)
+    product_list_cache.invalidate(categories)
+    if product is None:
+        change_feed.publish(change, product_id=product_id)
+    elif change == "stock_changed":
+        change_feed.publish(change, product_id=product_id, stock=product["stock"], reserved=product.get("reserved", 0))
+    else:
+        change_feed.publish(change, product_id=product_id, product=dict(product))
+
+
+def _catalog_etag() -> str:
+    return f'"{_ETAG_EPOCH}-c{catalog_version}"'
+
+
+def _product_etag(product_id: int) -> str:
+    return f'"{_ETAG_EPOCH}-p{product_id}-{product_versions.get(product_id, 0)}"'
+
+
+def _promotions_etag(promotion_id: Optional[int] = None) -> str:
+    suffix = f"-m{promotion_id}" if promotion_id is not None else ""
+    return f'"{_ETAG_EPOCH}-v{promotions_version}{suffix}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """按 If-None-Match 的弱比较规则判断客户端缓存是否仍然有效"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -151,7 +368,13 @@ def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depen
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="missing authentication information")
     token = credentials.credentials if hasattr(credentials, "credentials") else str(credentials)
-    payload = decode_access_token(token)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        payload = decode_access_token(token)
+        outcome = "ok"
+    finally:
+        AUTH_DECODE.observe(time.perf_counter() - started, outcome)
     username: Optional[str] = payload.get("sub")
     if username is None or username not in users_db:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="authentication information is incorrect")
@@ -192,25 +415,116 @@ def health_check():
     return {"status": "ok"}
 
 
+def _query_sorted_indexes(category: Optional[str], ranges: Dict[str, Tuple[Optional[float], Optional[float]]],
+                          sort: Optional[str], skip: int, limit: Optional[int]) -> Tuple[int, List[dict]]:
+    """
+    价格/库存的范围与排序查询
+
+    由排序字段（未排序时取有范围条件的字段）的有序索引驱动；没有其他条件时代价为 O(log n + k)，
+    有分类或另一个字段的范围条件时在索引区间内逐条过滤。
+    """
+    if sort is not None:
+        field, descending = sort.lstrip("-"), sort.startswith("-")
+    else:
+        field, descending = ("price" if ranges["price"] != (None, None) else "stock"), False
+    _ensure_indexes()
+    index = sorted_indexes[field]
+    low, high = ranges[field]
+    filters = [(name, bounds) for name, bounds in ranges.items() if name != field and bounds != (None, None)]
+    if category is None and not filters:
+        total, product_ids = index.range(low, high, descending, skip, limit)
+        return total, [products_db[pid] for pid in product_ids if pid in products_db]
+    matched = []
+    for product_id in index.iter_range(low, high, descending):
+        product = products_db.get(product_id)
+        if product is None or (category is not None and product["category"] != category):
+            continue
+        for name, (low, high) in filters:
+            if (low is not None and product[name] < low) or (high is not None and product[name] > high):
+                break
+        else:
+            matched.append(product)
+    return len(matched), matched[skip:skip + limit] if limit is not None else matched[skip:]
+
+
 @app.get("/api/products")
 def get_products(
         category: Optional[str] = None,
-        current_user: dict = Depends(get_current_user)):
-    products = list(products_db.values())
-    if category:
-        products = [p for p in products if p["category"] == category]
-    return {"products": products, "count": len(products)}
+        current_user: dict = Depends(get_current_user),
+        if_none_match: Annotated[Optional[str], Header()] = None,
+        skip: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[Optional[int], Query(ge=1)] = None,
+        min_price: Annotated[Optional[float], Query(ge=0)] = None,
+        max_price: Annotated[Optional[float], Query(ge=0)] = None,
+        min_stock: Annotated[Optional[int], Query(ge=0)] = None,
+        max_stock: Annotated[Optional[int], Query(ge=0)] = None,
+        sort: Optional[Literal["price", "-price", "stock", "-stock"]] = None):
+    """
+    获取商品列表，可按分类过滤并分页；total 为过滤后的总数，count 为本页数量
+
+    min_/max_price、min_/max_stock 为闭区间过滤，sort 按价格或库存排序（前缀 - 为降序），由有序索引完成。
+    """
+    etag = _catalog_etag()
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    category = category or None
+    ranges = {"price": (min_price, max_price), "stock": (min_stock, max_stock)}
+    cache_key = (category, skip, limit, min_price, max_price, min_stock, max_stock, sort)
+    cached = product_list_cache.get(cache_key)
+    if cached is not None:
+        # 使用与缓存响应体一同保存的 ETag，见 api/response_cache.py
+        etag, body = cached
+    else:
+        generation = product_list_cache.generation(category)
+        if sort is not None or any(bounds != (None, None) for bounds in ranges.values()):
+            total, page = _query_sorted_indexes(category, ranges, sort, skip, limit)
+        else:
+            products = list(products_db.iter_records())
+            if category:
+                products = [p for p in products if p["category"] == category]
+            total = len(products)
+            page = products[skip:skip + limit] if limit is not None else products[skip:]
+        body = json_response.dumps({"products": page, "count": len(page), "total": total})
+        product_list_cache.put(cache_key, category, etag, body, generation)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+# 需要声明在 /api/products/{product_id} 之前，否则 "search" 会被当作商品ID
+@app.get("/api/products/search")
+def search_products(
+        q: Annotated[str, Query(min_length=1, max_length=200)],
+        category: Optional[str] = None,
+        current_user: dict = Depends(get_current_user),
+        if_none_match: Annotated[Optional[str], Header()] = None,
+        skip: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1, le=100)] = 20):
+    """按名称与分类搜索商品，结果按相关度排序；拉丁词按前缀匹配，中文按单字/二字匹配"""
+    etag = _catalog_etag()
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    _ensure_indexes()
+    total, hits = search_index.search(q, category or None, skip, limit)
+    products = []
+    for product_id, score in hits:
+        product = products_db.get(product_id)
+        if product is not None:
+            products.append({**product, "score": score})
+    return FastJSONResponse({"products": products, "count": len(products), "total": total}, headers={"ETag": etag})
 
 
 @app.get("/api/products/{product_id}")
 def get_product(
         product_id: int,
         current_user: dict = Depends(get_current_user),
+        if_none_match: Annotated[Optional[str], Header()] = None,
 ):
     """获取单个商品"""
     if product_id not in products_db:
         raise HTTPException(status_code=404, detail="商品不存在")
-    return products_db[product_id]
+    etag = _product_etag(product_id)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return FastJSONResponse(products_db[product_id], headers={"ETag": etag})
 
 
 @app.post("/api/products", status_code=201)
@@ -218,10 +532,14 @@ def create_product(product: ProductCreate, current_user: dict = Depends(get_curr
     """创建商品"""
     ensure_admin(current_user)
     with global_lock:
-        product_id = max(products_db.keys()) + 1 if products_db else 1
+        product_id = products_db.max_key() + 1
         new_product = {"id": product_id, **product.model_dump()}
+        product_snapshots.preserve(product_id)
         products_db[product_id] = new_product
-        product_locks.setdefault(product_id, Lock())
+        product_locks.setdefault(product_id, InstrumentedLock("product", product_id))
+        if _indexes_ready:
+            search_index.upsert(product_id, new_product["name"], new_product["category"])
+        _product_changed(product_id, change="product_created")
         return new_product
 
 
@@ -229,62 +547,405 @@ def create_product(product: ProductCreate, current_user: dict = Depends(get_curr
 def update_product(product_id: int, product: ProductCreate, current_user: dict = Depends(get_current_user)):
     """更新商品"""
     ensure_admin(current_user)
-    if product_id not in products_db:
-        raise HTTPException(status_code=404, detail="商品不存在")
-    products_db[product_id].update(product.model_dump())
-    return products_db[product_id]
+    with global_lock, _get_product_lock(product_id):
+        if product_id not in products_db:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        if product_id in flash_sales:
+            raise HTTPException(status_code=409, detail="商品正在秒杀，结束后才能修改")
+        old_category = products_db[product_id]["category"]
+        product_snapshots.preserve(product_id)
+        products_db[product_id].update(product.model_dump())
+        if _indexes_ready:
+            search_index.upsert(product_id, product.name, product.category)
+        _product_changed(product_id, old_category, product.category, change="product_updated")
+        return products_db[product_id]
 
 
 @app.delete("/api/products/{product_id}")
 def delete_product(product_id: int, current_user: dict = Depends(get_current_user)):
     """删除商品"""
     ensure_admin(current_user)
-    if product_id not in products_db:
-        raise HTTPException(status_code=404, detail="商品不存在")
-    del products_db[product_id]
+    with global_lock, _get_product_lock(product_id):
+        if product_id not in products_db:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        if product_id in flash_sales:
+            raise HTTPException(status_code=409, detail="商品正在秒杀，结束后才能删除")
+        product_snapshots.preserve(product_id)
+        deleted = products_db.pop(product_id)
+        if _indexes_ready:
+            search_index.remove(product_id)
+        _product_changed(product_id, deleted["category"], change="product_deleted")
     return {"message": "删除成功"}
 
 
+@app.get("/api/cache/stats")
+def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """查看商品列表缓存的命中率等统计信息（仅管理员）"""
+    ensure_admin(current_user)
+    return {"product_list": product_list_cache.stats()}
+
+
+def _cache_metrics():
+    stats = product_list_cache.stats()
+    yield ("product_list", "hit"), stats["hits"]
+    yield ("product_list", "miss"), stats["misses"]
+
+
+def _cache_hit_ratio():
+    hit_rate = product_list_cache.stats()["hit_rate"]
+    if hit_rate is not None:
+        yield ("product_list",), hit_rate
+
+
+REGISTRY.gauge_callback("cache_lookups", "缓存查找次数（reset_state 时清零）", ("cache", "result"), _cache_metrics)
+REGISTRY.gauge_callback("cache_hit_ratio", "缓存命中率", ("cache",), _cache_hit_ratio)
+
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Prometheus 文本格式的运行指标：请求数与延迟、锁等待/持有时间、鉴权耗时与缓存命中率"""
+    return Response(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/admin/flash-sales")
+def list_flash_sales(current_user: dict = Depends(get_current_user)):
+    """查看进行中的秒杀及各库存分片的计数（仅管理员）"""
+    ensure_admin(current_user)
+    return {"flash_sales": [sale.stats() for sale in list(flash_sales.values())]}
+
+
+@app.post("/api/admin/flash-sales/{product_id}", status_code=201)
+def start_flash_sale(product_id: int, config: FlashSaleConfig, current_user: dict = Depends(get_current_user)):
+    """
+    为商品开启秒杀模式（仅管理员）
+
+    库存拆成 shards 个分片，加购、移除与单商品下单不再经过 global_lock；秒杀期间不能修改或删除该商品。
+    """
+    ensure_admin(current_user)
+    with global_lock, _get_product_lock(product_id):
+        product = products_db.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        if product_id in flash_sales:
+            raise HTTPException(status_code=409, detail="商品已在秒杀中")
+        sale = ShardedStock(product_id, product["stock"], product.get("reserved", 0), config.shards)
+        flash_sales[product_id] = sale
+        return sale.stats()
+
+
+@app.delete("/api/admin/flash-sales/{product_id}")
+def stop_flash_sale(product_id: int, current_user: dict = Depends(get_current_user)):
+    """结束秒杀，把分片计数合并回商品库存（仅管理员）"""
+    ensure_admin(current_user)
+    with global_lock, _get_product_lock(product_id):
+        sale = flash_sales.pop(product_id, None)
+        if sale is None:
+            raise HTTPException(status_code=404, detail="商品不在秒杀中")
+        product = products_db[product_id]
+        stock, reserved = sale.close()
+        product_snapshots.preserve(product_id)
+        product.update(stock=stock, reserved=reserved)
+        _product_changed(product_id)
+        return product
+
+
+def _set_checkout_pipeline(pipeline: Optional[GroupCommitQueue]) -> None:
+    """替换组提交队列；旧队列停止接收请求并处理完已入队的订单"""
+    global checkout_pipeline
+    previous, checkout_pipeline = checkout_pipeline, pipeline
+    if previous is not None:
+        previous.close()
+
+
+@app.get("/api/admin/checkout-pipeline")
+def get_checkout_pipeline(current_user: dict = Depends(get_current_user)):
+    """查看下单组提交的配置与批次统计（仅管理员）"""
+    ensure_admin(current_user)
+    pipeline = checkout_pipeline
+    return {"enabled": pipeline is not None, **(pipeline.stats() if pipeline is not None else {})}
+
+
+@app.post("/api/admin/checkout-pipeline")
+def configure_checkout_pipeline(config: CheckoutPipelineConfig, current_user: dict = Depends(get_current_user)):
+    """
+    开启或关闭下单组提交（仅管理员）
+
+    开启后下单请求进入队列，由单个提交线程每批最多 max_batch 个、最多等待 max_wait_ms 毫秒凑批，
+    一次获取整批涉及的锁后依次校验库存并扣减。
+    """
+    ensure_admin(current_user)
+    pipeline = None
+    if config.enabled:
+        pipeline = GroupCommitQueue(_commit_order_batch, config.max_batch, config.max_wait_ms / 1000,
+                                    name="checkout-committer")
+    _set_checkout_pipeline(pipeline)
+    return get_checkout_pipeline(current_user=current_user)
+
+
+# ========== 事件流 ==========
+async def _sse_ring_events(ring: EventRing, since: int, follow: bool, topics: Optional[set] = None):
+    """
+    把事件环转为 SSE 文本，每批事件合并为一次写出；topics 按事件类型的前缀过滤，gap 事件总会发送
+
+    异步生成器直接在事件循环中等待新事件，长连接的订阅者不占用线程池。
+    """
+    async for events in ring.aiter_batches(since, follow=follow):
+        if not events:
+            yield format_sse(None)
+            continue
+        if topics:
+            events = [e for e in events if e["type"] == "gap" or e["type"].split("_", 1)[0] in topics]
+        if events:
+            yield "".join(format_sse(event) for event in events)
+
+
+@app.get("/api/events")
+def stream_changes(since: Annotated[Optional[int], Query(ge=0)] = None,
+                   follow: bool = True,
+                   topics: Optional[str] = None,
+                   last_event_id: Annotated[Optional[str], Header()] = None,
+                   current_user: dict = Depends(get_current_user)):
+    """
+    以 SSE 推送商品、库存与订单的变更事件（仅管理员）
+
+    从 since（或 Last-Event-ID）之后续传；topics 为逗号分隔的 product、stock、order，默认全部；
+    follow=false 时只返回积压的事件。事件环有界，消费者落后太多时先收到 gap 事件，应重新拉取全量数据后
+    从 resume_from 继续。库存事件携带完整的 stock/reserved，重复消费不会出错。
+    """
+    ensure_admin(current_user)
+    selected = None
+    if topics:
+        selected = {topic.strip() for topic in topics.split(",") if topic.strip()}
+        unknown = selected.difference(CHANGE_FEED_TOPICS)
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"未知的事件主题: {', '.join(sorted(unknown))}")
+    return StreamingResponse(
+        _sse_ring_events(change_feed, resume_position(since, last_event_id), follow, selected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+# ========== 低库存预警 ==========
+@app.get("/api/admin/low-stock")
+def get_low_stock(limit: Annotated[Optional[int], Query(ge=1)] = None,
+                  current_user: dict = Depends(get_current_user)):
+    """当前低库存的商品，按低于阈值的程度排序（仅管理员）"""
+    ensure_admin(current_user)
+    products = low_stock.below(limit)
+    for entry in products:
+        entry["name"] = products_db.get(entry["product_id"], {}).get("name")
+    return {"products": products, "count": len(products), "last_event_id": low_stock_events.last_seq}
+
+
+@app.get("/api/admin/low-stock/events")
+def stream_low_stock(since: Annotated[Optional[int], Query(ge=0)] = None,
+                     follow: bool = True,
+                     last_event_id: Annotated[Optional[str], Header()] = None,
+                     current_user: dict = Depends(get_current_user)):
+    """
+    以 SSE 推送 low_stock / restocked 事件（仅管理员）
+
+    从 since（或 Last-Event-ID）之后续传；follow=false 时只返回积压的事件。
+    """
+    ensure_admin(current_user)
+    return StreamingResponse(
+        _sse_ring_events(low_stock_events, resume_position(since, last_event_id), follow),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.put("/api/admin/low-stock/{product_id}")
+def set_low_stock_threshold(product_id: int, config: LowStockThreshold,
+                            current_user: dict = Depends(get_current_user)):
+    """设置商品的低库存阈值（仅管理员）"""
+    ensure_admin(current_user)
+    with _get_product_lock(product_id):
+        product = products_db.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        return low_stock.set_threshold(product_id, config.threshold, product["stock"] - product.get("reserved", 0))
+
+
+@app.delete("/api/admin/low-stock/{product_id}")
+def clear_low_stock_threshold(product_id: int, current_user: dict = Depends(get_current_user)):
+    """取消商品的低库存阈值（仅管理员）"""
+    ensure_admin(current_user)
+    if not low_stock.clear_threshold(product_id):
+        raise HTTPException(status_code=404, detail="商品未设置阈值")
+    return {"message": "已取消"}
+
+
 # ========== 购物车接口 ==========
 @app.get("/api/cart/{user_id}")
 def get_cart(user_id: int, current_user: dict = Depends(get_current_user)):
     """获取购物车"""
     ensure_owner_or_admin(user_id, current_user)
-    cart = carts_db.get(user_id, {"user_id": user_id, "items": []})
-    total = sum(item["quantity"] * item["price"] for item in cart.get("items", []))
-    cart_with_total = {**cart, "total": total}
-    carts_db[user_id] = cart_with_total
-    return cart_with_total
+    # 写回购物车同样要持有购物车锁，否则可能把秒杀下单刚清空的购物车恢复成下单前的内容
+    with _get_cart_lock(user_id):
+        cart = carts_db.get(user_id, {"user_id": user_id, "items": []})
+        total = sum(item["quantity"] * item["price"] for item in cart.get("items", []))
+        cart_with_total = {**cart, "total": total}
+        carts_db[user_id] = cart_with_total
+    return FastJSONResponse(cart_with_total)
+
+
+def _replay_idempotent(endpoint: str, status_code: int, body: Any) -> Response:
+    IDEMPOTENCY_REPLAYS.inc(endpoint)
+    headers = {"Idempotent-Replayed": "true"}
+    if status_code >= 400:
+        raise HTTPException(status_code=status_code, detail=body, headers=headers)
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def _run_idempotent(idempotency_key: Optional[str], current_user: dict, endpoint: str, payload: Any,
+                    status_code: int, handler: Callable[[], Any]) -> Any:
+    """
+    按 Idempotency-Key 执行写请求
+
+    键按用户隔离；同一个键的重复请求直接返回第一次的响应（含 4xx 业务错误），不再进入加锁的业务逻辑，
+    第一次请求仍在执行时等待其完成。同一个键用于不同的请求时返回 422。
+    """
+    if not idempotency_key:
+        return handler()
+    key = (current_user["user_id"], endpoint, idempotency_key)
+    request_fingerprint = fingerprint(endpoint, payload)
+    while True:
+        try:
+            record, owner = idempotency_store.begin(key, request_fingerprint)
+        except IdempotencyMismatch:
+            raise HTTPException(status_code=422, detail="Idempotency-Key 已用于不同的请求")
+        if owner:
+            break
+        if not record.done.wait(IDEMPOTENCY_WAIT_TIMEOUT):
+            raise HTTPException(status_code=409, detail="相同 Idempotency-Key 的请求仍在处理中")
+        if not record.error:
+            return _replay_idempotent(endpoint, record.status_code, record.body)
+        # 第一次请求异常退出且未记录结果，重新登记并执行
+
+    try:
+        result = handler()
+    except HTTPException as exc:
+        if exc.status_code >= 500:
+            idempotency_store.abandon(key, record)
+        else:
+            idempotency_store.complete(record, exc.status_code, exc.detail)
+        raise
+    except BaseException:
+        idempotency_store.abandon(key, record)
+        raise
+    # 记录序列化后的字节，之后购物车等对象继续变化也不影响重放的内容
+    idempotency_store.complete(record, status_code, json_response.dumps(result))
+    return result
+
+
+def _add_cart_item(user_id: int, product: dict, quantity: int) -> dict:
+    """把商品加入购物车，调用方需持有该用户的购物车锁"""
+    cart = carts_db.setdefault(user_id, {"user_id": user_id, "items": []})
+    for cart_item in cart["items"]:
+        if cart_item["product_id"] == product["id"]:
+            cart_item["quantity"] += quantity
+            break
+    else:
+        cart["items"].append({
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": quantity,
+            "price": product["price"],
+        })
+    return cart
+
+
+def _sync_flash_product(sale: ShardedStock) -> None:
+    """用分片计数刷新商品字典中的库存与预留量，调用方需持有商品锁"""
+    product = products_db.get(sale.product_id)
+    if sale.closed or product is None:
+        return
+    stock, reserved = sale.totals()
+    # 秒杀路径不经过 global_lock，登记旧值与写入需在快照锁内一起完成，见 api/export.py
+    with product_snapshots.writing(sale.product_id):
+        product.update(stock=stock, reserved=reserved)
+    _product_changed(sale.product_id)
+
+
+def _flash_add_to_cart(user_id: int, item: CartItemAdd) -> Optional[dict]:
+    """秒杀商品加购：不经过 global_lock，只持有购物车锁与一个库存分片锁；秒杀已结束时返回 None"""
+    sale = flash_sales.get(item.product_id)
+    product = products_db.get(item.product_id)
+    if sale is None or product is None:
+        return None
+    with _get_cart_lock(user_id):
+        try:
+            if not sale.reserve(item.quantity, user_id):
+                raise HTTPException(status_code=400, detail="库存不足")
+        except SaleClosed:
+            return None
+        cart = _add_cart_item(user_id, product, item.quantity)
+    with _get_product_lock(item.product_id):
+        _sync_flash_product(sale)
+    return cart
 
 
 @app.post("/api/cart/{user_id}/items")
-def add_to_cart(user_id: int, item: CartItemAdd, current_user: dict = Depends(get_current_user)):
-    """添加商品到购物车"""
+def add_to_cart(user_id: int, item: CartItemAdd, current_user: dict = Depends(get_current_user),
+                idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None):
+    """添加商品到购物车，支持 Idempotency-Key"""
     ensure_owner_or_admin(user_id, current_user)
-    with global_lock, _get_product_lock(item.product_id):
+    return _run_idempotent(idempotency_key, current_user, "POST /api/cart/{user_id}/items",
+                           {"user_id": user_id, **item.model_dump()}, 200, lambda: _add_to_cart(user_id, item))
+
+
+def _add_to_cart(user_id: int, item: CartItemAdd) -> dict:
+    if item.product_id in flash_sales:
+        cart = _flash_add_to_cart(user_id, item)
+        if cart is not None:
+            return cart
+    with global_lock, _get_cart_lock(user_id), _get_product_lock(item.product_id):
         if item.product_id not in products_db:
             raise HTTPException(status_code=404, detail="商品不存在")
 
         product = products_db[item.product_id]
+        sale = flash_sales.get(item.product_id)
+        if sale is not None:
+            # 持有 global_lock 时秒杀不会结束
+            if not sale.reserve(item.quantity, user_id):
+                raise HTTPException(status_code=400, detail="库存不足")
+            cart = _add_cart_item(user_id, product, item.quantity)
+            _sync_flash_product(sale)
+            return cart
         reserved = product.get("reserved", 0)
         available_stock = product["stock"] - reserved
         if available_stock < item.quantity:
             raise HTTPException(status_code=400, detail="库存不足")
-        carts_db.setdefault(user_id, {"user_id": user_id, "items": []})
+        cart = _add_cart_item(user_id, product, item.quantity)
+        product_snapshots.preserve(item.product_id)
+        product["reserved"] = reserved + item.quantity
+        _product_changed(item.product_id)
+        return cart
+
+
+def _flash_remove_from_cart(user_id: int, product_id: int) -> Optional[dict]:
+    sale = flash_sales.get(product_id)
+    if sale is None:
+        return None
+    with _get_cart_lock(user_id):
         cart = carts_db[user_id]
-        for cart_item in cart["items"]:
-            if cart_item["product_id"] == item.product_id:
-                cart_item["quantity"] += item.quantity
+        for index, item in enumerate(cart["items"]):
+            if item["product_id"] == product_id:
+                # 只有秒杀已结束（分片未改动）时才回退到普通路径；release() 返回 False 说明分片中已没有
+                # 这份预留，回退后再次释放会让可售库存凭空增加，这里只移除购物车条目
+                try:
+                    sale.release(item["quantity"], user_id)
+                except SaleClosed:
+                    return None
+                cart["items"].pop(index)
                 break
         else:
-            cart["items"].append({
-                "product_id": item.product_id,
-                "product_name": product["name"],
-                "quantity": item.quantity,
-                "price": product["price"],
-            })
-        product["reserved"] = reserved + item.quantity
-        return cart
+            raise HTTPException(status_code=404, detail="Product not found in the cart")
+    with _get_product_lock(product_id):
+        _sync_flash_product(sale)
+    return cart
 
 
 @app.delete("/api/cart/{user_id}/items/{product_id}")
@@ -293,15 +954,25 @@ def remove_from_cart(user_id: int, product_id: int, current_user: dict = Depends
     ensure_owner_or_admin(user_id, current_user)
     if user_id not in carts_db:
         raise HTTPException(status_code=404, detail="购物车不存在")
+    if product_id in flash_sales:
+        cart = _flash_remove_from_cart(user_id, product_id)
+        if cart is not None:
+            return cart
     cart = carts_db[user_id]
-    with global_lock, _get_product_lock(product_id):
+    with global_lock, _get_cart_lock(user_id), _get_product_lock(product_id):
         for index, item in enumerate(cart["items"]):
             if item["product_id"] == product_id:
                 cart_item = cart["items"].pop(index)
+                sale = flash_sales.get(product_id)
                 product = products_db.get(product_id)
-                if product:
+                if sale is not None:
+                    sale.release(cart_item["quantity"], user_id)
+                    _sync_flash_product(sale)
+                elif product:
                     reserved = product.get("reserved", 0)
+                    product_snapshots.preserve(product_id)
                     product["reserved"] = max(reserved - cart_item["quantity"], 0)
+                    _product_changed(product_id)
                 return cart
 
     raise HTTPException(status_code=404, detail="Product not found in the cart")
@@ -309,81 +980,214 @@ def remove_from_cart(user_id: int, product_id: int, current_user: dict = Depends
 
 # ========== 促销接口 ==========
 @app.get("/api/promotions")
-def get_promotions(current_user: dict = Depends(get_current_user)):
+def get_promotions(
+        current_user: dict = Depends(get_current_user),
+        if_none_match: Annotated[Optional[str], Header()] = None):
     """获取促销列表"""
-    return {"promotions": list(promotions_db.values())}
+    etag = _promotions_etag()
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return FastJSONResponse({"promotions": list(promotions_db.values())}, headers={"ETag": etag})
 
 
 @app.get("/api/promotions/{promotion_id}")
-def get_promotion(promotion_id: int, current_user: dict = Depends(get_current_user)):
+def get_promotion(
+        promotion_id: int,
+        current_user: dict = Depends(get_current_user),
+        if_none_match: Annotated[Optional[str], Header()] = None):
     """获取促销详情"""
     if promotion_id not in promotions_db:
         raise HTTPException(status_code=404, detail="促销不存在")
-    return promotions_db[promotion_id]
+    etag = _promotions_etag(promotion_id)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return FastJSONResponse(promotions_db[promotion_id], headers={"ETag": etag})
 
 
 # ========== 订单接口 ==========
 # 业务逻辑测试
 # 计算购物车中的商品的小计金额，判断优惠形式并计算折扣金额
+def _build_order(order: OrderCreate, items: List[dict], subtotal: float) -> dict:
+    """计算优惠并生成订单记录，分配订单号"""
+    discount = 0.0
+    if order.promotion_id and order.promotion_id in promotions_db:
+        promo = promotions_db[order.promotion_id]
+        if subtotal >= promo["min_amount"]:
+            if promo["discount_type"] == "percentage":
+                discount = subtotal * (promo["discount_value"] / 100)
+            elif promo["discount_type"] == "fixed":
+                discount = min(promo["discount_value"], subtotal)
+
+    total = max(subtotal - discount, 0)
+    return {
+        "id": _next_order_id(),
+        "user_id": order.user_id,
+        "items": items,
+        "subtotal": subtotal,
+        "discount": discount,
+        "total": total,
+        "status": "pending",
+        "created_at": datetime.utcnow().isoformat()
+    }
+
+
+def _order_created(order: dict) -> None:
+    change_feed.publish("order_created", order_id=order["id"], user_id=order["user_id"], total=order["total"],
+                        items=[{"product_id": item["product_id"], "quantity": item["quantity"]}
+                               for item in order["items"]])
+
+
+def _flash_create_order(order: OrderCreate) -> Optional[dict]:
+    """
+    购物车只有一件秒杀商品时的下单路径：不经过 global_lock，预留量在一个分片内转为已售出
+
+    购物车内容变化或秒杀已结束时返回 None，由调用方走普通路径。
+    """
+    with _get_cart_lock(order.user_id):
+        cart = carts_db.get(order.user_id)
+        if cart is None or len(cart.get("items", [])) != 1:
+            return None
+        cart_item = cart["items"][0]
+        sale = flash_sales.get(cart_item["product_id"])
+        if sale is None:
+            return None
+        try:
+            if not sale.commit(cart_item["quantity"], order.user_id):
+                raise HTTPException(status_code=400, detail="库存不足")
+        except SaleClosed:
+            return None
+        new_order = _build_order(order, cart["items"].copy(), cart_item["quantity"] * cart_item["price"])
+        # 订单号在写入之前就已分配，导出快照可能已经覆盖这个订单号
+        with order_snapshots.writing(new_order["id"]):
+            orders_db[new_order["id"]] = new_order
+        _order_created(new_order)
+        carts_db[order.user_id] = {"user_id": order.user_id, "items": []}
+    with _get_product_lock(sale.product_id):
+        _sync_flash_product(sale)
+    return new_order
+
+
+def _commit_order(order: OrderCreate) -> dict:
+    """
+    校验库存、扣减并生成订单
+
+    调用方需持有 global_lock、该用户的购物车锁以及购物车中所有商品的商品锁。
+    """
+    cart = carts_db.get(order.user_id)
+    if cart is None or not cart.get("items"):
+        raise HTTPException(status_code=400, detail="购物车为空")
+    # 校验库存并计算价格；秒杀商品的库存在分片中，最后统一提交
+    subtotal = 0.0
+    flash_items = []
+    for cart_item in cart["items"]:
+        product = products_db.get(cart_item["product_id"])
+        if product is None:
+            raise HTTPException(status_code=404, detail="商品不存在")
+        sale = flash_sales.get(cart_item["product_id"])
+        if sale is not None:
+            flash_items.append((sale, cart_item["quantity"]))
+        else:
+            reserved = product.get("reserved", 0)
+            if reserved < cart_item["quantity"] or product["stock"] < cart_item["quantity"]:
+                raise HTTPException(status_code=400, detail="库存不足")
+        subtotal += cart_item["quantity"] * cart_item["price"]
+
+    committed = []
+    for sale, quantity in flash_items:
+        if not sale.commit(quantity, order.user_id):
+            for done_sale, done_quantity in committed:
+                done_sale.cancel(done_quantity, order.user_id)
+            raise HTTPException(status_code=400, detail="库存不足")
+        committed.append((sale, quantity))
+
+    # 扣减库存
+    for cart_item in cart["items"]:
+        sale = flash_sales.get(cart_item["product_id"])
+        if sale is not None:
+            _sync_flash_product(sale)
+            continue
+        product = products_db[cart_item["product_id"]]
+        product_snapshots.preserve(cart_item["product_id"])
+        product["stock"] -= cart_item["quantity"]
+        product["reserved"] = max(product.get("reserved", 0) - cart_item["quantity"], 0)
+        _product_changed(cart_item["product_id"])
+
+    new_order = _build_order(order, cart["items"].copy(), subtotal)
+    orders_db[new_order["id"]] = new_order
+    _order_created(new_order)
+    carts_db[order.user_id] = {"user_id": order.user_id, "items": []}
+    return new_order
+
+
+def _commit_order_batch(orders: List[OrderCreate]) -> List[Any]:
+    """组提交：一次获取整批订单涉及的全部锁，依次提交，单个订单失败不影响其他订单"""
+    CHECKOUT_BATCH_SIZE.observe(len(orders))
+    user_ids = sorted({order.user_id for order in orders})
+    with global_lock:
+        cart_locks_held = [_get_cart_lock(user_id) for user_id in user_ids]
+        for lock in cart_locks_held:
+            lock.acquire()
+        try:
+            # 持有购物车锁后购物车内容不会再变化，此时再确定需要的商品锁
+            product_ids = sorted({
+                item["product_id"]
+                for user_id in user_ids
+                for item in carts_db.get(user_id, {}).get("items", [])
+            })
+            product_locks_held = [_get_product_lock(pid) for pid in product_ids]
+            for lock in product_locks_held:
+                lock.acquire()
+            try:
+                results: List[Any] = []
+                for order in orders:
+                    try:
+                        results.append(_commit_order(order))
+                    except HTTPException as exc:
+                        results.append(exc)
+                return results
+            finally:
+                for lock in reversed(product_locks_held):
+                    lock.release()
+        finally:
+            for lock in reversed(cart_locks_held):
+                lock.release()
+
+
 @app.post("/api/orders", status_code=201)
-def create_order(order: OrderCreate, current_user: dict = Depends(get_current_user)):
-    """创建订单"""
+def create_order(order: OrderCreate, current_user: dict = Depends(get_current_user),
+                 idempotency_key: Annotated[Optional[str], Header(max_length=255)] = None):
+    """创建订单，支持 Idempotency-Key"""
     ensure_owner_or_admin(order.user_id, current_user)
+    return _run_idempotent(idempotency_key, current_user, "POST /api/orders", order.model_dump(), 201,
+                           lambda: _create_order(order))
+
 
+def _create_order(order: OrderCreate) -> dict:
     cart = carts_db.get(order.user_id)
     if cart is None or not cart.get("items"):
         raise HTTPException(status_code=400, detail="购物车为空")
-    product_ids = [item["product_id"] for item in cart["items"]]
+    if len(cart["items"]) == 1 and cart["items"][0]["product_id"] in flash_sales:
+        new_order = _flash_create_order(order)
+        if new_order is not None:
+            return new_order
 
-    with global_lock:
-        locks = [_get_product_lock(pid) for pid in sorted(set(product_ids))]
+    pipeline = checkout_pipeline
+    if pipeline is not None:
+        try:
+            future = pipeline.submit(order)
+        except QueueClosed:
+            pass
+        else:
+            return future.result()
+
+    with global_lock, _get_cart_lock(order.user_id):
+        cart = carts_db.get(order.user_id)
+        product_ids = sorted({item["product_id"] for item in (cart or {}).get("items", [])})
+        locks = [_get_product_lock(pid) for pid in product_ids]
         for lock in locks:
             lock.acquire()
         try:
-            # 校验库存并计算价格
-            subtotal = 0.0
-            for cart_item in cart["items"]:
-                product = products_db.get(cart_item["product_id"])
-                if product is None:
-                    raise HTTPException(status_code=404, detail="商品不存在")
-                reserved = product.get("reserved", 0)
-                if reserved < cart_item["quantity"] or product["stock"] < cart_item["quantity"]:
-                    raise HTTPException(status_code=400, detail="库存不足")
-                subtotal += cart_item["quantity"] * cart_item["price"]
-
-            discount = 0.0
-            if order.promotion_id and order.promotion_id in promotions_db:
-                promo = promotions_db[order.promotion_id]
-                if subtotal >= promo["min_amount"]:
-                    if promo["discount_type"] == "percentage":
-                        discount = subtotal * (promo["discount_value"] / 100)
-                    elif promo["discount_type"] == "fixed":
-                        discount = min(promo["discount_value"], subtotal)
-
-            total = max(subtotal - discount, 0)
-            # 扣减库存
-            for cart_item in cart["items"]:
-                product = products_db[cart_item["product_id"]]
-                product["stock"] -= cart_item["quantity"]
-                product["reserved"] = max(product.get("reserved", 0) - cart_item["quantity"], 0)
-
-            global order_counter
-            order_id = order_counter
-            order_counter += 1
-            new_order = {
-                "id": order_id,
-                "user_id": order.user_id,
-                "items": cart["items"].copy(),
-                "subtotal": subtotal,
-                "discount": discount,
-                "total": total,
-                "status": "pending",
-                "created_at": datetime.utcnow().isoformat()
-            }
-
-            orders_db[order_id] = new_order
-            carts_db[order.user_id] = {"user_id": order.user_id, "items": []}
-            return new_order
+            return _commit_order(order)
         finally:
             for lock in reversed(locks):
                 lock.release()
@@ -391,12 +1195,209 @@ def create_order(order: OrderCreate, current_user: dict = Depends(get_current_us
 
 @app.get("/api/orders/{order_id}")
 def get_order(order_id: int, current_user: dict = Depends(get_current_user)):
-    """获取订单详情"""
-    if order_id not in orders_db:
+    """获取订单详情，已归档的订单从分段中读取"""
+    order = orders_db.get(order_id) or order_archive.get(order_id)
+    if order is None:
         raise HTTPException(status_code=404, detail="订单不存在")
-    order = orders_db[order_id]
     ensure_owner_or_admin(order["user_id"], current_user)
-    return order
+    return FastJSONResponse(order)
+
+
+@app.get("/api/admin/orders/archive")
+def get_order_archive(current_user: dict = Depends(get_current_user)):
+    """订单归档的分段数、归档订单数与分段缓存命中情况（仅管理员）"""
+    ensure_admin(current_user)
+    return {**order_archive.stats(), "hot_orders": len(orders_db)}
+
+
+@app.post("/api/admin/orders/archive")
+def archive_orders(request: OrderArchiveRequest, current_user: dict = Depends(get_current_user)):
+    """
+    把创建时间早于 older_than_seconds 秒前的订单移到压缩分段（仅管理员）
+
+    订单写入后不再修改，归档不需要 global_lock；按订单号从上次归档的位置连续推进，遇到较新的订单即停止。
+    """
+    ensure_admin(current_user)
+    age = ORDER_ARCHIVE_AGE if request.older_than_seconds is None else request.older_than_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=age)
+    archived = order_archive.archive(orders_db, order_counter - 1, cutoff)
+    return {"archived": archived, **order_archive.stats(), "hot_orders": len(orders_db)}
+
+
+# ========== 数据导出 ==========
+def _export_response(snapshot, gzip: bool) -> StreamingResponse:
+    body = ndjson_stream(snapshot, json_response.dumps, EXPORT_CHUNK_SIZE)
+    headers = {"Cache-Control": "no-store"}
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+@app.get("/api/export/orders")
+def export_orders(gzip: bool = False, current_user: dict = Depends(get_current_user)):
+    """
+    按订单号顺序以 NDJSON 流式导出全部订单（含已归档的订单，仅管理员），gzip=true 时压缩
+
+    只在创建快照的瞬间持有 global_lock，导出内容为该时刻的一致视图，之后新建的订单不会出现。
+    """
+    ensure_admin(current_user)
+    with global_lock:
+        snapshot = order_snapshots.open(order_counter - 1)
+    return _export_response(snapshot, gzip)
+
+
+@app.get("/api/export/products")
+def export_products(gzip: bool = False, current_user: dict = Depends(get_current_user)):
+    """按商品 ID 顺序以 NDJSON 流式导出全部商品（仅管理员），一致性同订单导出"""
+    ensure_admin(current_user)
+    with global_lock:
+        snapshot = product_snapshots.open(products_db.max_key())
+    return _export_response(snapshot, gzip)
+
+
+# ========== 目录快照 ==========
+@app.get("/api/admin/catalog")
+def get_catalog_stats(current_user: dict = Depends(get_current_user)):
+    """商品目录的快照文件、已解码的记录数与快照之后的增删情况（仅管理员）"""
+    ensure_admin(current_user)
+    return {**products_db.stats(), "indexes_ready": _indexes_ready}
+
+
+@app.post("/api/admin/catalog/snapshot")
+def write_catalog_snapshot(current_user: dict = Depends(get_current_user)):
+    """
+    把当前商品目录重写为快照文件（仅管理员），下次启动直接 mmap 加载
+
+    与导出一样只在创建写时复制快照的瞬间持有 global_lock；当前进程继续使用已加载的目录。
+    购物车只在内存中，快照不保存预占数量，重启后全部库存重新可售。
+    """
+    ensure_admin(current_user)
+    if CATALOG_SNAPSHOT_PATH is None:
+        raise HTTPException(status_code=409, detail="未配置 ECOMMERCE_CATALOG_SNAPSHOT")
+    with catalog_snapshot_lock:
+        with global_lock:
+            snapshot = product_snapshots.open(products_db.max_key())
+        start = time.perf_counter()
+        try:
+            count = write_catalog(CATALOG_SNAPSHOT_PATH, (
+                product for chunk in snapshot.iter_chunks(dict, EXPORT_CHUNK_SIZE) for product in chunk
+            ))
+        finally:
+            snapshot.close()
+        return {
+            "path": str(CATALOG_SNAPSHOT_PATH),
+            "records": count,
+            "bytes": CATALOG_SNAPSHOT_PATH.stat().st_size,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+
+# ========== 批量接口 ==========
+# 一个信封内的子请求共享同一次鉴权，按顺序在进程内分发到对应的接口函数；
+# 流式、纯文本与长时间阻塞的接口（SSE、导出、指标、调用栈采样、测试任务）不能放进批量信封
+_BATCH_EXCLUDED_PATHS = {
+    "/api/batch", "/api/auth/token", "/api/tests/run", "/api/tests/jobs/{job_id}/events",
+    "/api/metrics", "/api/events", "/api/admin/low-stock/events", "/api/export/orders", "/api/export/products",
+    "/api/admin/profile", "/test_dashboard",
+}
+_batch_route_params: Dict[Callable, List[Tuple[str, str, Any]]] = {}
+# 签名中没有默认值的参数，子请求未提供时返回 422
+_BATCH_REQUIRED = object()
+
+
+def _match_batch_route(method: str, path: str) -> Tuple[APIRoute, Dict[str, str]]:
+    """根据方法与路径找到对应的路由，返回路由与原始路径参数"""
+    path_matched = False
+    excluded = None
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        match = route.path_regex.match(path)
+        if match is None:
+            continue
+        if route.path in _BATCH_EXCLUDED_PATHS:
+            excluded = route.path
+            continue
+        path_matched = True
+        if method in route.methods:
+            return route, match.groupdict()
+    # 被排除的接口确实存在，与拼错的路径区分开
+    if excluded is not None:
+        raise HTTPException(status_code=400, detail=f"批量请求不支持该接口: {excluded}")
+    if path_matched:
+        raise HTTPException(status_code=405, detail="不支持的请求")
+    raise HTTPException(status_code=404, detail="未知路径")
+
+
+def _batch_params_for(endpoint: Callable) -> List[Tuple[str, str, Any]]:
+    """解析接口函数签名并缓存：(参数名, 参数来源, 校验器或默认值)"""
+    params = _batch_route_params.get(endpoint)
+    if params is None:
+        params = []
+        for name, parameter in inspect.signature(endpoint).parameters.items():
+            annotation = parameter.annotation
+            if name == "current_user":
+                params.append((name, "user", None))
+            elif inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+                params.append((name, "body", annotation))
+            else:
+                default = parameter.default if parameter.default is not inspect.Parameter.empty else _BATCH_REQUIRED
+                params.append((name, "value", (TypeAdapter(annotation), default)))
+        _batch_route_params[endpoint] = params
+    return params
+
+
+def _call_batch_item(item: BatchItem, current_user: dict) -> Tuple[int, Any]:
+    route, path_params = _match_batch_route(item.method.upper(), item.path)
+    kwargs: Dict[str, Any] = {}
+    errors: List[dict] = []
+    for name, source, spec in _batch_params_for(route.endpoint):
+        if source == "user":
+            kwargs[name] = current_user
+        elif source == "body":
+            kwargs[name] = spec(**(item.body or {}))
+        else:
+            adapter, default = spec
+            location, raw = ("path", path_params) if name in path_params else ("query", item.params)
+            if name not in raw:
+                if default is _BATCH_REQUIRED:
+                    errors.append({"type": "missing", "loc": [location, name], "msg": "Field required", "input": None})
+                else:
+                    kwargs[name] = default
+                continue
+            try:
+                kwargs[name] = adapter.validate_python(raw[name], strict=False)
+            except ValidationError as exc:
+                errors.extend({**error, "loc": [location, name, *error["loc"]]}
+                              for error in exc.errors(include_url=False, include_context=False))
+    if errors:
+        # 与 FastAPI 的校验错误格式一致，loc 中带上参数来源与名称
+        raise HTTPException(status_code=422, detail=errors)
+    result = route.endpoint(**kwargs)
+    if isinstance(result, Response):
+        if not result.media_type or not result.media_type.startswith("application/json") \
+                or not hasattr(result, "body"):
+            if result.status_code == status.HTTP_304_NOT_MODIFIED:
+                return result.status_code, None
+            raise HTTPException(status_code=415, detail="批量接口只支持返回 JSON 的子请求")
+        return result.status_code, json.loads(result.body) if result.body else None
+    return route.status_code or 200, result
+
+
+@app.post("/api/batch")
+def batch(envelope: BatchRequest, current_user: dict = Depends(get_current_user)):
+    """批量执行子请求，结果与请求顺序一一对应"""
+    responses = []
+    for item in envelope.requests:
+        try:
+            status_code, body = _call_batch_item(item, current_user)
+        except HTTPException as exc:
+            status_code, body = exc.status_code, {"detail": exc.detail}
+        except ValidationError as exc:
+            status_code, body = 422, {"detail": exc.errors(include_url=False, include_context=False)}
+        responses.append({"status_code": status_code, "body": jsonable_encoder(body)})
+    return {"responses": responses}
 
 
 def calculate_discount(amount: float, promotion: Dict) -> float:
@@ -416,81 +1417,29 @@ def calculate_discount(amount: float, promotion: Dict) -> float:
 def reset_state() -> None:
     products_db.clear()
     products_db.update({pid: product.copy() for pid, product in BASE_PRODUCTS.items()})
+    global _indexes_ready
+    _indexes_ready = False
+    search_index.rebuild([])
+    for index in sorted_indexes.values():
+        index.rebuild([])
     carts_db.clear()
     orders_db.clear()
+    order_archive.clear()
+    flash_sales.clear()
+    idempotency_store.clear()
+    low_stock.clear()
+    low_stock_events.clear()
+    _set_checkout_pipeline(None)
     product_locks.clear()
+    cart_locks.clear()
     global order_counter
     order_counter = 1
-
-
-def _calculate_trace_coverage(results) -> Optional[float]:
-    project_root = Path(__file__).parent.parent.resolve()
-    file_hits: Dict[Path, Dict[int, int]] = {}
-
-    for (filename, lineno), count in results.counts.items():
-        path = Path(filename).resolve()
-        if project_root not in path.parents:
-            continue
-        file_hits.setdefault(path, {})[lineno] = count
-
-    total_lines = 0
-    executed_lines = 0
-    for path, line_hits in file_hits.items():
-        try:
-            file_lines = path.read_text(encoding="utf-8").splitlines()
-        except OSError:
-            continue
-        total_lines += len(file_lines)
-        executed_lines += sum(1 for lineno in range(1, len(file_lines) + 1) if line_hits.get(lineno, 0) > 0)
-
-    if total_lines == 0:
-        return None
-    return round(executed_lines / total_lines * 100, 2)
-
-
-@app.get("/test_dashboard")
-def serve_test_dashboard():
-    dashboard_path = STATIC_DIR / "test_dashboard.html"
-    if dashboard_path.exists():
-        return FileResponse(dashboard_path)
-    return HTMLResponse("<h1>Test dashboard not found</h1>", status_code=404)
-
-
-@app.post("/api/tests/run")
-def run_tests():
-    tracer = Trace(count=True, trace=False, infile=None, outfile=None)
-    stdout_buffer = io.StringIO()
-    stderr_buffer = io.StringIO()
-    with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-        result_code = tracer.runfunc(pytest.main, ["-q"])
-
-    results = tracer.results()
-    results.write_results(show_missing=True, summary=True, coverdir=str(COVERAGE_DIR))
-    coverage_percent = _calculate_trace_coverage(results)
-    coverage_report = COVERAGE_DIR / "index.html"
-    coverage_report.write_text(
-        f"""
-        <html><body>
-        <h1>测试覆盖率</h1>
-        <p>覆盖率: {coverage_percent if coverage_percent is not None else '未知'}%</p>
-        <h2>Pytest 输出</h2>
-        <pre>{html.escape(stdout_buffer.getvalue())}</pre>
-        <h2>Pytest 错误</h2>
-        <pre>{html.escape(stderr_buffer.getvalue())}</pre>
-        </body></html>
-        """
-    )
-
-    response = {
-        "return_code": result_code,
-        "stdout": stdout_buffer.getvalue(),
-        "stderr": stderr_buffer.getvalue(),
-        "coverage_percent": f"{coverage_percent}%" if coverage_percent is not None else None,
-        "coverage_report": "/coverage/index.html",
-    }
-    if result_code == 0:
-        return response
-    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=response)
+    for product_id in BASE_PRODUCTS:
+        _product_changed(product_id)
+    change_feed.clear()
+    product_list_cache.clear()
+    product_list_cache.reset_stats()
+    PROFILER.reset()
 
 
 if __name__ == "__main__":
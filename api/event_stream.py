@@ -0,0 +1,157 @@
+"""
+有界事件环
+
+写入方调用 publish() 追加事件并分配递增的序号（从 1 开始），环满后覆盖最旧的事件，写入方永远不会因为
+消费者慢而阻塞。消费者按序号续读：请求的序号之后的事件已被覆盖时，先收到一个 gap 事件，
+说明丢失的数量以及可以继续读取的位置，需要完整状态的消费者应在此时重新拉取全量数据。
+
+SSE 接口使用 aiter_batches：等待新事件时挂起在事件循环上而不是占用线程池的线程，
+订阅者再多也不会挤占同步接口可用的线程；iter_batches 供线程中的消费者使用。
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from typing import AsyncIterator, Deque, Iterator, List, Optional, Set, Tuple
+
+
+class EventRing:
+    def __init__(self, capacity: int = 1024):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._events: Deque[dict] = deque(maxlen=capacity)
+        self._next_seq = 1
+        # 最近一次 clear() 时的最后序号，since=0 的新消费者从这里开始读
+        self._cleared_through = 0
+        self._condition = threading.Condition()
+        # 等待新事件的异步消费者：(所在的事件循环, 唤醒用的 asyncio.Event)
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def last_seq(self) -> int:
+        """最近一个事件的序号，没有事件时为 0"""
+        return self._next_seq - 1
+
+    def publish(self, event_type: str, **data) -> dict:
+        with self._condition:
+            event = {"seq": self._next_seq, "type": event_type, **data}
+            self._next_seq += 1
+            self._events.append(event)
+            self._condition.notify_all()
+            for loop, wakeup in self._waiters:
+                try:
+                    loop.call_soon_threadsafe(wakeup.set)
+                except RuntimeError:
+                    # 消费者的事件循环已关闭，由它自己的 finally 移除
+                    pass
+        return event
+
+    def read(self, since: int = 0, limit: Optional[int] = None) -> Tuple[List[dict], int]:
+        """返回 (序号大于 since 的事件, 已被覆盖而丢失的事件数)"""
+        with self._condition:
+            return self._read(since, limit)
+
+    def _read(self, since: int, limit: Optional[int]) -> Tuple[List[dict], int]:
+        since = since or self._cleared_through
+        if not self._events or since >= self.last_seq:
+            return [], 0
+        first = self._events[0]["seq"]
+        missed = max(first - since - 1, 0)
+        offset = max(since + 1 - first, 0)
+        end = len(self._events) if limit is None else min(len(self._events), offset + limit)
+        return list(itertools.islice(self._events, offset, end)), missed
+
+    def _next_batch(self, since: int, batch: int) -> List[dict]:
+        """读取 since 之后的一批事件，有事件被覆盖时在最前面插入 gap 事件；调用方需持有 _condition"""
+        events, missed = self._read(since, batch)
+        if missed:
+            resume_from = events[0]["seq"] - 1
+            events.insert(0, {"seq": resume_from, "type": "gap", "missed": missed, "resume_from": resume_from})
+        return events
+
+    def iter_batches(self, since: int = 0, timeout: float = 15.0, batch: int = 256,
+                     follow: bool = True) -> Iterator[List[dict]]:
+        """
+        从 since 之后开始按批产出事件，每批最多 batch 个；落后的消费者每次拿到更大的批，以更少的写出次数追上
+
+        follow 为 True 时持续等待新事件，超过 timeout 秒没有新事件时产出空列表供调用方发送心跳；
+        为 False 时读完当前积压的事件即结束。
+        """
+        while True:
+            with self._condition:
+                if follow and since >= self.last_seq:
+                    self._condition.wait(timeout)
+                events = self._next_batch(since, batch)
+            if not events:
+                if not follow:
+                    return
+                yield []
+                continue
+            yield events
+            since = events[-1]["seq"]
+
+    async def aiter_batches(self, since: int = 0, timeout: float = 15.0, batch: int = 256,
+                            follow: bool = True) -> AsyncIterator[List[dict]]:
+        """iter_batches 的异步版本，等待期间不占用线程"""
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = None
+            with self._condition:
+                events = self._next_batch(since, batch)
+                if not events and follow:
+                    # 在读取时登记，读取之后发布的事件一定会唤醒这里
+                    waiter = (loop, asyncio.Event())
+                    self._waiters.add(waiter)
+            if waiter is not None:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                    timed_out = False
+                except asyncio.TimeoutError:
+                    timed_out = True
+                finally:
+                    with self._condition:
+                        self._waiters.discard(waiter)
+                if timed_out:
+                    yield []
+                continue
+            if not events:
+                return
+            yield events
+            since = events[-1]["seq"]
+
+    def iter_events(self, since: int = 0, timeout: float = 15.0, batch: int = 256,
+                    follow: bool = True) -> Iterator[Optional[dict]]:
+        """逐个产出事件，心跳为 None，其余同 iter_batches"""
+        for events in self.iter_batches(since, timeout, batch, follow):
+            if not events:
+                yield None
+            yield from events
+
+    def clear(self) -> None:
+        """
+        清空事件（用于重置测试数据）
+
+        序号继续递增而不从 1 重新编号：带着清空前的序号续传的消费者会收到 gap 事件，
+        而不是把新事件误认为已经读过而跳过；since=0 的新消费者从清空之后开始读，不会收到 gap。
+        """
+        with self._condition:
+            self._events.clear()
+            self._cleared_through = self.last_seq
+
+
+def format_sse(event: Optional[dict]) -> str:
+    """把事件格式化为一条 SSE 消息，None 为心跳注释"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def resume_position(since: Optional[int], last_event_id: Optional[str]) -> int:
+    """续传位置：优先使用查询参数 since，其次是 Last-Event-ID 请求头"""
+    if since is not None:
+        return since
+    if last_event_id and last_event_id.isdigit():
+        return int(last_event_id)
+    return 0
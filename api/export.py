@@ -0,0 +1,137 @@
+"""
+全量导出
+
+对账需要把整个 dict 存储逐行导出为 NDJSON，导出期间不能长时间持有 global_lock，也不能为了一致性先复制整表。
+这里采用写时复制快照：
+
+- open() 时只记下当前最大键（调用方需持有能挡住多记录写入的锁，例如 global_lock），之后立即放锁；
+- 写入方修改、删除或创建记录之前调用 preserve()，存在活跃快照时把记录的旧值（不存在时为 None）
+  登记到这些快照中，每个快照每条记录只登记一次；
+- 导出方按键顺序分块读取：登记过旧值的用旧值，否则读当前值。读取一块时持有快照锁，
+  与 preserve() 互斥，因此读到的当前值一定是快照时刻的值。
+
+导出期间额外占用的内存只与导出期间被修改的记录数有关，与数据总量无关。
+preserve() 只对持有 global_lock 的写入方成立：open() 也在 global_lock 下执行，两者不会交错。
+不经过 global_lock 的写入方（秒杀路径）必须把写入放在 `with store.writing(key):` 中：
+登记旧值与写入都在快照锁内完成，open() 要么在写入之前（登记旧值），要么在写入之后（读到新值），
+不会出现检查时没有快照、写入时快照已经打开的情况。
+"""
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional
+
+_MISSING = object()
+
+
+class StoreSnapshot:
+    def __init__(self, owner: "SnapshotStore", max_key: int):
+        self.owner = owner
+        self.max_key = max_key
+        self.preimages: Dict[int, Optional[dict]] = {}
+
+    def iter_chunks(self, encode: Callable[[dict], bytes], chunk_size: int = 1000) -> Iterator[List[bytes]]:
+        """按键升序产出编码后的记录，每块最多 chunk_size 个键"""
+        for start in range(1, self.max_key + 1, chunk_size):
+            stop = min(start + chunk_size, self.max_key + 1)
+            with self.owner._lock:
+                read, fallback = self.owner.read, self.owner.fallback
+                chunk = []
+                for key in range(start, stop):
+                    record = self.preimages.get(key, _MISSING)
+                    if record is _MISSING:
+                        record = read(key)
+                        if record is None and fallback is not None:
+                            record = fallback(key)
+                    if record is not None:
+                        chunk.append(encode(record))
+            if chunk:
+                yield chunk
+
+    def close(self) -> None:
+        self.owner.close(self)
+
+
+class SnapshotStore:
+    """
+    为以递增整数为键的 dict 存储提供写时复制快照
+
+    fallback 用于读取已移出 store 的记录（例如归档的订单），记录须先能从 fallback 读到再从 store 删除。
+    """
+
+    def __init__(self, store: MutableMapping[int, dict], fallback: Optional[Callable[[int], Optional[dict]]] = None):
+        self.store = store
+        self.fallback = fallback
+        # SnapshotCatalog.peek() 读取记录时不会把快照中的记录解码进内存常驻
+        self.read: Callable[[int], Optional[dict]] = getattr(store, "peek", store.get)
+        self._lock = threading.Lock()
+        self._active: List[StoreSnapshot] = []
+
+    def open(self, max_key: Optional[int] = None) -> StoreSnapshot:
+        """创建快照；max_key 为快照覆盖的最大键，默认为当前最大键"""
+        with self._lock:
+            if max_key is None:
+                max_key = max(self.store, default=0)
+            snapshot = StoreSnapshot(self, max_key)
+            self._active.append(snapshot)
+            return snapshot
+
+    def close(self, snapshot: StoreSnapshot) -> None:
+        with self._lock:
+            if snapshot in self._active:
+                self._active.remove(snapshot)
+            snapshot.preimages.clear()
+
+    def preserve(self, key: int) -> None:
+        """
+        写入 key 之前调用；没有活跃快照时直接返回
+
+        不加锁检查 _active 只在调用方持有 global_lock（与 open() 互斥）时成立，其余写入方使用 writing()。
+        """
+        if not self._active:
+            return
+        with self._lock:
+            self._preserve_locked(key)
+
+    @contextmanager
+    def writing(self, key: int) -> Iterator[None]:
+        """不持有 global_lock 的写入方用它包住对 key 的写入，写入期间快照不能打开，也不能读取该记录"""
+        with self._lock:
+            if self._active:
+                self._preserve_locked(key)
+            yield
+
+    def _preserve_locked(self, key: int) -> None:
+        record = _MISSING
+        for snapshot in self._active:
+            if key > snapshot.max_key or key in snapshot.preimages:
+                continue
+            if record is _MISSING:
+                record = self.read(key)
+                record = dict(record) if record is not None else None
+            snapshot.preimages[key] = record
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+
+def ndjson_stream(snapshot: StoreSnapshot, encode: Callable[[dict], bytes],
+                  chunk_size: int = 1000) -> Iterator[bytes]:
+    """把快照逐块编码为 NDJSON，结束或被中断时关闭快照"""
+    try:
+        for chunk in snapshot.iter_chunks(encode, chunk_size):
+            chunk.append(b"")
+            yield b"\n".join(chunk)
+    finally:
+        snapshot.close()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """增量 gzip 压缩，压缩器内部缓冲未满时不产出空块"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,131 @@
+"""
+秒杀模式：热点商品的分片库存
+
+开启后商品库存拆成 K 个分片，每个分片有独立的锁与三个计数：可售(available)、已预留(reserved)、已售出(sold)。
+加购、移除、下单只是把数量在同一分片的计数之间移动：优先使用 hint（用户 ID）对应的分片，
+不足时依次尝试其他分片；单个分片都不够时锁住全部分片按总量判断，并把来源计数重新均分到各分片（再平衡）。
+任何时刻每个计数都不为负，各分片 available + reserved + sold 之和不变，因此不会超卖。
+
+商品字典中的 stock/reserved 由调用方在商品锁内用 totals() 刷新，仅供展示；结束秒杀时 close() 在锁住全部
+分片的情况下给出准确的最终值，此后所有操作都抛出 SaleClosed，调用方回退到普通路径。
+"""
+import threading
+from typing import List, Tuple
+
+DEFAULT_SHARDS = 8
+
+AVAILABLE, RESERVED, SOLD = 0, 1, 2
+_FIELD_NAMES = ("available", "reserved", "sold")
+
+
+class SaleClosed(Exception):
+    """秒杀已结束，调用方应回退到普通路径重试"""
+
+
+class _StockShard:
+    __slots__ = ("lock", "counts")
+
+    def __init__(self, available: int, reserved: int = 0):
+        self.lock = threading.Lock()
+        self.counts = [available, reserved, 0]
+
+
+class ShardedStock:
+    def __init__(self, product_id: int, stock: int, reserved: int, shards: int = DEFAULT_SHARDS):
+        if shards < 1:
+            raise ValueError("shards must be positive")
+        self.product_id = product_id
+        self.base_stock = stock
+        self.closed = False
+        self.rebalances = 0
+        base, extra = divmod(max(stock - reserved, 0), shards)
+        self._shards: List[_StockShard] = [
+            _StockShard(base + (1 if index < extra else 0)) for index in range(shards)
+        ]
+        # 开启前已存在的预留量放在第一个分片，移除或下单时按需取用
+        self._shards[0].counts[RESERVED] = reserved
+
+    # ---------- 对外操作 ----------
+
+    def reserve(self, quantity: int, hint: int) -> bool:
+        """加购：可售 -> 已预留，库存不足时返回 False"""
+        return self._move(AVAILABLE, RESERVED, quantity, hint)
+
+    def release(self, quantity: int, hint: int) -> bool:
+        """移出购物车：已预留 -> 可售"""
+        return self._move(RESERVED, AVAILABLE, quantity, hint)
+
+    def commit(self, quantity: int, hint: int) -> bool:
+        """下单：已预留 -> 已售出"""
+        return self._move(RESERVED, SOLD, quantity, hint)
+
+    def cancel(self, quantity: int, hint: int) -> bool:
+        """撤销下单（同一订单中其他商品失败时）：已售出 -> 已预留"""
+        return self._move(SOLD, RESERVED, quantity, hint)
+
+    def totals(self) -> Tuple[int, int]:
+        """不加锁汇总 (stock, reserved)，并发修改时只是近似值"""
+        reserved = sold = 0
+        for shard in self._shards:
+            counts = shard.counts
+            reserved += counts[RESERVED]
+            sold += counts[SOLD]
+        return self.base_stock - sold, reserved
+
+    def close(self) -> Tuple[int, int]:
+        """结束秒杀，返回准确的 (stock, reserved)"""
+        self._acquire_all()
+        try:
+            self.closed = True
+            return self.totals()
+        finally:
+            self._release_all()
+
+    def stats(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "closed": self.closed,
+            "rebalances": self.rebalances,
+            "shards": [dict(zip(_FIELD_NAMES, shard.counts)) for shard in self._shards],
+        }
+
+    # ---------- 内部实现 ----------
+
+    def _move(self, source: int, target: int, quantity: int, hint: int) -> bool:
+        count = len(self._shards)
+        for offset in range(count):
+            shard = self._shards[(hint + offset) % count]
+            with shard.lock:
+                if self.closed:
+                    raise SaleClosed
+                counts = shard.counts
+                if counts[source] >= quantity:
+                    counts[source] -= quantity
+                    counts[target] += quantity
+                    return True
+        return self._move_rebalancing(source, target, quantity, hint)
+
+    def _move_rebalancing(self, source: int, target: int, quantity: int, hint: int) -> bool:
+        self._acquire_all()
+        try:
+            if self.closed:
+                raise SaleClosed
+            remaining = sum(shard.counts[source] for shard in self._shards) - quantity
+            if remaining < 0:
+                return False
+            self._shards[hint % len(self._shards)].counts[target] += quantity
+            base, extra = divmod(remaining, len(self._shards))
+            for index, shard in enumerate(self._shards):
+                shard.counts[source] = base + (1 if index < extra else 0)
+            self.rebalances += 1
+            return True
+        finally:
+            self._release_all()
+
+    def _acquire_all(self) -> None:
+        for shard in self._shards:
+            shard.lock.acquire()
+
+    def _release_all(self) -> None:
+        for shard in reversed(self._shards):
+            shard.lock.release()
@@ -0,0 +1,103 @@
+"""
+组提交队列
+
+请求线程调用 submit() 把任务放入队列并拿到 Future；唯一的提交线程取出第一个任务后，
+最多再等待 max_wait 秒、凑满 max_batch 个任务，然后用一次 commit_batch 调用处理整批任务，
+再逐个设置 Future 的结果。commit_batch 返回与输入等长的列表，元素为结果或异常实例（按单个任务失败处理）；
+commit_batch 本身抛出的异常会传给整批任务。
+
+close() 之后 submit() 抛出 QueueClosed，已入队的任务仍会被处理完。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+_STOP = object()
+
+
+class QueueClosed(RuntimeError):
+    """队列已关闭，调用方应改为直接处理"""
+
+
+class GroupCommitQueue:
+    def __init__(self, commit_batch: Callable[[Sequence[Any]], Sequence[Any]], max_batch: int = 64,
+                 max_wait: float = 0.002, name: str = "group-commit"):
+        if max_batch < 1:
+            raise ValueError("max_batch must be positive")
+        self.commit_batch = commit_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.committed = 0
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise QueueClosed("group commit queue is closed")
+            self._queue.put((item, future))
+        return future
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """停止接收新任务，等待已入队的任务处理完"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "committed": self.committed,
+            "average_batch": round(self.committed / self.batches, 2) if self.batches else None,
+            "closed": self._closed,
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch: List[Tuple[Any, Future]] = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Any, Future]]) -> None:
+        pending = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        try:
+            results = self.commit_batch([item for item, _ in pending])
+        except BaseException as exc:  # noqa: BLE001 - 整批失败时传给每个请求
+            for _, future in pending:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.committed += len(pending)
+        for (_, future), result in zip(pending, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,114 @@
+"""
+幂等键存储
+
+客户端在写请求上携带 Idempotency-Key，服务端按 (用户, 接口, 键) 记录请求指纹与第一次执行的结果：
+- 相同键、相同请求重试时直接返回记录的结果，不再进入加锁的业务逻辑；
+- 第一次请求仍在执行时，重复请求等待其完成后返回同一结果；
+- 相同键用于不同的请求体时拒绝（422）。
+
+只记录成功结果与 4xx 业务错误；执行中抛出其他异常时删除记录，允许客户端用同一个键重试。
+记录按写入顺序保存，超过 ttl 或超出 max_entries 时从最旧的开始淘汰。仍在执行中的记录不会被淘汰：
+淘汰后重复请求会成为新的执行者，把同一个写请求再执行一次；因此执行中的请求很多时，记录数可以暂时超过 max_entries。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class IdempotencyMismatch(Exception):
+    """同一个幂等键被用于不同的请求"""
+
+
+class IdempotencyRecord:
+    __slots__ = ("fingerprint", "created_at", "done", "status_code", "body", "error")
+
+    def __init__(self, fingerprint: str, created_at: float):
+        self.fingerprint = fingerprint
+        self.created_at = created_at
+        self.done = threading.Event()
+        self.status_code: Optional[int] = None
+        self.body: Any = None
+        # 执行失败且不应缓存时为 True，等待者需要重新发起
+        self.error = False
+
+
+def fingerprint(*parts: Any) -> str:
+    """请求指纹：对请求参数做规范化 JSON 后取 SHA-256"""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[Hashable, IdempotencyRecord]" = OrderedDict()
+
+    def begin(self, key: Hashable, request_fingerprint: str) -> Tuple[IdempotencyRecord, bool]:
+        """
+        登记一次请求，返回 (记录, 是否由当前请求执行)
+
+        返回 False 时记录属于之前的请求，调用方应等待 record.done 后复用结果。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            record = self._records.get(key)
+            if record is not None:
+                if record.fingerprint != request_fingerprint:
+                    raise IdempotencyMismatch(key)
+                return record, False
+            record = self._records[key] = IdempotencyRecord(request_fingerprint, now)
+            self._evict_overflow()
+            return record, True
+
+    def complete(self, record: IdempotencyRecord, status_code: int, body: Any) -> None:
+        record.status_code = status_code
+        record.body = body
+        record.done.set()
+
+    def abandon(self, key: Hashable, record: IdempotencyRecord) -> None:
+        """执行失败：删除记录并唤醒等待者"""
+        with self._lock:
+            if self._records.get(key) is record:
+                del self._records[key]
+        record.error = True
+        record.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _expire(self, now: float) -> None:
+        expired = []
+        for key, record in self._records.items():
+            if now - record.created_at < self.ttl:
+                break
+            if record.done.is_set():
+                expired.append(key)
+        for key in expired:
+            del self._records[key]
+
+    def _evict_overflow(self) -> None:
+        """超出 max_entries 时从最旧的开始淘汰已完成的记录，跳过执行中的记录"""
+        overflow = len(self._records) - self.max_entries
+        if overflow <= 0:
+            return
+        evicted = []
+        for key, record in self._records.items():
+            if record.done.is_set():
+                evicted.append(key)
+                if len(evicted) == overflow:
+                    break
+        for key in evicted:
+            del self._records[key]
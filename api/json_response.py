@@ -0,0 +1,59 @@
+"""
+快速 JSON 响应
+
+接口返回的都是由 dict/list/str/数字组成的存储记录，不需要 FastAPI 通用的 jsonable_encoder，
+这里直接序列化为字节。只有接口函数直接返回 FastJSONResponse 时才会跳过 jsonable_encoder：
+商品、购物车、促销与订单等热点读接口都这样返回；其余返回 dict 的接口仍先经过 FastAPI 的
+serialize_response（jsonable_encoder），default_response_class 只替换最后一步的渲染。
+
+安装了 orjson 时优先使用，否则回退到标准库 json；也可以通过环境变量 ECOMMERCE_JSON_BACKEND 指定，
+指定的实现不可用（例如未安装 orjson）时回退到默认实现，json_backend 记录实际使用的实现。
+"""
+import json
+import os
+from typing import Any, Callable, Dict
+
+from fastapi import Response
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _load_backends() -> Dict[str, Callable[[Any], bytes]]:
+    backends: Dict[str, Callable[[Any], bytes]] = {"stdlib": _stdlib_dumps}
+    try:
+        import orjson
+    except ImportError:
+        return backends
+
+    def _orjson_dumps(content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+    backends["orjson"] = _orjson_dumps
+    return backends
+
+
+JSON_BACKENDS = _load_backends()
+json_backend = os.environ.get("ECOMMERCE_JSON_BACKEND") or ""
+if json_backend not in JSON_BACKENDS:
+    json_backend = "orjson" if "orjson" in JSON_BACKENDS else "stdlib"
+dumps: Callable[[Any], bytes] = JSON_BACKENDS[json_backend]
+
+
+def set_json_backend(name: str) -> None:
+    """切换序列化实现，name 为 JSON_BACKENDS 中的键"""
+    global dumps, json_backend
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"unknown JSON backend: {name}, available: {sorted(JSON_BACKENDS)}")
+    json_backend = name
+    dumps = JSON_BACKENDS[name]
+
+
+class FastJSONResponse(Response):
+    """直接把存储记录序列化为字节的 JSON 响应"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,134 @@
+"""
+锁竞争分析
+
+默认关闭；开启后 InstrumentedLock 每次释放时把 (锁名, 键, 等待时间, 持有时间, 是否发生竞争) 交给 PROFILER，
+按锁名分别汇总到容量固定的 top-K 结构（Space-Saving 算法）：
+已跟踪的键直接累加；容量已满时替换累计等待时间最小的条目，新条目继承被替换者的等待时间作为误差上界。
+这样热点商品一定留在表中，内存与商品数无关。
+
+记录时需要获取分析器自身的锁，只在排查问题时开启。
+"""
+import threading
+import time
+from typing import Dict, Hashable, List, Optional
+
+DEFAULT_CAPACITY = 64
+
+
+class _Entry:
+    __slots__ = ("key", "weight", "error", "acquisitions", "contended", "wait_total", "wait_max",
+                 "hold_total", "hold_max")
+
+    def __init__(self, key: Hashable, error: float):
+        self.key = key
+        # 排序依据：累计等待时间（含继承的误差）
+        self.weight = error
+        self.error = error
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "contention_rate": round(self.contended / self.acquisitions, 4) if self.acquisitions else None,
+            "wait_total_ms": round(self.wait_total * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "hold_total_ms": round(self.hold_total * 1000, 3),
+            "hold_max_ms": round(self.hold_max * 1000, 3),
+            "error_ms": round(self.error * 1000, 3),
+        }
+
+
+class SpaceSaving:
+    """按累计等待时间保留前 capacity 个键的近似 top-K"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.entries: Dict[Hashable, _Entry] = {}
+        self.evictions = 0
+
+    def add(self, key: Hashable, wait: float, hold: float, contended: bool) -> None:
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) < self.capacity:
+                entry = _Entry(key, 0.0)
+            else:
+                # 只在替换时线性扫描一次，容量通常只有几十
+                victim = min(self.entries.values(), key=lambda item: item.weight)
+                del self.entries[victim.key]
+                self.evictions += 1
+                entry = _Entry(key, victim.weight)
+            self.entries[key] = entry
+        entry.weight += wait
+        entry.acquisitions += 1
+        entry.contended += contended
+        entry.wait_total += wait
+        entry.hold_total += hold
+        if wait > entry.wait_max:
+            entry.wait_max = wait
+        if hold > entry.hold_max:
+            entry.hold_max = hold
+
+    def top(self, limit: Optional[int] = None) -> List[dict]:
+        entries = sorted(self.entries.values(), key=lambda item: (item.weight, item.contended), reverse=True)
+        return [entry.to_dict() for entry in entries[:limit]]
+
+
+class LockProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.capacity = DEFAULT_CAPACITY
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._tables: Dict[str, SpaceSaving] = {}
+
+    def start(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        """清空已有数据并开始记录"""
+        with self._lock:
+            self.capacity = capacity
+            self._tables = {}
+            self.started_at = time.time()
+            self.enabled = True
+
+    def stop(self) -> None:
+        """停止记录，保留已有数据供查看"""
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.enabled = False
+            self._tables = {}
+            self.started_at = None
+
+    def record(self, lock_name: str, key: Hashable, wait: float, hold: float, contended: bool) -> None:
+        with self._lock:
+            if not self.enabled:
+                return
+            table = self._tables.get(lock_name)
+            if table is None:
+                table = self._tables[lock_name] = SpaceSaving(self.capacity)
+            table.add(key, wait, hold, contended)
+
+    def snapshot(self, limit: Optional[int] = None) -> dict:
+        with self._lock:
+            locks = {
+                name: {"tracked": len(table.entries), "evictions": table.evictions, "top": table.top(limit)}
+                for name, table in sorted(self._tables.items())
+            }
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "started_at": self.started_at,
+            "locks": locks,
+        }
+
+
+PROFILER = LockProfiler()
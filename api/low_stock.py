@@ -0,0 +1,118 @@
+"""
+低库存监控
+
+只跟踪设置了阈值的商品。可用库存（stock - reserved）低于阈值即为低库存：
+- 每次库存变化 O(1) 判断是否跨过阈值，跨过时向事件环发布 low_stock / restocked 事件；
+- 按 可用库存 - 阈值 维护最小堆，列出低库存商品时只访问堆顶的负值部分，代价为 O(k log k)。
+
+堆采用延迟删除：更新时压入新条目并递增商品版本号，旧条目在遍历时跳过，
+过期条目超过有效条目一倍时整体重建，摊还后每次更新 O(log n)。
+"""
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from api.event_stream import EventRing
+
+
+class LowStockMonitor:
+    def __init__(self, events: Optional[EventRing] = None):
+        self.events = events
+        self._lock = threading.Lock()
+        self._thresholds: Dict[int, int] = {}
+        self._available: Dict[int, int] = {}
+        # 版本号全局递增，清除阈值后重新设置也不会与堆中的旧条目重号
+        self._versions: Dict[int, int] = {}
+        self._version_counter = itertools.count(1)
+        # (可用库存 - 阈值, 商品ID, 版本号)
+        self._heap: List[Tuple[int, int, int]] = []
+
+    def set_threshold(self, product_id: int, threshold: int, available: int) -> dict:
+        with self._lock:
+            was_low = self._is_low(product_id)
+            self._thresholds[product_id] = threshold
+            self._available[product_id] = available
+            self._push(product_id)
+            self._notify(product_id, was_low)
+            return self._state(product_id)
+
+    def clear_threshold(self, product_id: int) -> bool:
+        with self._lock:
+            if self._thresholds.pop(product_id, None) is None:
+                return False
+            self._available.pop(product_id, None)
+            self._versions.pop(product_id, None)
+            return True
+
+    def update(self, product_id: int, available: int) -> None:
+        """商品可用库存变化；未设置阈值或数值未变时直接返回"""
+        if product_id not in self._thresholds or self._available.get(product_id) == available:
+            return
+        with self._lock:
+            if product_id not in self._thresholds:
+                return
+            was_low = self._is_low(product_id)
+            self._available[product_id] = available
+            self._push(product_id)
+            self._notify(product_id, was_low)
+
+    def below(self, limit: Optional[int] = None) -> List[dict]:
+        """当前低库存的商品，按 可用库存 - 阈值 升序"""
+        with self._lock:
+            heap = self._heap
+            result: List[dict] = []
+            frontier: List[Tuple[Tuple[int, int, int], int]] = [(heap[0], 0)] if heap else []
+            while frontier and (limit is None or len(result) < limit):
+                entry, index = heapq.heappop(frontier)
+                margin, product_id, version = entry
+                if margin >= 0:
+                    break
+                if self._versions.get(product_id) == version:
+                    result.append(self._state(product_id))
+                # 过期条目的子节点仍可能有效，继续向下访问
+                for child in (2 * index + 1, 2 * index + 2):
+                    if child < len(heap) and heap[child][0] < 0:
+                        heapq.heappush(frontier, (heap[child], child))
+            return result
+
+    def thresholds(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._thresholds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._thresholds.clear()
+            self._available.clear()
+            self._versions.clear()
+            self._heap.clear()
+
+    def _is_low(self, product_id: int) -> bool:
+        threshold = self._thresholds.get(product_id)
+        available = self._available.get(product_id)
+        return threshold is not None and available is not None and available < threshold
+
+    def _state(self, product_id: int) -> dict:
+        return {
+            "product_id": product_id,
+            "available": self._available[product_id],
+            "threshold": self._thresholds[product_id],
+            "low": self._is_low(product_id),
+        }
+
+    def _push(self, product_id: int) -> None:
+        version = self._versions[product_id] = next(self._version_counter)
+        margin = self._available[product_id] - self._thresholds[product_id]
+        heapq.heappush(self._heap, (margin, product_id, version))
+        if len(self._heap) > 2 * len(self._versions) + 64:
+            self._heap = [
+                (self._available[pid] - self._thresholds[pid], pid, version)
+                for pid, version in self._versions.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _notify(self, product_id: int, was_low: bool) -> None:
+        is_low = self._is_low(product_id)
+        if self.events is None or is_low == was_low:
+            return
+        self.events.publish("low_stock" if is_low else "restocked", **self._state(product_id))
@@ -0,0 +1,303 @@
+"""
+热点路径指标
+
+每个线程写自己的分片（普通 dict/list，没有锁），只有抓取时才把所有分片合并，
+所以计数和直方图记录的开销只有一次 threading.local 查找加几次字典操作。
+分片随线程创建；线程结束后，其分片在下一次创建分片或抓取时并入一个退役汇总分片，
+分片数量只与存活线程数有关，计数保持单调递增。
+
+- MetricsMiddleware：纯 ASGI 中间件，按路由模板（如 /api/products/{product_id}）记录请求数与延迟；
+- InstrumentedLock：包装 threading.Lock，记录等待与持有时间；
+- render_prometheus()：按 Prometheus 文本格式输出所有指标。
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from api.lock_profiler import PROFILER
+
+Labels = Tuple[str, ...]
+_perf_counter = time.perf_counter
+
+# 秒为单位的默认直方图桶，覆盖微秒级的锁等待到秒级的请求
+DEFAULT_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # 值为 [各桶计数..., 溢出桶计数, 总和, 次数]
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def merge(self, counters: Dict[Tuple[str, Labels], float],
+              histograms: Dict[Tuple[str, Labels], List[float]]) -> None:
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in histograms.items():
+            merged = self.histograms.get(key)
+            if merged is None:
+                self.histograms[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    merged[index] += value
+
+
+class MetricsRegistry:
+    """指标注册表：保存指标定义与各线程的分片"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (所属线程, 分片)；线程结束后分片并入 _retired
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        self._retired = _Shard()
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Iterable[Tuple[Labels, float]]], Sequence[str]]] = {}
+
+    def shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._retire_dead_locked()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead_locked(self) -> None:
+        """把已结束线程的分片并入退役汇总分片；线程结束后不会再写它的分片，调用方需持有 _lock"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._retired.merge(shard.counters, shard.histograms)
+        self._shards = alive
+
+    def _register(self, metric: "_Metric") -> None:
+        if metric.name in self._metrics or metric.name in self._gauges:
+            raise ValueError(f"metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> "Counter":
+        metric = Counter(self, name, help_text, labelnames)
+        self._register(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> "Histogram":
+        metric = Histogram(self, name, help_text, labelnames, buckets)
+        self._register(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help_text: str, labelnames: Sequence[str],
+                       collect: Callable[[], Iterable[Tuple[Labels, float]]]) -> None:
+        """抓取时调用 collect() 取值的 gauge，适合缓存命中率这类已有统计"""
+        if name in self._metrics or name in self._gauges:
+            raise ValueError(f"metric already registered: {name}")
+        self._gauges[name] = (help_text, collect, tuple(labelnames))
+
+    def _snapshot(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+        merged = _Shard()
+        with self._lock:
+            self._retire_dead_locked()
+            merged.merge(self._retired.counters, self._retired.histograms)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # dict.copy() 在 GIL 下一次完成，不会与写线程的插入冲突
+            merged.merge(shard.counters.copy(), shard.histograms.copy())
+        return merged.counters, merged.histograms
+
+    def value(self, name: str, *labels: str) -> float:
+        """合并后的计数器值或直方图观测次数，主要用于测试"""
+        counters, histograms = self._snapshot()
+        if (name, labels) in counters:
+            return counters[(name, labels)]
+        return histograms.get((name, labels), [0])[-1]
+
+    def render_prometheus(self) -> str:
+        counters, histograms = self._snapshot()
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if metric.kind == "counter":
+                for (metric_name, labels), value in sorted(counters.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}")
+                continue
+            for (metric_name, labels), values in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(metric.buckets, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, le=_format_value(bound))} "
+                                 f"{_format_value(cumulative)}")
+                lines.append(f"{name}_bucket{_format_labels(metric.labelnames, labels, le='+Inf')} "
+                             f"{_format_value(values[-1])}")
+                lines.append(f"{name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(values[-2])}")
+                lines.append(f"{name}_count{_format_labels(metric.labelnames, labels)} {_format_value(values[-1])}")
+        for name, (help_text, collect, labelnames) in self._gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in collect():
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], labels: Labels, le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, labels)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = registry._local
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        try:
+            counters = self._local.shard.counters
+        except AttributeError:
+            counters = self.registry.shard().counters
+        key = (self.name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labelnames: Sequence[str],
+                 buckets: Sequence[float]):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        try:
+            histograms = self._local.shard.histograms
+        except AttributeError:
+            histograms = self.registry.shard().histograms
+        key = (self.name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+
+REGISTRY = MetricsRegistry()
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP 请求耗时", ("method", "route"))
+LOCK_WAIT = REGISTRY.histogram("lock_wait_seconds", "获取锁的等待时间", ("lock",))
+LOCK_HOLD = REGISTRY.histogram("lock_hold_seconds", "锁的持有时间", ("lock",))
+LOCK_CONTENDED = REGISTRY.counter("lock_contended_total", "获取锁时已被其他线程持有的次数", ("lock",))
+AUTH_DECODE = REGISTRY.histogram("auth_decode_seconds", "访问令牌解析与校验耗时", ("outcome",))
+
+
+class InstrumentedLock:
+    """
+    带等待/持有时间统计的互斥锁，接口与 threading.Lock 一致
+
+    key 用于锁竞争分析（如商品 ID），分析器开启时每次释放都会上报一次，见 api/lock_profiler.py。
+    """
+
+    __slots__ = ("name", "key", "_lock", "_acquired_at", "_wait", "_contended")
+
+    def __init__(self, name: str, key: Hashable = None):
+        self.name = name
+        self.key = key
+        self._lock = threading.Lock()
+        # 以下字段只有持有者会读写，不需要额外同步
+        self._acquired_at = 0.0
+        self._wait = 0.0
+        self._contended = False
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = _perf_counter()
+        # 先尝试非阻塞获取，失败即说明发生了竞争
+        acquired = self._lock.acquire(False)
+        contended = not acquired
+        if contended:
+            LOCK_CONTENDED.inc(self.name)
+            if blocking:
+                acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            self._acquired_at = now = _perf_counter()
+            self._wait = wait = now - start
+            self._contended = contended
+            LOCK_WAIT.observe(wait, self.name)
+        return acquired
+
+    def release(self) -> None:
+        held = _perf_counter() - self._acquired_at
+        wait, contended = self._wait, self._contended
+        self._lock.release()
+        LOCK_HOLD.observe(held, self.name)
+        if PROFILER.enabled:
+            PROFILER.record(self.name, self.key, wait, held, contended)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class MetricsMiddleware:
+    """纯 ASGI 中间件：按方法、路由模板与状态码统计请求数与耗时"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 FastAPI 会把路由对象写入 scope；挂载的静态目录按挂载路径统计
+            route = scope.get("route")
+            template = getattr(route, "path", None) or scope.get("root_path") or "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, template, str(status_holder[0]))
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, template)
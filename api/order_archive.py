@@ -0,0 +1,161 @@
+"""
+订单归档
+
+超过一定时间的订单从内存中的 orders_db 移到磁盘上的压缩分段文件：
+
+- 每个分段是一个 gzip 压缩的 NDJSON 文件，按订单号升序写入，写完后不再修改（先写临时文件再改名）；
+- 归档总是从上次的位置开始，按订单号连续推进，遇到未过期或尚未写入的订单即停止，
+  因此各分段的订单号区间互不重叠，按区间起点二分即可定位分段；
+- 每个分段在内存中只保留订单号与解压后偏移量两个整数数组（每个订单 16 字节），
+  读取时整段解压，解压结果放入容量固定的 LRU，内存占用与归档订单数基本无关。
+
+写入分段并登记索引之后才从 orders_db 删除，读取方先查 orders_db 再查归档，任何时刻都能找到订单。
+"""
+import bisect
+import gzip
+import json
+import os
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, MutableMapping, Optional, Union
+
+DEFAULT_SEGMENT_RECORDS = 10_000
+DEFAULT_CACHE_SEGMENTS = 8
+
+
+class Segment:
+    __slots__ = ("number", "path", "ids", "offsets", "compressed_size")
+
+    def __init__(self, number: int, path: Path, ids: array, offsets: array, compressed_size: int):
+        self.number = number
+        self.path = path
+        self.ids = ids
+        # offsets[i]:offsets[i + 1] 为 ids[i] 在解压后内容中的位置
+        self.offsets = offsets
+        self.compressed_size = compressed_size
+
+
+class OrderArchive:
+    def __init__(self, directory: Union[str, Path, None] = None, segment_records: int = DEFAULT_SEGMENT_RECORDS,
+                 cache_segments: int = DEFAULT_CACHE_SEGMENTS,
+                 encode: Callable[[dict], bytes] = lambda order: json.dumps(order, ensure_ascii=False).encode()):
+        self._directory = Path(directory) if directory is not None else None
+        self.segment_records = segment_records
+        self.cache_segments = cache_segments
+        self.encode = encode
+        self._lock = threading.Lock()
+        # 同一时间只有一次归档在写分段
+        self._write_lock = threading.Lock()
+        self._segments: List[Segment] = []
+        self._first_ids: List[int] = []
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self.watermark = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def directory(self) -> Path:
+        """分段目录，未指定时在第一次归档时创建临时目录"""
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="ecommerce-orders-"))
+        return self._directory
+
+    def archive(self, store: MutableMapping[int, dict], last_id: int, cutoff: datetime) -> int:
+        """把 store 中订单号不超过 last_id、创建时间早于 cutoff 的连续订单写入分段并移出 store，返回归档数量"""
+        with self._write_lock:
+            archived = 0
+            batch: List[dict] = []
+            order_id = self.watermark + 1
+            while order_id <= last_id:
+                order = store.get(order_id)
+                if order is None or datetime.fromisoformat(order["created_at"]) >= cutoff:
+                    break
+                batch.append(order)
+                if len(batch) == self.segment_records:
+                    archived += self._write_segment(store, batch)
+                    batch = []
+                order_id += 1
+            if batch:
+                archived += self._write_segment(store, batch)
+            return archived
+
+    def get(self, order_id: int) -> Optional[dict]:
+        with self._lock:
+            index = bisect.bisect_right(self._first_ids, order_id) - 1
+            if index < 0:
+                return None
+            segment = self._segments[index]
+            position = bisect.bisect_left(segment.ids, order_id)
+            if position == len(segment.ids) or segment.ids[position] != order_id:
+                return None
+            data = self._decoded(segment)
+            start, end = segment.offsets[position], segment.offsets[position + 1]
+        return json.loads(data[start:end])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(segment.ids) for segment in self._segments)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "archived_orders": sum(len(segment.ids) for segment in self._segments),
+                "compressed_bytes": sum(segment.compressed_size for segment in self._segments),
+                "watermark": self.watermark,
+                "cached_segments": len(self._cache),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        """删除全部分段（用于重置测试数据）"""
+        with self._write_lock, self._lock:
+            for segment in self._segments:
+                segment.path.unlink(missing_ok=True)
+            self._segments.clear()
+            self._first_ids.clear()
+            self._cache.clear()
+            self.watermark = 0
+            self.hits = self.misses = 0
+
+    def _write_segment(self, store: MutableMapping[int, dict], orders: List[dict]) -> int:
+        number = len(self._segments) + 1
+        ids = array("q")
+        offsets = array("q", [0])
+        lines = []
+        for order in orders:
+            line = self.encode(order) + b"\n"
+            lines.append(line)
+            ids.append(order["id"])
+            offsets.append(offsets[-1] + len(line))
+        compressed = gzip.compress(b"".join(lines), compresslevel=6)
+        path = self.directory / f"orders-{number:06d}.ndjson.gz"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(compressed)
+        os.replace(temporary, path)
+        with self._lock:
+            self._segments.append(Segment(number, path, ids, offsets, len(compressed)))
+            self._first_ids.append(ids[0])
+            self.watermark = ids[-1]
+        for order_id in ids:
+            store.pop(order_id, None)
+        return len(ids)
+
+    def _decoded(self, segment: Segment) -> bytes:
+        """解压后的分段内容，调用方需持有 self._lock"""
+        data = self._cache.get(segment.number)
+        if data is not None:
+            self.hits += 1
+            self._cache.move_to_end(segment.number)
+            return data
+        self.misses += 1
+        data = gzip.decompress(segment.path.read_bytes())
+        self._cache[segment.number] = data
+        if len(self._cache) > self.cache_segments:
+            self._cache.popitem(last=False)
+        return data
@@ -0,0 +1,89 @@
+"""
+商品列表响应缓存
+
+按 (分类, 分页参数) 缓存已经序列化好的 JSON 字节及构建前读取的 ETag，写接口按分类精确失效。
+未按分类过滤的列表包含所有分类，任何分类失效时都会一并失效。
+
+命中时返回缓存中的 ETag 而不是当前的目录 ETag：写入方先递增版本号、稍后才失效缓存，
+在这之间读到新 ETag 配旧响应体，客户端之后的条件请求会一直得到 304。
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+
+class ResponseCache:
+    """线程安全的 LRU 响应缓存，附带命中率统计"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[str], str, bytes]]" = OrderedDict()
+        # 每个分类的失效代数，写入缓存前校验，防止把失效前构建的旧数据写回缓存
+        self._generations: Dict[Optional[str], int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """返回 (ETag, 响应体)，未命中时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def generation(self, category: Optional[str]) -> Tuple[int, int]:
+        """读取分类当前的失效代数，构建响应前调用"""
+        with self._lock:
+            return self._generations.get(category, 0), self._generations.get(None, 0)
+
+    def put(self, key: Hashable, category: Optional[str], etag: str, body: bytes,
+            generation: Tuple[int, int]) -> None:
+        """写入缓存；etag 须在构建响应体之前读取，若构建期间分类已被失效则放弃写入"""
+        with self._lock:
+            if generation != (self._generations.get(category, 0), self._generations.get(None, 0)):
+                return
+            self._entries[key] = (category, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, categories: Iterable[str]) -> None:
+        """失效指定分类以及未过滤分类的所有缓存条目"""
+        targets = set(categories)
+        with self._lock:
+            for category in targets:
+                self._generations[category] = self._generations.get(category, 0) + 1
+            self._generations[None] = self._generations.get(None, 0) + 1
+            stale = [key for key, (category, _, _) in self._entries.items() if category is None or category in targets]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            for category in list(self._generations):
+                self._generations[category] += 1
+            self._generations[None] = self._generations.get(None, 0) + 1
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+            }
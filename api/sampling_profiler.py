@@ -0,0 +1,144 @@
+"""
+采样式性能分析
+
+按固定间隔读取 sys._current_frames()，把其他线程的调用栈折叠成 "模块:函数;模块:函数" 的形式计数，
+输出可直接交给 flamegraph.pl / speedscope 的 collapsed stacks。与测试任务中逐行记录的
+sys.settrace / sys.monitoring 不同，被分析的线程不执行任何额外代码，开销只在采样线程一侧，随采样频率线性变化。
+
+阻塞在 InstrumentedLock.acquire 上的线程会在栈顶额外加一帧 "lock-wait:<锁名>[<键>]"，
+便于在火焰图中直接看到锁等待。默认只保留经过项目代码的栈，空闲的线程池线程不计入。
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PROJECT_ROOT = str(Path(__file__).parent.parent.resolve())
+MAX_DEPTH = 128
+
+_labels: Dict[object, Tuple[str, bool]] = {}
+
+
+def _frame_label(frame) -> Tuple[str, bool]:
+    """返回 (帧标签, 是否项目代码)，按代码对象缓存"""
+    code = frame.f_code
+    cached = _labels.get(code)
+    if cached is None:
+        module = frame.f_globals.get("__name__", "?")
+        name = getattr(code, "co_qualname", code.co_name)
+        cached = _labels[code] = (
+            f"{module}:{name}",
+            code.co_filename.startswith(PROJECT_ROOT) and module != __name__,
+        )
+    return cached
+
+
+def _lock_wait_label(frame) -> Optional[str]:
+    if frame.f_code.co_name != "acquire":
+        return None
+    owner = frame.f_locals.get("self")
+    if type(owner).__name__ != "InstrumentedLock":
+        return None
+    key = getattr(owner, "key", None)
+    return f"lock-wait:{owner.name}" + (f"[{key}]" if key is not None else "")
+
+
+def collapse_stack(frame) -> Tuple[str, bool]:
+    """把一个线程的调用栈折叠为从根到叶、以分号分隔的字符串"""
+    labels: List[str] = []
+    in_project = False
+    leaf = frame
+    depth = 0
+    while frame is not None and depth < MAX_DEPTH:
+        label, project = _frame_label(frame)
+        labels.append(label)
+        in_project = in_project or project
+        frame = frame.f_back
+        depth += 1
+    labels.reverse()
+    lock_wait = _lock_wait_label(leaf)
+    if lock_wait is not None:
+        labels.append(lock_wait)
+    return ";".join(labels), in_project
+
+
+class SamplingProfiler:
+    """同一时间只允许一次采样，避免多个请求互相干扰"""
+
+    def __init__(self):
+        self._running = threading.Lock()
+
+    def run(self, seconds: float, interval: float = 0.01, include_idle: bool = False) -> Optional[dict]:
+        """采样 seconds 秒；已有采样在进行时返回 None"""
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            return self._sample(seconds, interval, include_idle)
+        finally:
+            self._running.release()
+
+    @staticmethod
+    def _sample(seconds: float, interval: float, include_idle: bool) -> dict:
+        own_thread = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        sampling_cost = 0.0
+        next_tick = started
+        while True:
+            tick = time.perf_counter()
+            if tick >= deadline:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack, in_project = collapse_stack(frame)
+                if in_project or include_idle:
+                    stacks[stack] += 1
+            samples += 1
+            sampling_cost += time.perf_counter() - tick
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 采样落后时不补采，避免连续占用 GIL
+                next_tick = time.perf_counter()
+        elapsed = time.perf_counter() - started
+        return {
+            "seconds": round(elapsed, 3),
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "sampling_cost_ms": round(sampling_cost * 1000, 3),
+            "stacks": [{"stack": stack, "count": count} for stack, count in stacks.most_common()],
+            "top_self": _top(stacks.items(), inclusive=False),
+            "top_inclusive": _top(stacks.items(), inclusive=True),
+        }
+
+
+def _top(stacks: Iterable[Tuple[str, int]], inclusive: bool, limit: int = 20) -> List[dict]:
+    counts: Counter = Counter()
+    total = 0
+    for stack, count in stacks:
+        total += count
+        frames = stack.split(";")
+        if inclusive:
+            for label in set(frames):
+                counts[label] += count
+        else:
+            counts[frames[-1]] += count
+    return [
+        {"frame": label, "count": count, "percent": round(count / total * 100, 2)}
+        for label, count in counts.most_common(limit)
+    ]
+
+
+def to_collapsed(result: dict) -> str:
+    """flamegraph.pl 使用的折叠格式：每行 "栈 次数" """
+    return "".join(f"{item['stack']} {item['count']}\n" for item in result["stacks"])
+
+
+SAMPLER = SamplingProfiler()
@@ -0,0 +1,217 @@
+"""
+商品搜索倒排索引
+
+对商品名称与分类建立内存倒排索引：
+- 拉丁字母与数字按连续片段切词并转小写，查询词按前缀匹配（"iph" 命中 "iphone"）；
+- 中文没有空格分词，按单字与相邻二字（bigram）建索引，查询时单字查单字、多字查其全部 bigram；
+- 查询中的每个词都必须命中（AND），得分为各词 字段权重 × idf 之和，前缀命中按 PREFIX_FACTOR 折扣。
+
+前缀匹配通过有序词表 + bisect 定位；删除商品后留在词表中的空词延迟清理。
+索引自带锁，写接口在修改商品的同一临界区内调用 upsert/remove 增量维护。
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_CJK_START = "\u3400"
+
+NAME_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+PREFIX_FACTOR = 0.7
+# 短于该长度的拉丁查询词只做精确匹配，避免 "a" 之类的前缀展开到整个词表
+MIN_PREFIX_LENGTH = 2
+# 单个查询词最多展开的索引词数量
+MAX_PREFIX_TERMS = 512
+
+
+def _runs(text: str) -> List[str]:
+    return _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def tokenize(text: str) -> List[str]:
+    """建索引用的切词：拉丁片段整体成词，中文片段输出单字与 bigram"""
+    tokens: List[str] = []
+    for run in _runs(text):
+        if run[0] < _CJK_START:
+            tokens.append(run)
+        else:
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_terms(text: str) -> List[Tuple[str, bool]]:
+    """查询切词，返回去重后的 (词, 是否前缀匹配)"""
+    terms: Dict[str, bool] = {}
+    for run in _runs(text):
+        if run[0] < _CJK_START:
+            terms[run] = terms.get(run, False) or len(run) >= MIN_PREFIX_LENGTH
+        elif len(run) == 1:
+            terms.setdefault(run, False)
+        else:
+            for i in range(len(run) - 1):
+                terms.setdefault(run[i:i + 2], False)
+    return list(terms.items())
+
+
+def _top(ranked: Dict[int, float], count: Optional[int]) -> List[Tuple[int, float]]:
+    """按得分降序、商品ID升序取前 count 个；得分只有少数几种取值，先取分数阈值再在同分中取最小的ID"""
+    if count is None or count >= len(ranked):
+        return sorted(ranked.items(), key=lambda item: (-item[1], item[0]))
+    if count <= 0:
+        return []
+    threshold = heapq.nlargest(count, ranked.values())[-1]
+    above = sorted(((product_id, score) for product_id, score in ranked.items() if score > threshold),
+                   key=lambda item: (-item[1], item[0]))
+    tied = heapq.nsmallest(count - len(above), [product_id for product_id, score in ranked.items()
+                                                  if score == threshold])
+    return above + [(product_id, threshold) for product_id in tied]
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 词 -> {商品ID: 字段权重}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 商品ID -> (名称, 分类)，用于判断是否需要重建、分类过滤以及删除时重新切词
+        self._docs: Dict[int, Tuple[str, str]] = {}
+        # 有序词表，可能包含已经没有商品的词（_stale 个）
+        self._terms: List[str] = []
+        self._stale = 0
+
+    @staticmethod
+    def _weigh(name: str, category: str) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for token in set(tokenize(name)):
+            weights[token] = NAME_WEIGHT
+        for token in set(tokenize(category)):
+            weights[token] = weights.get(token, 0.0) + CATEGORY_WEIGHT
+        return weights
+
+    def rebuild(self, products: Iterable[dict]) -> None:
+        """按商品全集重建索引"""
+        postings: Dict[str, Dict[int, float]] = {}
+        docs: Dict[int, Tuple[str, str]] = {}
+        for product in products:
+            product_id, name, category = product["id"], product["name"], product["category"]
+            weights = self._weigh(name, category)
+            docs[product_id] = (name, category)
+            for term, weight in weights.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = {}
+                posting[product_id] = weight
+        with self._lock:
+            self._postings, self._docs = postings, docs
+            self._terms = sorted(postings)
+            self._stale = 0
+
+    def upsert(self, product_id: int, name: str, category: str) -> None:
+        """新增或更新商品；名称与分类都未变化时直接返回"""
+        with self._lock:
+            if self._docs.get(product_id) == (name, category):
+                return
+            self._remove(product_id)
+            weights = self._weigh(name, category)
+            self._docs[product_id] = (name, category)
+            for term, weight in weights.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = {}
+                    index = bisect.bisect_left(self._terms, term)
+                    if index < len(self._terms) and self._terms[index] == term:
+                        self._stale -= 1
+                    else:
+                        self._terms.insert(index, term)
+                posting[product_id] = weight
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            self._remove(product_id)
+
+    def _remove(self, product_id: int) -> None:
+        fields = self._docs.pop(product_id, None)
+        if fields is None:
+            return
+        for term in self._weigh(*fields):
+            posting = self._postings[term]
+            del posting[product_id]
+            if not posting:
+                del self._postings[term]
+                self._stale += 1
+        if self._stale > 1024 and self._stale * 2 > len(self._terms):
+            self._terms = [term for term in self._terms if term in self._postings]
+            self._stale = 0
+
+    def _expand(self, term: str, prefix: bool) -> List[Tuple[str, float]]:
+        """查询词命中的索引词及其折扣系数"""
+        if not prefix:
+            return [(term, 1.0)] if term in self._postings else []
+        matches = []
+        index = bisect.bisect_left(self._terms, term)
+        while index < len(self._terms) and len(matches) < MAX_PREFIX_TERMS:
+            candidate = self._terms[index]
+            if not candidate.startswith(term):
+                break
+            if candidate in self._postings:
+                matches.append((candidate, 1.0 if candidate == term else PREFIX_FACTOR))
+            index += 1
+        return matches
+
+    def search(self, query: str, category: Optional[str] = None, skip: int = 0,
+               limit: Optional[int] = None) -> Tuple[int, List[Tuple[int, float]]]:
+        """返回 (命中总数, 当前页的 [(商品ID, 得分)])，按得分降序、商品ID升序排列"""
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            total_docs = len(self._docs) or 1
+            # 每个查询词：(商品ID -> 得分, 乘数)；只展开到一个索引词时直接引用倒排表，不复制
+            per_term: List[Tuple[Dict[int, float], float]] = []
+            for term, prefix in terms:
+                matches = self._expand(term, prefix)
+                if not matches:
+                    return 0, []
+                if len(matches) == 1:
+                    matched, factor = matches[0]
+                    scores = self._postings[matched]
+                else:
+                    factor = 1.0
+                    scores = {}
+                    for matched, match_factor in matches:
+                        for product_id, weight in self._postings[matched].items():
+                            score = weight * match_factor
+                            if score > scores.get(product_id, 0.0):
+                                scores[product_id] = score
+                # idf 按查询词（含全部前缀展开）的命中数计算，同一个词下精确命中总是排在前缀命中之前
+                per_term.append((scores, factor * math.log(1 + total_docs / len(scores))))
+            # 从命中最少的词开始求交集
+            per_term.sort(key=lambda entry: len(entry[0]))
+            if len(per_term) == 1 and category is None:
+                # 单个词时乘数是常数，只在输出时乘上
+                ranked, scale = per_term[0]
+            else:
+                ranked, scale = {}, 1.0
+                first, first_scale = per_term[0]
+                rest = per_term[1:]
+                for product_id, score in first.items():
+                    score *= first_scale
+                    for scores, term_scale in rest:
+                        other = scores.get(product_id)
+                        if other is None:
+                            break
+                        score += other * term_scale
+                    else:
+                        if category is None or self._docs[product_id][1] == category:
+                            ranked[product_id] = score
+            hits = _top(ranked, None if limit is None else skip + limit)[skip:]
+            return len(ranked), [(product_id, round(score * scale, 4)) for product_id, score in hits]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"documents": len(self._docs), "terms": len(self._postings), "stale_terms": self._stale}
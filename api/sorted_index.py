@@ -0,0 +1,83 @@
+"""
+商品的有序二级索引
+
+按某个数值字段维护有序的 (值, 商品ID) 数组，写入时用 bisect 定位后原地插入/删除；
+范围查询用两次二分找到区间，再按页切片，代价为 O(log n + k)。
+同值按商品ID升序排列，降序查询整体反转，翻页结果稳定。
+
+插入与删除是数组的 memmove，百万级商品时单次约百微秒级，远小于逐条扫描排序。
+"""
+import bisect
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_MAX_ID = float("inf")
+
+
+class SortedIndex:
+    def __init__(self, field: str):
+        self.field = field
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[float, int]] = []
+        self._values: Dict[int, float] = {}
+
+    def rebuild(self, products: Iterable[dict]) -> None:
+        values = {product["id"]: product[self.field] for product in products}
+        entries = sorted((value, product_id) for product_id, value in values.items())
+        with self._lock:
+            self._values, self._entries = values, entries
+
+    def update(self, product_id: int, value: float) -> None:
+        """新增或更新商品的字段值；值未变化时直接返回"""
+        with self._lock:
+            old = self._values.get(product_id)
+            if old == value:
+                return
+            if old is not None:
+                self._delete(old, product_id)
+            self._values[product_id] = value
+            bisect.insort(self._entries, (value, product_id))
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            old = self._values.pop(product_id, None)
+            if old is not None:
+                self._delete(old, product_id)
+
+    def _delete(self, value: float, product_id: int) -> None:
+        index = bisect.bisect_left(self._entries, (value, product_id))
+        del self._entries[index]
+
+    def _bounds(self, low: Optional[float], high: Optional[float]) -> Tuple[int, int]:
+        start = 0 if low is None else bisect.bisect_left(self._entries, (low,))
+        end = len(self._entries) if high is None else bisect.bisect_right(self._entries, (high, _MAX_ID))
+        return start, max(start, end)
+
+    def range(self, low: Optional[float] = None, high: Optional[float] = None, descending: bool = False,
+              skip: int = 0, limit: Optional[int] = None) -> Tuple[int, List[int]]:
+        """返回 low <= 值 <= high 的 (总数, 当前页商品ID)"""
+        with self._lock:
+            start, end = self._bounds(low, high)
+            total = end - start
+            if descending:
+                page_end = end - skip
+                page_start = start if limit is None else max(start, page_end - limit)
+                page = self._entries[page_start:max(page_start, page_end)]
+                page.reverse()
+            else:
+                page_start = start + skip
+                page = self._entries[page_start:end if limit is None else min(end, page_start + limit)]
+        return total, [product_id for _, product_id in page]
+
+    def iter_range(self, low: Optional[float] = None, high: Optional[float] = None,
+                   descending: bool = False) -> Iterator[int]:
+        """按顺序遍历区间内的商品ID（取快照，用于叠加其他过滤条件）"""
+        with self._lock:
+            start, end = self._bounds(low, high)
+            entries = self._entries[start:end]
+        if descending:
+            entries.reverse()
+        return (product_id for _, product_id in entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,504 @@
+"""
+后台测试任务
+
+POST /api/tests/run 只负责提交任务并立即返回任务 ID；pytest 在独立的 worker 进程中运行，
+stdout/stderr 的重定向只影响 worker 自己，多个任务之间互不干扰。
+worker 通过进程间队列实时上报收集数量与每个用例的结果，父进程把事件追加到任务记录上，
+供 SSE 接口推送给测试面板，任务结束后结果仍可查询。SSE 接口使用 aiter_events，等待进度时挂起在事件循环上，
+打开的测试面板不占用线程池的线程。
+
+一个任务可以拆分到多个 worker 并行执行：每个分片都完整收集用例，只保留按顺序切出的连续一段，
+分片各自拥有独立的 ecommerce_api 内存数据；全部分片结束后合并结果与覆盖率，生成一份报告。
+
+使用默认参数运行时会按用例记录覆盖率并更新增量选择映射（见 api.test_selection），
+incremental=True 时只运行受源码修改影响的用例。增量运行的覆盖率与映射中整个套件的覆盖率合并后再生成报告；
+无法合并时（例如映射没有更新）结果标记为 partial，保留上一份完整报告不动。
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+from api.coverage_engine import CoverageData
+from api.coverage_report import generate_html_report
+from api.test_selection import RunPlan, plan_run, suite_coverage, update_map
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+
+# worker 进程内的事件队列，由进程池的 initializer 注入
+_worker_queue = None
+
+
+def _init_worker(event_queue) -> None:
+    global _worker_queue
+    _worker_queue = event_queue
+
+
+class _ProgressPlugin:
+    """pytest 插件：按分片筛选用例，并把收集结果与每个用例的结果写入事件队列"""
+
+    def __init__(self, job_id: str, event_queue, shard: int = 0, shards: int = 1, collector=None):
+        self.job_id = job_id
+        self.queue = event_queue
+        self.shard = shard
+        self.shards = shards
+        self.suite_total: Optional[int] = None
+        # 设置后每个用例的覆盖率记到以 nodeid 命名的上下文中
+        self.collector = collector
+
+    def _emit(self, event_type: str, **data: Any) -> None:
+        self.queue.put({"job_id": self.job_id, "shard": self.shard, "type": event_type, **data})
+
+    def pytest_collection_modifyitems(self, session, config, items) -> None:
+        # 在 -k/-m 等筛选之后执行（trylast），保证各分片按同一份用例列表切分
+        self.suite_total = len(items)
+        if self.shards <= 1:
+            return
+        start = len(items) * self.shard // self.shards
+        end = len(items) * (self.shard + 1) // self.shards
+        # 连续切分而不是轮询分配，同一模块的用例尽量落在同一分片，module 级 fixture 不必重复构建
+        deselected = items[:start] + items[end:]
+        items[:] = items[start:end]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+
+    def pytest_collection_finish(self, session) -> None:
+        total = self.suite_total if self.suite_total is not None else len(session.items)
+        self._emit("collected", total=total)
+
+    def pytest_runtest_logstart(self, nodeid, location) -> None:
+        if self.collector is not None:
+            self.collector.switch_context(nodeid)
+
+    def pytest_runtest_logfinish(self, nodeid, location) -> None:
+        if self.collector is not None:
+            self.collector.switch_context(None)
+
+    def pytest_runtest_logreport(self, report) -> None:
+        # call 阶段上报所有结果；setup/teardown 只上报失败（记为 error）与 setup 阶段的跳过
+        if report.when == "call":
+            outcome = report.outcome
+        elif report.failed:
+            outcome = "error"
+        elif report.skipped and report.when == "setup":
+            outcome = "skipped"
+        else:
+            return
+        self._emit("test", nodeid=report.nodeid, outcome=outcome,
+                   duration=round(report.duration, 4), when=report.when)
+
+
+def run_pytest_job(job_id: str, args: List[str], rootdir: str, collect_coverage: bool = True,
+                   shard: int = 0, shards: int = 1, per_test_coverage: bool = False) -> None:
+    """在 worker 进程中执行 pytest（或其中一个分片），最后一个事件携带完整结果"""
+    import pytest
+
+    from api.coverage_engine import CoverageCollector
+
+    # pytest 只在 worker 中导入，这里再补上 hookimpl 标记
+    pytest.hookimpl(trylast=True)(_ProgressPlugin.pytest_collection_modifyitems)
+    os.chdir(rootdir)
+    collector = CoverageCollector() if collect_coverage else None
+    plugin = _ProgressPlugin(job_id, _worker_queue, shard, shards,
+                             collector if per_test_coverage else None)
+    stdout_buffer = io.StringIO()
+    stderr_buffer = io.StringIO()
+    try:
+        with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
+            if collector is not None:
+                collector.start()
+            try:
+                return_code = int(pytest.main(list(args), plugins=[plugin]))
+            finally:
+                if collector is not None:
+                    collector.stop()
+        coverage = collector.data if collector is not None else None
+        test_coverage = None
+        if plugin.collector is not None:
+            test_coverage = {name: data.to_dict() for name, data in collector.context_data().items()
+                             if name is not None}
+        plugin._emit(
+            "finished",
+            return_code=return_code,
+            stdout=stdout_buffer.getvalue(),
+            stderr=stderr_buffer.getvalue(),
+            coverage_percent=coverage.summary()["percent"] if coverage is not None else None,
+            coverage_data=coverage.to_dict() if coverage is not None else None,
+            test_coverage=test_coverage,
+        )
+    except BaseException as exc:  # worker 内的任何异常都要让父进程知道任务已结束
+        plugin._emit("finished", return_code=-1, stdout=stdout_buffer.getvalue(),
+                     stderr=stderr_buffer.getvalue() + f"\n{type(exc).__name__}: {exc}",
+                     coverage_percent=None, coverage_data=None, test_coverage=None)
+
+
+def _merge_return_codes(codes: List[int]) -> int:
+    """合并各分片的 pytest 退出码：没有收集到用例（5）的分片不影响整体结果"""
+    if any(code < 0 for code in codes):
+        return -1
+    ran = [code for code in codes if code != 5]
+    if not ran:
+        return 5
+    return next((code for code in ran if code != 0), 0)
+
+
+def merge_shard_results(results: List[dict]) -> dict:
+    """把各分片的 finished 事件合并为一个：退出码、输出拼接、覆盖率取并集后重新统计"""
+    if len(results) == 1:
+        return results[0]
+    coverage: Optional[CoverageData] = None
+    if all(result["coverage_data"] is not None for result in results):
+        coverage = CoverageData()
+        for result in results:
+            coverage.update(CoverageData.from_dict(result["coverage_data"]))
+    test_coverage: Optional[Dict[str, dict]] = None
+    if all(result.get("test_coverage") is not None for result in results):
+        test_coverage = {}
+        for result in results:
+            test_coverage.update(result["test_coverage"])
+    total = len(results)
+    return {
+        "type": "finished",
+        "return_code": _merge_return_codes([result["return_code"] for result in results]),
+        "stdout": "\n".join(f"===== shard {index + 1}/{total} =====\n{result['stdout']}"
+                            for index, result in enumerate(results)),
+        "stderr": "\n".join(result["stderr"] for result in results if result["stderr"]),
+        "coverage_percent": coverage.summary()["percent"] if coverage is not None else None,
+        "coverage_data": coverage.to_dict() if coverage is not None else None,
+        "test_coverage": test_coverage,
+    }
+
+
+class JobLimitError(RuntimeError):
+    """同时运行的任务数已达上限"""
+
+
+@dataclass
+class PytestJob:
+    id: str
+    args: List[str]
+    workers: int = 1
+    status: str = "queued"  # queued / running / passed / failed / error
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    events: List[dict] = field(default_factory=list)
+    result: Optional[dict] = None
+    # 增量选择的说明（模式、原因、选中数量）
+    selection: Optional[dict] = None
+    # 合并后的覆盖率数据与执行计划，不随 to_dict 输出
+    coverage: Optional[CoverageData] = None
+    plan: Optional[RunPlan] = field(default=None, repr=False)
+    shard_results: Dict[int, dict] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        tests = [event for event in self.events if event["type"] == "test"]
+        collected = next((event["total"] for event in self.events if event["type"] == "collected"), None)
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "args": self.args,
+            "workers": self.workers,
+            "selection": self.selection,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "collected": collected,
+            "completed": len(tests),
+            "outcomes": {outcome: sum(1 for t in tests if t["outcome"] == outcome)
+                         for outcome in sorted({t["outcome"] for t in tests})},
+        }
+        if include_result:
+            data["tests"] = tests
+            data["result"] = self.result
+        return data
+
+
+class PytestJobManager:
+    """管理测试任务、worker 进程池与进度事件"""
+
+    def __init__(self, coverage_dir: Path, max_workers: Optional[int] = None, max_jobs: int = 20,
+                 max_active: int = 1):
+        self.coverage_dir = Path(coverage_dir)
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_jobs = max_jobs
+        # 每个任务都会启动 worker 进程，未结束的任务超过该数量时拒绝提交
+        self.max_active = max_active
+        self._jobs: "OrderedDict[str, PytestJob]" = OrderedDict()
+        self._condition = threading.Condition()
+        # 等待新事件的异步消费者：(所在的事件循环, 唤醒用的 asyncio.Event)
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue = None
+
+    @property
+    def impact_map_path(self) -> Path:
+        return self.coverage_dir / "test_map.json"
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        # 首次提交任务时才启动进程池；使用 spawn，worker 拥有独立、干净的内存数据
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            if self._queue is None:
+                self._queue = context.Queue()
+                threading.Thread(target=self._pump_events, name="test-job-events", daemon=True).start()
+            options: Dict[str, Any] = {}
+            if sys.version_info >= (3, 11):
+                # 每个分片使用全新进程：内存数据互不影响，模块导入阶段的行也能计入覆盖率
+                options["max_tasks_per_child"] = 1
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=context,
+                initializer=_init_worker, initargs=(self._queue,), **options,
+            )
+        return self._executor
+
+    def submit(self, args: Optional[List[str]] = None, collect_coverage: bool = True,
+               workers: int = 1, incremental: bool = False) -> PytestJob:
+        """
+        提交任务；workers 为并行分片数，超出进程池大小时取进程池大小
+
+        args 为空（运行整个测试套件）且收集覆盖率时，记录每个用例的覆盖率并更新增量选择映射；
+        incremental=True 时根据映射只运行受影响的用例。未结束的任务已达 max_active 时抛出 JobLimitError。
+        """
+        self._check_active()
+        plan = None
+        if args is None and collect_coverage:
+            plan = plan_run(self.impact_map_path, incremental)
+            args = ["-q"] + (plan.nodeids or [])
+        args = list(args) if args is not None else ["-q"]
+        workers = max(1, min(workers, self.max_workers))
+        job = PytestJob(id=uuid.uuid4().hex[:12], args=args, workers=workers, plan=plan,
+                        selection=plan.describe() if plan is not None else None)
+        with self._condition:
+            # 扫描源码期间可能有其他任务提交，登记前再检查一次
+            self._check_active()
+            self._jobs[job.id] = job
+            self._evict_finished()
+            if plan is not None and plan.nodeids == []:
+                # 没有受影响的用例，不必启动 worker
+                self._finish(job, {"type": "finished", "return_code": 0, "stdout": "没有受修改影响的用例\n",
+                                   "stderr": "", "coverage_percent": None, "coverage_data": None})
+                self._notify_locked()
+                return job
+        for shard in range(workers):
+            call = (run_pytest_job, job.id, args, str(PROJECT_ROOT), collect_coverage, shard, workers,
+                    plan is not None)
+            try:
+                future = self._ensure_executor().submit(*call)
+            except BrokenProcessPool:
+                # worker 异常退出后进程池不可再用，重建后重新提交
+                self._executor = None
+                future = self._ensure_executor().submit(*call)
+            future.add_done_callback(lambda done, job_id=job.id: self._on_worker_done(job_id, done))
+        return job
+
+    def _check_active(self) -> None:
+        with self._condition:
+            active = sum(1 for job in self._jobs.values() if not job.finished)
+        if active >= self.max_active:
+            raise JobLimitError(f"已有 {active} 个测试任务在运行")
+
+    def get(self, job_id: str) -> Optional[PytestJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[PytestJob]:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def iter_events(self, job_id: str, start: int = 0, timeout: float = 15.0) -> Iterator[Optional[dict]]:
+        """
+        从第 start 个事件开始依次产出事件，任务结束后停止
+
+        超过 timeout 秒没有新事件时产出 None，调用方可借此发送心跳。
+        """
+        index = start
+        while True:
+            with self._condition:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                if index >= len(job.events) and not job.finished:
+                    self._condition.wait(timeout)
+                pending = job.events[index:]
+                finished = job.finished
+            if not pending and not finished:
+                yield None
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(job.events):
+                return
+
+    async def aiter_events(self, job_id: str, start: int = 0, timeout: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """iter_events 的异步版本，等待期间不占用线程"""
+        loop = asyncio.get_running_loop()
+        index = start
+        while True:
+            waiter = None
+            with self._condition:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                pending = job.events[index:]
+                finished = job.finished
+                if not pending and not finished:
+                    # 在读取时登记，读取之后追加的事件一定会唤醒这里
+                    waiter = (loop, asyncio.Event())
+                    self._waiters.add(waiter)
+            if waiter is not None:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                finally:
+                    with self._condition:
+                        self._waiters.discard(waiter)
+                continue
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(job.events):
+                return
+
+    def _notify_locked(self) -> None:
+        """在持有 _condition 时调用：唤醒同步与异步的事件消费者"""
+        self._condition.notify_all()
+        for loop, wakeup in self._waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # 消费者的事件循环已关闭，由它自己的 finally 移除
+                pass
+
+    # ---------- 事件处理 ----------
+
+    def _pump_events(self) -> None:
+        # 所有任务共用这一个事件线程，处理单个事件出错时只让对应的任务失败，线程继续运行
+        while True:
+            event = self._queue.get()
+            job_id = event.pop("job_id", None)
+            try:
+                self._handle_event(job_id, event.pop("shard", 0), event)
+            except Exception as exc:
+                self._fail(job_id, f"处理 {event.get('type')} 事件失败: {type(exc).__name__}: {exc}")
+
+    def _handle_event(self, job_id: str, shard: int, event: dict) -> None:
+        if event["type"] == "finished":
+            self._on_shard_finished(job_id, shard, event)
+            return
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            # 每个分片都会上报整个任务的用例总数，只保留第一条
+            if event["type"] == "collected" and any(e["type"] == "collected" for e in job.events):
+                return
+            job.status = "running"
+            event["seq"] = len(job.events)
+            job.events.append(event)
+            self._notify_locked()
+
+    def _on_shard_finished(self, job_id: str, shard: int, event: dict) -> None:
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return
+            job.shard_results[shard] = event
+            if len(job.shard_results) < job.workers:
+                return
+            results = [job.shard_results[index] for index in sorted(job.shard_results)]
+            outcomes = {event["nodeid"]: event["outcome"] for event in job.events if event["type"] == "test"}
+        # 合并需要读取源文件统计可执行行，放在锁外进行
+        merged = merge_shard_results(results)
+        # 增量运行只覆盖了选中的用例，需要与映射中整个套件的覆盖率合并
+        partial = job.plan is not None and job.plan.nodeids is not None
+        # 只在用例正常跑完（全部通过或有失败）时更新映射；收集出错或中断时的覆盖率不完整
+        if job.plan is not None and merged["return_code"] in (0, 1) and merged.get("test_coverage") is not None:
+            try:
+                data = update_map(self.impact_map_path, job.plan, merged["test_coverage"], outcomes,
+                                  coverage=merged["coverage_data"])
+            except Exception as exc:  # 写映射失败不能中断事件线程，下次运行会回退为全量
+                merged = dict(merged, stderr=merged["stderr"] + f"\n更新增量映射失败: {type(exc).__name__}: {exc}")
+            else:
+                if partial:
+                    coverage = CoverageData.from_dict(suite_coverage(data))
+                    merged = dict(merged, coverage_data=coverage.to_dict(),
+                                  coverage_percent=coverage.summary()["percent"])
+                    partial = False
+        merged["coverage_partial"] = partial
+        # 先写出报告再发布 finished 事件，订阅方收到结束事件时报告已可访问；
+        # 只有部分用例的覆盖率时保留上一份完整报告
+        if not partial:
+            # 只有完整运行整个套件时才删除数据中已没有的文件的页面
+            self._write_coverage_index(merged, prune=job.plan is not None and job.plan.nodeids is None)
+        with self._condition:
+            if not job.finished:
+                self._finish(job, merged)
+                self._notify_locked()
+
+    def _on_worker_done(self, job_id: str, future: Future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            self._fail(job_id, f"{type(exc).__name__}: {exc}")
+
+    def _fail(self, job_id: Optional[str], message: str) -> None:
+        """把未结束的任务标记为 error"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.finished:
+                self._finish(job, {"type": "finished", "return_code": -1, "stdout": "", "stderr": message,
+                                   "coverage_percent": None, "coverage_data": None})
+                self._notify_locked()
+
+    def _finish(self, job: PytestJob, event: dict) -> None:
+        """在持有 _condition 时调用：记录结果并追加 finished 事件"""
+        return_code = event["return_code"]
+        job.status = "passed" if return_code == 0 else ("error" if return_code < 0 else "failed")
+        job.finished_at = time.time()
+        job.shard_results.clear()
+        job.plan = None
+        if event["coverage_data"] is not None:
+            job.coverage = CoverageData.from_dict(event["coverage_data"])
+        coverage_percent = event["coverage_percent"]
+        job.result = {
+            "return_code": return_code,
+            "stdout": event["stdout"],
+            "stderr": event["stderr"],
+            "coverage_percent": f"{coverage_percent}%" if coverage_percent is not None else None,
+            # 为真时覆盖率只统计了本次选中的用例，报告仍是上一次的
+            "coverage_partial": event.get("coverage_partial", False),
+            "coverage_report": "/coverage/index.html",
+        }
+        job.events.append({"type": "finished", "seq": len(job.events), "status": job.status,
+                           "return_code": return_code, "coverage_percent": job.result["coverage_percent"]})
+
+    def _write_coverage_index(self, event: dict, prune: bool = False) -> None:
+        coverage = CoverageData.from_dict(event["coverage_data"]) if event["coverage_data"] is not None else None
+        generate_html_report(coverage, self.coverage_dir, stdout=event["stdout"], stderr=event["stderr"],
+                             prune=prune)
+
+    def _evict_finished(self) -> None:
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job.finished), None)
+            if oldest is None:
+                return
+            del self._jobs[oldest]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
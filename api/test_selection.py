@@ -0,0 +1,326 @@
+"""
+增量测试选择
+
+测试任务按用例切换覆盖率上下文，记录每个用例执行过的源码行，连同被测源码的内容哈希、逐行哈希、
+函数体范围与可执行行一起保存为 JSON 映射。下次运行时先对比源码：内容哈希不变的文件直接跳过，
+变化的文件用 difflib 比较逐行哈希找出被修改的旧行号，只选择覆盖过这些行的用例，
+再加上上次失败的用例与被修改的测试文件。
+
+映射中还保存了整个套件最近一次的行覆盖率：增量运行只收集了选中用例的覆盖率，
+update_map() 把它与换算到新行号的旧覆盖率合并，报告与覆盖率百分比仍然反映整个套件。
+
+以下情况回退为全量运行：没有历史映射或格式不兼容、修改发生在函数体之外（模块/类级代码、装饰器、函数签名）、
+被修改的行只在用例之外执行过（例如导入或收集阶段调用的函数，这些行记在默认上下文中，没有用例与之对应）、
+被测源码文件被删除、出现新的测试文件。
+"""
+import ast
+import difflib
+import hashlib
+import json
+import os
+import zlib
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from api.coverage_engine import executable_lines
+
+PROJECT_ROOT = Path(__file__).parent.parent.resolve()
+MAP_VERSION = 2
+SOURCE_DIRS = ("api", "offline_requests", "utils", "models")
+TEST_DIRS = ("tests",)
+
+
+@dataclass
+class SourceFile:
+    path: str  # 相对项目根目录的 posix 路径
+    digest: str
+    line_hashes: List[int]
+    text: str
+
+
+@dataclass
+class RunPlan:
+    """一次测试任务的执行计划；nodeids 为 None 表示全量运行"""
+
+    nodeids: Optional[List[str]]
+    reason: str
+    sources: Dict[str, SourceFile] = field(repr=False, default_factory=dict)
+    test_files: Dict[str, str] = field(repr=False, default_factory=dict)
+    previous: Optional[dict] = field(repr=False, default=None)
+
+    def describe(self) -> dict:
+        return {
+            "mode": "full" if self.nodeids is None else "incremental",
+            "reason": self.reason,
+            "selected": None if self.nodeids is None else len(self.nodeids),
+        }
+
+
+def line_hashes(text: str) -> List[int]:
+    return [zlib.crc32(line.encode()) for line in text.splitlines()]
+
+
+def function_body_ranges(text: str) -> List[List[int]]:
+    """函数体（不含 def 行与装饰器）所在的行范围，嵌套函数单独列出"""
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return []
+    return [
+        [node.body[0].lineno, node.end_lineno]
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+
+
+def _read_file(root: Path, path: Path) -> SourceFile:
+    data = path.read_bytes()
+    text = data.decode("utf-8", errors="replace")
+    return SourceFile(
+        path=path.relative_to(root).as_posix(),
+        digest=hashlib.sha256(data).hexdigest(),
+        line_hashes=line_hashes(text),
+        text=text,
+    )
+
+
+def scan_sources(root: Path = PROJECT_ROOT) -> Dict[str, SourceFile]:
+    files = {}
+    for directory in SOURCE_DIRS:
+        for path in sorted((root / directory).rglob("*.py")):
+            source = _read_file(root, path)
+            files[source.path] = source
+    return files
+
+
+def scan_test_files(root: Path = PROJECT_ROOT) -> Dict[str, str]:
+    files = {}
+    for directory in TEST_DIRS:
+        for pattern in ("test_*.py", "*_test.py"):
+            for path in (root / directory).rglob(pattern):
+                files[path.relative_to(root).as_posix()] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return dict(sorted(files.items()))
+
+
+def load_map(map_path: Path) -> Optional[dict]:
+    try:
+        data = json.loads(Path(map_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != MAP_VERSION:
+        return None
+    return data
+
+
+# ---------- 对比源码 ----------
+
+def diff_lines(old_hashes: List[int], new_hashes: List[int]) -> Tuple[Set[int], List[int], Dict[int, int]]:
+    """
+    返回 (被修改或删除的旧行号, 插入点, 旧行号 -> 新行号)
+
+    插入点 n 表示新内容插在旧文件第 n 行之后（0 表示文件开头）。
+    """
+    changed: Set[int] = set()
+    inserts: List[int] = []
+    mapping: Dict[int, int] = {}
+    matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                mapping[i1 + offset + 1] = j1 + offset + 1
+        elif tag == "insert":
+            inserts.append(i1)
+        else:
+            changed.update(range(i1 + 1, i2 + 1))
+    return changed, inserts, mapping
+
+
+def affected_lines(record: dict, changed: Iterable[int], inserts: Iterable[int]) -> Optional[Set[int]]:
+    """
+    把修改映射到旧文件中的可执行行；修改落在函数体之外时返回 None
+
+    续行、注释、文档字符串等不可执行的行归到它之前最近的可执行行，即它所属的语句。
+    插入点取前后两行中位于函数体内的行。
+    """
+    functions = record["functions"]
+
+    def in_function(line: int) -> bool:
+        return any(start <= line <= end for start, end in functions)
+
+    lines = set()
+    for line in changed:
+        if not in_function(line):
+            return None
+        lines.add(line)
+    for point in inserts:
+        candidates = [line for line in (point, point + 1) if in_function(line)]
+        if not candidates:
+            return None
+        lines.update(candidates)
+
+    executable = record["executable"]
+    executable_set = set(executable)
+    result = set()
+    for line in lines:
+        if line in executable_set:
+            result.add(line)
+            continue
+        index = bisect_right(executable, line) - 1
+        if index >= 0:
+            result.add(executable[index])
+    return result
+
+
+def _test_file(nodeid: str) -> str:
+    return nodeid.split("::", 1)[0]
+
+
+def plan_run(map_path: Path, incremental: bool = True, root: Path = PROJECT_ROOT) -> RunPlan:
+    """扫描当前源码并决定本次运行的用例"""
+    sources = scan_sources(root)
+    test_files = scan_test_files(root)
+    previous = load_map(map_path)
+
+    def full(reason: str) -> RunPlan:
+        return RunPlan(None, reason, sources, test_files, previous)
+
+    if not incremental:
+        return full("请求全量运行")
+    if previous is None:
+        return full("没有历史覆盖映射")
+    new_tests = sorted(set(test_files) - set(previous["test_files"]))
+    if new_tests:
+        return full(f"出现新的测试文件：{', '.join(new_tests)}")
+    removed = sorted(set(previous["files"]) - set(sources))
+    if removed:
+        return full(f"源码文件被删除：{', '.join(removed)}")
+
+    selected: Set[str] = set()
+    for path, source in sources.items():
+        record = previous["files"].get(path)
+        # 新增的源码文件只有在其他文件被修改后才会被用到，由那些修改触发选择
+        if record is None or record["digest"] == source.digest:
+            continue
+        changed, inserts, _ = diff_lines(record["line_hashes"], source.line_hashes)
+        lines = affected_lines(record, changed, inserts)
+        if lines is None:
+            return full(f"{path} 中函数体之外的代码有修改")
+        tested: Set[int] = set()
+        for nodeid, covered in previous["tests"].items():
+            covered_lines = covered.get(path, ())
+            tested.update(covered_lines)
+            if not lines.isdisjoint(covered_lines):
+                selected.add(nodeid)
+        untested = sorted((lines & set(previous.get("coverage", {}).get(path, ()))) - tested)
+        if untested:
+            return full(f"{path} 第 {', '.join(map(str, untested))} 行只在用例之外（导入或收集阶段）执行过")
+
+    # 被修改的测试文件整体重跑，其中新增或删除的用例由 pytest 自行收集
+    changed_test_files = {path for path, digest in test_files.items() if previous["test_files"].get(path) != digest}
+    selected.update(previous["failed"])
+    nodeids = sorted(
+        nodeid for nodeid in selected
+        if _test_file(nodeid) in test_files and _test_file(nodeid) not in changed_test_files
+    )
+    nodeids.extend(sorted(changed_test_files))
+    reason = f"选中 {len(nodeids)} 项（受修改影响的用例、上次失败的用例与被修改的测试文件）"
+    return RunPlan(nodeids, reason, sources, test_files, previous)
+
+
+# ---------- 更新映射 ----------
+
+def _relative_coverage(coverage: Dict[str, List[int]], root: Path, sources_only: bool = True) -> Dict[str, List[int]]:
+    result = {}
+    for filename, lines in coverage.items():
+        path = Path(os.path.relpath(filename, root)).as_posix()
+        if path.startswith("../") or not lines:
+            continue
+        if not sources_only or path.split("/", 1)[0] in SOURCE_DIRS:
+            result[path] = sorted(lines)
+    return result
+
+
+def suite_coverage(data: dict, root: Path = PROJECT_ROOT) -> Dict[str, List[int]]:
+    """映射中保存的整个套件的覆盖率，键为绝对路径，可直接用于 CoverageData.from_dict"""
+    return {str(root / path): lines for path, lines in data.get("coverage", {}).items()}
+
+
+def _file_record(source: SourceFile, root: Path) -> dict:
+    return {
+        "digest": source.digest,
+        "line_hashes": source.line_hashes,
+        "functions": function_body_ranges(source.text),
+        "executable": sorted(executable_lines(str(root / source.path))),
+    }
+
+
+def update_map(map_path: Path, plan: RunPlan, test_coverage: Dict[str, Dict[str, List[int]]],
+               outcomes: Dict[str, str], root: Path = PROJECT_ROOT,
+               coverage: Optional[Dict[str, List[int]]] = None) -> dict:
+    """
+    用本次运行的每用例覆盖率更新映射并写回磁盘
+
+    coverage 为本次运行的整体覆盖率（含模块导入阶段的行）。增量运行时，未重跑的用例保留旧记录，
+    其行号按 diff 结果换算到新版本源码；整体覆盖率也以同样的方式与上次的结果合并。
+    """
+    tests: Dict[str, Dict[str, List[int]]] = {}
+    failed: Set[str] = set()
+    suite: Dict[str, Set[int]] = {}
+    previous = plan.previous
+    if plan.nodeids is not None and previous is not None:
+        mappings = {}
+        for path, source in plan.sources.items():
+            record = previous["files"].get(path)
+            if record is not None and record["digest"] != source.digest:
+                mappings[path] = diff_lines(record["line_hashes"], source.line_hashes)[2]
+        changed_test_files = {path for path, digest in plan.test_files.items()
+                              if previous["test_files"].get(path) != digest}
+        for nodeid, covered in previous["tests"].items():
+            test_file = _test_file(nodeid)
+            if test_file not in plan.test_files or test_file in changed_test_files:
+                continue
+            remapped = {}
+            for path, lines in covered.items():
+                if path not in plan.sources:
+                    continue
+                mapping = mappings.get(path)
+                if mapping is not None:
+                    lines = sorted(mapping[line] for line in lines if line in mapping)
+                remapped[path] = lines
+            tests[nodeid] = remapped
+        failed.update(nodeid for nodeid in previous["failed"] if nodeid in tests)
+        for path, lines in previous.get("coverage", {}).items():
+            # 被修改的测试文件已整体重跑；已删除的文件不再计入
+            if path in changed_test_files or not (root / path).exists():
+                continue
+            mapping = mappings.get(path)
+            if mapping is not None:
+                lines = [mapping[line] for line in lines if line in mapping]
+            suite.setdefault(path, set()).update(lines)
+
+    for nodeid, covered in test_coverage.items():
+        tests[nodeid] = _relative_coverage(covered, root)
+    for path, lines in _relative_coverage(coverage or {}, root, sources_only=False).items():
+        suite.setdefault(path, set()).update(lines)
+    for nodeid, outcome in outcomes.items():
+        if outcome in ("failed", "error"):
+            failed.add(nodeid)
+        else:
+            failed.discard(nodeid)
+
+    data = {
+        "version": MAP_VERSION,
+        "files": {path: _file_record(source, root) for path, source in plan.sources.items()},
+        "test_files": plan.test_files,
+        "tests": dict(sorted(tests.items())),
+        "failed": sorted(failed),
+        "coverage": {path: sorted(lines) for path, lines in sorted(suite.items()) if lines},
+    }
+    map_path = Path(map_path)
+    map_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = map_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, map_path)
+    return data
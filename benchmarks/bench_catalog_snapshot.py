@@ -0,0 +1,93 @@
+"""
+目录快照冷启动基准：生成大量商品，分别写成 JSON 与 mmap 快照，在全新的子进程中测量
+加载到能读取第一个商品的耗时与峰值内存，以及带快照导入整个 API 模块的耗时
+
+运行：python benchmarks/bench_catalog_snapshot.py [--products 1000000] [--reads 10000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from api.catalog_snapshot import write_catalog
+
+# 子进程打印 (加载秒数, 随机读取的平均微秒数, 峰值 RSS MB)
+_LOADERS = {
+    "json": """
+import json
+with open(PATH, encoding="utf-8") as file:
+    catalog = {product["id"]: product for product in json.load(file)}
+""",
+    "snapshot": """
+from api.catalog_snapshot import SnapshotCatalog
+catalog = SnapshotCatalog.open(PATH)
+""",
+    "api import": """
+from api import ecommerce_api
+catalog = ecommerce_api.products_db
+""",
+}
+_PROBE = """
+import random, sys, time
+sys.path.insert(0, ROOT)
+start = time.perf_counter()
+{loader}
+loaded = time.perf_counter() - start
+rng = random.Random(1)
+ids = [rng.randint(1, COUNT) for _ in range(READS)]
+start = time.perf_counter()
+for product_id in ids:
+    catalog[product_id]["stock"]
+read_us = (time.perf_counter() - start) / READS * 1e6
+# ru_maxrss 会继承父进程的峰值，这里读取本进程的 VmHWM
+with open("/proc/self/status") as status:
+    peak_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM"))
+print(loaded, read_us, peak_kb / 1024)
+"""
+
+
+def _products(count: int):
+    rng = random.Random(7)
+    categories = [f"分类{index}" for index in range(200)]
+    for product_id in range(1, count + 1):
+        yield {"id": product_id, "name": f"商品 {product_id} Model {rng.randint(1, 9999)}",
+               "price": round(rng.uniform(1, 20000), 2), "stock": rng.randint(0, 1000), "reserved": 0,
+               "category": categories[product_id % len(categories)]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "catalog.json")
+        snapshot_path = os.path.join(directory, "catalog.snap")
+        start = time.perf_counter()
+        write_catalog(snapshot_path, _products(args.products))
+        print(f"write snapshot: {time.perf_counter() - start:.1f}s, {os.path.getsize(snapshot_path) / 2**20:.0f} MB")
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump(list(_products(args.products)), file, ensure_ascii=False)
+        print(f"json file: {os.path.getsize(json_path) / 2**20:.0f} MB")
+
+        print(f"{'loader':<12} {'load s':>8} {'read us':>8} {'peak RSS MB':>12}")
+        for name, loader in _LOADERS.items():
+            path = json_path if name == "json" else snapshot_path
+            code = f"ROOT={ROOT!r}; PATH={path!r}; COUNT={args.products}; READS={args.reads}\n"
+            code += _PROBE.format(loader=loader)
+            env = {**os.environ, "ECOMMERCE_CATALOG_SNAPSHOT": snapshot_path}
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                    env=env, cwd=ROOT).stdout
+            loaded, read_us, rss = (float(value) for value in output.split()[-3:])
+            print(f"{name:<12} {loaded:>8.3f} {read_us:>8.2f} {rss:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+APIClient 日志开销基准：对比关闭日志、同步日志、队列日志三种模式下的客户端吞吐
+
+运行：python benchmarks/bench_client_logging.py [--requests 20000]
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from utils import http_client
+from utils.http_client import ECommerceAPI
+
+
+def _run(client: ECommerceAPI, requests: int) -> float:
+    start = time.perf_counter()
+    for index in range(requests):
+        client.get_product(index % 3 + 1)
+    return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    ecommerce_api.reset_state()
+    client = ECommerceAPI()
+    client.authenticate("user1001", "pass1001")
+    logger = http_client.logger
+    sink = logging.StreamHandler(io.StringIO())
+
+    results = {}
+    logger.setLevel(logging.WARNING)
+    results["logging off"] = _run(client, args.requests)
+
+    logger.setLevel(logging.INFO)
+    logger.addHandler(sink)
+    logger.propagate = False
+    results["sync INFO"] = _run(client, args.requests)
+    client.client.log_sample_rate = 0.01
+    results["sync INFO, 1% sampled"] = _run(client, args.requests)
+    client.client.log_sample_rate = 1.0
+    logger.removeHandler(sink)
+
+    listener = http_client.enable_async_logging(sink, level=logging.INFO)
+    results["queued INFO"] = _run(client, args.requests)
+    listener.stop()
+
+    for name, throughput in results.items():
+        print(f"{name:<24} {throughput:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+测试套件覆盖率开销基准：对比无覆盖率、trace.Trace(count=True) 与 CoverageCollector 下的运行耗时
+
+运行：python benchmarks/bench_coverage.py [--repeat 3]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from trace import Trace
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from api.coverage_engine import CoverageCollector
+
+PYTEST_ARGS = ["-q", "-p", "no:cacheprovider", os.path.join(ROOT, "tests")]
+
+
+def _no_coverage() -> None:
+    pytest.main(PYTEST_ARGS)
+
+
+def _trace_coverage() -> None:
+    tracer = Trace(count=True, trace=False)
+    tracer.runfunc(pytest.main, PYTEST_ARGS)
+
+
+def _collector_coverage() -> None:
+    collector = CoverageCollector()
+    collector.start()
+    try:
+        pytest.main(PYTEST_ARGS)
+    finally:
+        collector.stop()
+    collector.data.summary()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = "sys.monitoring" if hasattr(sys, "monitoring") else "sys.settrace"
+    modes = {
+        "no coverage": _no_coverage,
+        "trace.Trace": _trace_coverage,
+        f"CoverageCollector ({engine})": _collector_coverage,
+    }
+    _run_quietly(_no_coverage)  # 预热：导入测试模块与被测代码
+    for name, run in modes.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _run_quietly(run)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<36} best {min(timings):.3f}s  mean {sum(timings) / len(timings):.3f}s")
+
+
+def _run_quietly(run) -> None:
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+覆盖率 HTML 报告生成基准：全量生成、数据不变时的增量生成、单个文件数据变化后的增量生成
+
+覆盖率数据来自在 CoverageCollector 下运行一次 tests/。
+
+运行：python benchmarks/bench_coverage_report.py [--repeat 5]
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from api import coverage_report
+from api.coverage_engine import CoverageCollector
+from api.coverage_report import generate_html_report
+
+
+def _collect():
+    collector = CoverageCollector()
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        collector.start()
+        try:
+            pytest.main(["-q", "-p", "no:cacheprovider", os.path.join(ROOT, "tests")])
+        finally:
+            collector.stop()
+    return collector.data
+
+
+def _timed(run, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stats = run()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    coverage = _collect()
+    target = max(coverage.lines, key=lambda filename: len(coverage.lines[filename]))
+    print(f"files={len(coverage.lines)}  executed lines={sum(len(lines) for lines in coverage.lines.values())}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        output = Path(workdir) / "report"
+
+        def cold():
+            shutil.rmtree(output, ignore_errors=True)
+            coverage_report._branch_cache.clear()
+            return generate_html_report(coverage, output)
+
+        def unchanged():
+            return generate_html_report(coverage, output)
+
+        def one_file_changed():
+            # 交替增删一行，保证每次都有且只有一个文件的数据变化
+            lines = coverage.lines[target]
+            lines.symmetric_difference_update({max(lines)})
+            return generate_html_report(coverage, output)
+
+        for name, run in (("cold (full)", cold), ("incremental, unchanged", unchanged),
+                          ("incremental, 1 file changed", one_file_changed)):
+            best, mean, stats = _timed(run, args.repeat)
+            print(f"{name:<30} best {best * 1000:8.1f}ms  mean {mean * 1000:8.1f}ms  "
+                  f"rendered {stats['rendered']}, skipped {stats['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
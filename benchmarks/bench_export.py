@@ -0,0 +1,80 @@
+"""
+流式导出基准：不同数据量下对比一次性序列化整表与按快照分块导出 NDJSON 的峰值内存与耗时，
+并模拟导出期间持续写入，统计快照额外复制的旧值数量
+
+运行：python benchmarks/bench_export.py [--sizes 100000 300000 1000000] [--writes-per-chunk 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import json_response
+from api.export import SnapshotStore, gzip_stream, ndjson_stream
+
+
+def _orders(count: int) -> dict:
+    return {
+        order_id: {
+            "id": order_id, "user_id": 1000 + order_id % 500, "subtotal": 5999.0, "discount": 0.0, "total": 5999.0,
+            "items": [{"product_id": 1, "product_name": "iPhone 15", "quantity": 1, "price": 5999.0}],
+            "status": "pending", "created_at": "2024-01-01T00:00:00",
+        }
+        for order_id in range(1, count + 1)
+    }
+
+
+def _measure(build) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = build()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 300_000, 1_000_000])
+    parser.add_argument("--writes-per-chunk", type=int, default=5, help="导出每块之间模拟的写入次数")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'records':>9} {'mode':<14} {'bytes':>12} {'seconds':>8} {'peak MB':>8} {'preimages':>9}")
+    for count in args.sizes:
+        store = _orders(count)
+        snapshots = SnapshotStore(store)
+
+        size, elapsed, peak = _measure(lambda: len(json_response.dumps(list(store.values()))))
+        print(f"{count:>9} {'one response':<14} {size:>12} {elapsed:>8.2f} {peak / 2**20:>8.1f} {'-':>9}")
+
+        for mode in ("ndjson", "ndjson+gzip"):
+            copied = 0
+
+            def export() -> int:
+                nonlocal copied
+                snapshot = snapshots.open()
+                chunks = ndjson_stream(snapshot, json_response.dumps)
+                if mode == "ndjson+gzip":
+                    chunks = gzip_stream(chunks)
+                total = 0
+                for chunk in chunks:
+                    total += len(chunk)
+                    # 导出期间的写入：修改前登记旧值
+                    for _ in range(args.writes_per_chunk):
+                        key = rng.randint(1, count)
+                        snapshots.preserve(key)
+                        store[key]["status"] = "paid"
+                    copied = max(copied, len(snapshot.preimages))
+                return total
+
+            size, elapsed, peak = _measure(export)
+            print(f"{count:>9} {mode:<14} {size:>12} {elapsed:>8.2f} {peak / 2**20:>8.1f} {copied:>9}")
+
+
+if __name__ == "__main__":
+    main()
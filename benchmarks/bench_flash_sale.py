@@ -0,0 +1,87 @@
+"""
+秒杀基准：多个线程对同一件热点商品反复 加购 → 下单，对比普通路径与不同分片数的秒杀模式下的
+下单吞吐量与延迟
+
+运行：python benchmarks/bench_flash_sale.py [--threads 16] [--seconds 2] [--shards 1 4 16]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.metrics import REGISTRY
+
+CONTENDED_LOCKS = ("global", "product", "cart")
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else 0.0
+
+
+def _run(threads: int, seconds: float, shards: Optional[int]) -> dict:
+    ecommerce_api.reset_state()
+    ecommerce_api.products_db[1]["stock"] = 10 ** 9
+    admin = ecommerce_api.users_db["admin"]
+    if shards is not None:
+        ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=shards), current_user=admin)
+    stop = threading.Event()
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    item = ecommerce_api.CartItemAdd(product_id=1, quantity=1)
+
+    def worker(index: int) -> None:
+        user_id = 10000 + index
+        order = ecommerce_api.OrderCreate(user_id=user_id)
+        samples = latencies[index]
+        while not stop.is_set():
+            start = time.perf_counter()
+            ecommerce_api.add_to_cart(user_id, item, current_user=admin)
+            ecommerce_api.create_order(order, current_user=admin)
+            samples.append(time.perf_counter() - start)
+
+    contended_before = {name: REGISTRY.value("lock_contended_total", name) for name in CONTENDED_LOCKS}
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    samples = [value for per_thread in latencies for value in per_thread]
+    contended = sum(REGISTRY.value("lock_contended_total", name) - contended_before[name] for name in CONTENDED_LOCKS)
+    if shards is not None:
+        ecommerce_api.stop_flash_sale(1, current_user=admin)
+    assert ecommerce_api.products_db[1]["stock"] == 10 ** 9 - len(samples)
+    assert ecommerce_api.products_db[1]["reserved"] == 0
+    return {
+        "checkouts_per_s": len(samples) / elapsed,
+        "p50_ms": _percentile(samples, 50) * 1000,
+        "p99_ms": _percentile(samples, 99) * 1000,
+        # 每千次下单中获取 global/商品/购物车锁时发生竞争的次数
+        "contended_per_1k": contended / len(samples) * 1000 if samples else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    print(f"{'mode':<16}{'checkouts/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'contended/1k':>14}")
+    for shards in [None] + args.shards:
+        result = _run(args.threads, args.seconds, shards)
+        name = "global lock" if shards is None else f"flash x{shards}"
+        print(f"{name:<16}{result['checkouts_per_s']:>12.0f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['contended_per_1k']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
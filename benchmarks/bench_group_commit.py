@@ -0,0 +1,82 @@
+"""
+组提交基准：多个线程在高竞争下反复 加购 → 下单，对比直接持锁下单与不同批大小/等待时间的组提交
+
+运行：python benchmarks/bench_group_commit.py [--threads 32] [--seconds 2] [--batches 16 64] [--wait-ms 0.5 2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+
+
+def _run(threads: int, seconds: float, pipeline: Optional[Tuple[int, float]]) -> dict:
+    ecommerce_api.reset_state()
+    admin = ecommerce_api.users_db["admin"]
+    for product in ecommerce_api.products_db.values():
+        product["stock"] = 10 ** 9
+    if pipeline is not None:
+        max_batch, max_wait_ms = pipeline
+        ecommerce_api.configure_checkout_pipeline(
+            ecommerce_api.CheckoutPipelineConfig(enabled=True, max_batch=max_batch, max_wait_ms=max_wait_ms),
+            current_user=admin,
+        )
+    stop = threading.Event()
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+
+    def worker(index: int) -> None:
+        user_id = 20000 + index
+        item = ecommerce_api.CartItemAdd(product_id=1 + index % 3, quantity=1)
+        order = ecommerce_api.OrderCreate(user_id=user_id)
+        samples = latencies[index]
+        while not stop.is_set():
+            ecommerce_api.add_to_cart(user_id, item, current_user=admin)
+            start = time.perf_counter()
+            ecommerce_api.create_order(order, current_user=admin)
+            samples.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = ecommerce_api.get_checkout_pipeline(current_user=admin)
+    ecommerce_api.reset_state()
+    samples = sorted(value for per_thread in latencies for value in per_thread)
+    return {
+        "orders_per_s": len(samples) / elapsed,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1000,
+        "average_batch": stats.get("average_batch"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--batches", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[0.5, 2.0])
+    args = parser.parse_args()
+
+    modes: List[Optional[Tuple[int, float]]] = [None]
+    modes += [(batch, wait) for batch in args.batches for wait in args.wait_ms]
+    print(f"{'mode':<22}{'orders/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}")
+    for mode in modes:
+        result = _run(args.threads, args.seconds, mode)
+        name = "direct (locks)" if mode is None else f"batch {mode[0]} / {mode[1]:g}ms"
+        average = result["average_batch"] if result["average_batch"] is not None else "-"
+        print(f"{name:<22}{result['orders_per_s']:>10.0f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{average:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+导入耗时基准与预算检查：在全新的解释器中用 -X importtime 导入 api.ecommerce_api，
+统计项目自身模块（api.*）的自身耗时之和、第三方依赖的耗时以及最慢的模块，
+并检查测试运行器等只在诊断接口中使用的模块没有在导入时被加载
+
+加载了禁止的模块时以非零状态退出，CI 中由 tests/test_import_time.py 调用。
+耗时受机器负载影响较大，预算检查需显式开启（--budget-ms 或 ECOMMERCE_IMPORT_BUDGET_MS），超出预算同样以非零状态退出。
+运行：python benchmarks/bench_import_time.py [--runs 5] [--budget-ms 150] [--top 10]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TARGET = "api.ecommerce_api"
+# 只应在应用启动（诊断接口）或测试任务中加载的模块
+FORBIDDEN = ("pytest", "_pytest", "trace", "api.diagnostics", "api.test_runner", "api.sampling_profiler",
+             "multiprocessing", "concurrent.futures.process")
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure() -> List[Tuple[str, int, int]]:
+    """在新进程中导入 TARGET，返回 [(模块名, 自身微秒, 累计微秒)]"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {TARGET}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return modules
+
+
+def summarize(runs: int) -> Dict[str, object]:
+    """多次测量取最小值，降低机器负载带来的抖动"""
+    own, total, slowest = None, None, {}
+    imported = set()
+    for _ in range(runs):
+        modules = measure()
+        imported.update(name for name, _, _ in modules)
+        run_own = sum(self_us for name, self_us, _ in modules if name == "api" or name.startswith("api."))
+        run_total = next(cumulative for name, _, cumulative in modules if name == TARGET)
+        own = run_own if own is None else min(own, run_own)
+        total = run_total if total is None else min(total, run_total)
+        for name, self_us, _ in modules:
+            slowest[name] = min(slowest.get(name, self_us), self_us)
+    return {
+        "own_ms": own / 1000,
+        "total_ms": total / 1000,
+        "slowest": sorted(slowest.items(), key=lambda item: -item[1]),
+        "forbidden": sorted(name for name in imported if name in FORBIDDEN or name.startswith("_pytest.")),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=os.environ.get("ECOMMERCE_IMPORT_BUDGET_MS"),
+                        help="api.* 模块自身耗时之和的上限，不指定时只报告耗时")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    summary = summarize(args.runs)
+    budget = f" (budget {args.budget_ms:.0f}ms)" if args.budget_ms is not None else ""
+    print(f"import {TARGET}: {summary['total_ms']:.1f}ms total, {summary['own_ms']:.1f}ms in api.* modules{budget}")
+    for name, self_us in summary["slowest"][:args.top]:
+        print(f"  {self_us / 1000:>8.2f}ms  {name}")
+    failed = False
+    if summary["forbidden"]:
+        print(f"FAIL: imported at module level: {', '.join(summary['forbidden'])}")
+        failed = True
+    if args.budget_ms is not None and summary["own_ms"] > args.budget_ms:
+        print(f"FAIL: api.* import time {summary['own_ms']:.1f}ms exceeds budget {args.budget_ms:.0f}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+接口响应序列化基准：逐个接口对比 FastAPI 通用路径（jsonable_encoder + JSONResponse）
+与 FastJSONResponse 在 stdlib / orjson 后端下的耗时
+
+这里列出的接口都直接返回 FastJSONResponse，因此对比的是整个序列化路径；其余返回 dict 的接口
+仍会经过 jsonable_encoder，只有渲染一步换成 FastJSONResponse，收益只有 generic 一列中的渲染部分。
+
+运行：python benchmarks/bench_json_response.py [--products 5000] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api, json_response
+from api.json_response import FastJSONResponse
+
+
+def _seed(products: int) -> None:
+    ecommerce_api.reset_state()
+    for product_id in range(4, products + 1):
+        ecommerce_api.products_db[product_id] = {
+            "id": product_id, "name": f"商品 {product_id}", "price": 10.0 + product_id,
+            "stock": 100, "reserved": 0, "category": "电子产品" if product_id % 2 else "配件",
+        }
+    admin = ecommerce_api.users_db["admin"]
+    ecommerce_api.add_to_cart(1, ecommerce_api.CartItemAdd(product_id=1, quantity=1), current_user=admin)
+    ecommerce_api.add_to_cart(1, ecommerce_api.CartItemAdd(product_id=3, quantity=2), current_user=admin)
+    ecommerce_api.create_order(ecommerce_api.OrderCreate(user_id=1, promotion_id=2), current_user=admin)
+
+
+def _payloads() -> Dict[str, Any]:
+    products = list(ecommerce_api.products_db.values())
+    return {
+        "GET /api/products": {"products": products, "count": len(products), "total": len(products)},
+        "GET /api/products/{id}": ecommerce_api.products_db[1],
+        "GET /api/promotions": {"promotions": list(ecommerce_api.promotions_db.values())},
+        "GET /api/orders/{id}": ecommerce_api.orders_db[1],
+    }
+
+
+def _time(render: Callable[[], bytes], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    _seed(args.products)
+    backends = sorted(json_response.JSON_BACKENDS)
+    print(f"{'endpoint':<26}{'generic':>12}" + "".join(f"{name:>12}" for name in backends) + "   (us/response)")
+    for endpoint, payload in _payloads().items():
+        row = [_time(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)]
+        for backend in backends:
+            json_response.set_json_backend(backend)
+            row.append(_time(lambda: FastJSONResponse(payload).body, args.repeat))
+        print(f"{endpoint:<26}" + "".join(f"{value:>12.1f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()
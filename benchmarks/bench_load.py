@@ -0,0 +1,47 @@
+"""
+离线压测基准：在不同并发与商品倾斜度下运行 utils.load_generator，对比吞吐量与尾延迟
+
+每个场景运行前重置内存数据；--jsonl 指定文件时把每个场景的完整报告追加为一行，便于跟踪趋势。
+
+运行：python benchmarks/bench_load.py [--sessions 2000] [--jsonl load_history.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from api import ecommerce_api
+from utils.load_generator import LoadConfig, run_load
+
+SCENARIOS = [
+    ("uniform, 1 thread", {"concurrency": 1, "zipf": 0.0}),
+    ("uniform, 8 threads", {"concurrency": 8, "zipf": 0.0}),
+    ("zipf 1.1, 8 threads", {"concurrency": 8, "zipf": 1.1}),
+    ("zipf 2.0, 32 threads", {"concurrency": 32, "zipf": 2.0}),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--stock", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--jsonl", help="追加写入每个场景报告的 JSON Lines 文件")
+    args = parser.parse_args()
+
+    for name, options in SCENARIOS:
+        ecommerce_api.reset_state()
+        report = run_load(LoadConfig(sessions=args.sessions, stock=args.stock, seed=args.seed, **options))
+        latency = report["latency"]["all"]
+        print(f"{name:<22} {report['throughput']['requests_per_s']:>10.0f} req/s  "
+              f"p50 {latency['p50_ms']:.3f}ms  p95 {latency['p95_ms']:.3f}ms  p99 {latency['p99_ms']:.3f}ms  "
+              f"checks {'ok' if report['checks']['passed'] else 'FAILED'}")
+        if args.jsonl:
+            with open(args.jsonl, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"scenario": name, **report}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
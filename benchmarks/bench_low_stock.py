@@ -0,0 +1,60 @@
+"""
+低库存监控基准：大量商品设置阈值后随机变更可用库存，测量单次更新的开销，
+并对比从堆中列出低库存商品与逐条扫描全部商品的延迟
+
+运行：python benchmarks/bench_low_stock.py [--products 1000000] [--updates 200000] [--low-ratio 0.001]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.event_stream import EventRing
+from api.low_stock import LowStockMonitor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=200_000)
+    parser.add_argument("--low-ratio", type=float, default=0.001, help="更新后低于阈值的比例")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(9)
+    ring = EventRing(capacity=4096)
+    monitor = LowStockMonitor(ring)
+    thresholds = {pid: 10 for pid in range(args.products)}
+    available = {pid: rng.randint(20, 1000) for pid in range(args.products)}
+    start = time.perf_counter()
+    for pid, threshold in thresholds.items():
+        monitor.set_threshold(pid, threshold, available[pid])
+    print(f"set thresholds: {args.products} products in {time.perf_counter() - start:.1f}s")
+
+    targets = [rng.randrange(args.products) for _ in range(args.updates)]
+    values = [rng.randint(0, 9) if rng.random() < args.low_ratio else rng.randint(20, 1000) for _ in targets]
+    start = time.perf_counter()
+    for pid, value in zip(targets, values):
+        available[pid] = value
+        monitor.update(pid, value)
+    elapsed = time.perf_counter() - start
+    print(f"updates: {args.updates} in {elapsed:.2f}s ({elapsed / args.updates * 1e6:.2f}us each), "
+          f"{ring.last_seq} events, heap {len(monitor._heap)} entries")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        listed = monitor.below()
+    heap_ms = (time.perf_counter() - start) / args.repeat * 1000
+    start = time.perf_counter()
+    for _ in range(max(1, args.repeat // 10)):
+        scanned = sorted((available[pid] - thresholds[pid], pid) for pid in thresholds
+                         if available[pid] < thresholds[pid])
+    scan_ms = (time.perf_counter() - start) / max(1, args.repeat // 10) * 1000
+    assert [(e["available"] - e["threshold"], e["product_id"]) for e in listed] == scanned
+    print(f"list {len(listed)} low-stock products: heap {heap_ms:.3f}ms, full scan {scan_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
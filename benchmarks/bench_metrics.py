@@ -0,0 +1,75 @@
+"""
+指标埋点开销基准：对比 threading.Lock 与 InstrumentedLock、计数器/直方图单次记录的耗时，
+以及多线程同时记录时每线程分片的吞吐量
+
+运行：python benchmarks/bench_metrics.py [--repeat 200000] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Callable
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.metrics import InstrumentedLock, MetricsRegistry
+
+
+def _time(operation: Callable[[], None], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    return (time.perf_counter() - start) / repeat * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "bench", ("route",))
+    histogram = registry.histogram("bench_seconds", "bench", ("route",))
+    plain_lock = threading.Lock()
+    instrumented = InstrumentedLock("bench")
+
+    def plain_section():
+        with plain_lock:
+            pass
+
+    def instrumented_section():
+        with instrumented:
+            pass
+
+    print(f"{'operation':<28}{'ns/op':>10}")
+    for name, operation in (
+        ("threading.Lock", plain_section),
+        ("InstrumentedLock", instrumented_section),
+        ("Counter.inc", lambda: counter.inc("/api/products")),
+        ("Histogram.observe", lambda: histogram.observe(0.0012, "/api/products")),
+        ("time.perf_counter", time.perf_counter),
+    ):
+        print(f"{name:<28}{_time(operation, args.repeat):>10.1f}")
+
+    def worker():
+        for _ in range(args.repeat):
+            counter.inc("/api/threads")
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = registry.value("bench_total", "/api/threads")
+    assert total == args.repeat * args.threads, total
+    print(f"\n{args.threads} 线程并发计数：{total / elapsed / 1e6:.2f} M inc/s（无丢失计数）")
+    start = time.perf_counter()
+    registry.render_prometheus()
+    print(f"抓取一次：{(time.perf_counter() - start) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
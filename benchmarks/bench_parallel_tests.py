@@ -0,0 +1,76 @@
+"""
+并行测试任务基准：同一测试套件在不同 worker 数下的墙钟耗时
+
+默认运行仓库自身的 tests/；--synthetic N 生成 N 个各消耗约 --cpu-ms 毫秒 CPU 的用例，
+便于在测试较少时观察随核数的扩展情况。
+
+运行：python benchmarks/bench_parallel_tests.py [--workers 1 2 4] [--synthetic 64 --cpu-ms 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import textwrap
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+from api.test_runner import PytestJobManager
+
+SYNTHETIC_TEST = textwrap.dedent('''\
+    import time
+
+    import pytest
+
+
+    @pytest.mark.parametrize("case", range({count}))
+    def test_cpu_bound(case):
+        deadline = time.process_time() + {cpu_ms} / 1000
+        while time.process_time() < deadline:
+            pass
+''')
+
+
+def _run(manager: PytestJobManager, args, workers: int, coverage: bool) -> dict:
+    start = time.perf_counter()
+    job = manager.submit(args, collect_coverage=coverage, workers=workers)
+    for _ in manager.iter_events(job.id, timeout=600):
+        pass
+    elapsed = time.perf_counter() - start
+    data = manager.get(job.id).to_dict()
+    return {"elapsed": elapsed, "status": data["status"], "completed": data["completed"],
+            "coverage": data["result"]["coverage_percent"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--synthetic", type=int, default=0, help="生成的 CPU 密集用例数，0 表示运行 tests/")
+    parser.add_argument("--cpu-ms", type=int, default=50)
+    parser.add_argument("--no-coverage", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.synthetic:
+            test_file = os.path.join(workdir, "test_synthetic.py")
+            with open(test_file, "w", encoding="utf-8") as f:
+                f.write(SYNTHETIC_TEST.format(count=args.synthetic, cpu_ms=args.cpu_ms))
+            pytest_args = ["-q", "-p", "no:cacheprovider", test_file]
+        else:
+            pytest_args = ["-q", "-p", "no:cacheprovider", os.path.join(ROOT, "tests")]
+
+        manager = PytestJobManager(os.path.join(workdir, "coverage"), max_workers=max(args.workers))
+        print(f"cpu_count={os.cpu_count()}")
+        try:
+            baseline = None
+            for workers in args.workers:
+                result = _run(manager, pytest_args, workers, coverage=not args.no_coverage)
+                baseline = baseline or result["elapsed"]
+                print(f"workers={workers:<3} {result['elapsed']:.2f}s  speedup {baseline / result['elapsed']:.2f}x  "
+                      f"{result['status']} ({result['completed']} tests, coverage {result['coverage']})")
+        finally:
+            manager.shutdown()
+
+
+if __name__ == "__main__":
+    main()
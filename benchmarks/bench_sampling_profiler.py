@@ -0,0 +1,84 @@
+"""
+采样分析开销基准：多个线程反复调用 鉴权 → 商品详情 → 加购/移除 的接口组合，
+对比不分析、不同采样间隔下的采样分析以及逐行 settrace 时的吞吐量
+
+运行：python benchmarks/bench_sampling_profiler.py [--threads 4] [--seconds 2]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.sampling_profiler import SAMPLER
+
+
+def _workload(stop: threading.Event, counts: list, index: int) -> None:
+    # 管理员可操作任意用户的购物车，每个线程使用独立的购物车
+    token = ecommerce_api.create_access_token({"sub": "admin"})
+    item = ecommerce_api.CartItemAdd(product_id=1 + index % 3, quantity=1)
+    user_id = 5000 + index
+    done = 0
+    while not stop.is_set():
+        current_user = ecommerce_api.get_current_user(token)
+        ecommerce_api.get_product(item.product_id, current_user=current_user)
+        ecommerce_api.add_to_cart(user_id, item, current_user=current_user)
+        ecommerce_api.remove_from_cart(user_id, item.product_id, current_user=current_user)
+        done += 1
+    counts[index] = done
+
+
+def _line_tracer(frame, event, arg):
+    return _line_tracer
+
+
+def _run(threads: int, seconds: float, profile: Optional[Callable[[float], None]] = None,
+         trace: bool = False) -> float:
+    ecommerce_api.reset_state()
+    stop = threading.Event()
+    counts = [0] * threads
+    if trace:
+        threading.settrace(_line_tracer)
+    workers = [threading.Thread(target=_workload, args=(stop, counts, index)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    threading.settrace(None)
+    start = time.perf_counter()
+    if profile is not None:
+        profile(seconds)
+    else:
+        time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    baseline = _run(args.threads, args.seconds)
+    print(f"{'mode':<24}{'ops/s':>10}{'overhead':>10}")
+    print(f"{'none':<24}{baseline:>10.0f}{'-':>10}")
+    for interval in (0.01, 0.005, 0.001):
+        result = {}
+
+        def profile(seconds: float, interval=interval) -> None:
+            result.update(SAMPLER.run(seconds, interval))
+
+        ops = _run(args.threads, args.seconds, profile)
+        name = f"sampling {interval * 1000:g}ms"
+        print(f"{name:<24}{ops:>10.0f}{(1 - ops / baseline) * 100:>9.1f}%"
+              f"   ({result['samples']} samples, {result['sampling_cost_ms']:.0f} ms sampling)")
+    ops = _run(args.threads, args.seconds, trace=True)
+    print(f"{'settrace (line)':<24}{ops:>10.0f}{(1 - ops / baseline) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
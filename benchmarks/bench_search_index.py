@@ -0,0 +1,91 @@
+"""
+商品搜索基准：生成中英文混合名称的商品目录，对比倒排索引与逐条扫描名称的查询延迟，
+并测量建索引耗时与单个商品增量更新的延迟
+
+运行：python benchmarks/bench_search_index.py [--products 1000000] [--repeat 50] [--scan-repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.search_index import SearchIndex, tokenize
+
+BRANDS = ["Apple", "Samsung", "Sony", "Lenovo", "华为", "小米", "联想", "戴尔", "Xiaomi", "Dell"]
+LINES = ["iPhone", "Galaxy", "Xperia", "ThinkPad", "Mate", "Redmi", "MacBook", "AirPods", "Watch", "Pad"]
+EDITIONS = ["Pro", "Max", "Ultra", "Mini", "Plus", "Lite", "青春版", "旗舰版", "标准版", ""]
+COLORS = ["黑色", "白色", "蓝色", "银色", "金色", "Midnight", "Graphite", "Blue"]
+CATEGORIES = ["电子产品", "配件", "手机", "电脑", "平板", "家电", "Audio", "Wearables"]
+QUERIES = ["iphone", "pro", "iph", "galaxy ultra", "华为", "旗舰", "黑色 手机", "thinkpad 4821", "mac pro 银色"]
+
+
+def _catalog(size: int, seed: int = 7) -> List[dict]:
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(1, size + 1):
+        name = (f"{rng.choice(BRANDS)} {rng.choice(LINES)} {rng.randint(1, 9999)} "
+                f"{rng.choice(EDITIONS)} {rng.choice(COLORS)}")
+        products.append({"id": product_id, "name": name, "category": rng.choice(CATEGORIES)})
+    return products
+
+
+def _scan(products: List[dict], query: str, limit: int) -> List[int]:
+    """不建索引的基线：每个查询词都要出现在名称或分类中"""
+    words = [word.lower() for word in query.split()]
+    hits = []
+    for product in products:
+        text = f"{product['name']} {product['category']}".lower()
+        if all(word in text for word in words):
+            hits.append(product["id"])
+    return hits[:limit]
+
+
+def _timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    products = _catalog(args.products)
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.rebuild(products)
+    print(f"build: {args.products} products in {time.perf_counter() - start:.1f}s, {index.stats()}")
+
+    print(f"{'query':<16}{'hits':>9}{'p50 ms':>10}{'p99 ms':>10}{'scan ms':>10}")
+    for query in QUERIES:
+        total, _ = index.search(query, limit=args.limit)
+        samples = _timed(lambda: index.search(query, limit=args.limit), args.repeat)
+        scan = _timed(lambda: _scan(products, query, args.limit), args.scan_repeat)
+        p99 = samples[min(len(samples) - 1, len(samples) * 99 // 100)]
+        print(f"{query:<16}{total:>9}{samples[len(samples) // 2] * 1000:>10.3f}{p99 * 1000:>10.3f}"
+              f"{scan[len(scan) // 2] * 1000:>10.1f}")
+
+    rng = random.Random(11)
+    targets = [rng.randint(1, args.products) for _ in range(args.repeat)]
+
+    def update() -> None:
+        product_id = targets.pop()
+        index.upsert(product_id, f"Renamed {product_id} 新品", "配件")
+
+    samples = _timed(update, args.repeat)
+    print(f"upsert: p50 {samples[len(samples) // 2] * 1000:.3f}ms  p99 {samples[-1] * 1000:.3f}ms "
+          f"({len(tokenize('Renamed 1 新品'))} tokens)")
+
+
+if __name__ == "__main__":
+    main()
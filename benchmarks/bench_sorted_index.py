@@ -0,0 +1,79 @@
+"""
+有序索引基准：在大目录上对比 "价格区间 + 按价格排序 + 分页" 与 "库存低于阈值" 查询
+用有序索引完成与逐条过滤后排序的延迟，并测量库存变化时索引更新的延迟
+
+运行：python benchmarks/bench_sorted_index.py [--products 1000000] [--repeat 50] [--limit 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.sorted_index import SortedIndex
+
+
+def _timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    products = [{"id": pid, "price": round(rng.uniform(1, 20000), 2), "stock": rng.randint(0, 1000)}
+                for pid in range(1, args.products + 1)]
+    indexes = {field: SortedIndex(field) for field in ("price", "stock")}
+    start = time.perf_counter()
+    for index in indexes.values():
+        index.rebuild(products)
+    print(f"build: {args.products} products x 2 indexes in {time.perf_counter() - start:.1f}s")
+
+    limit = args.limit
+    queries = {
+        "price<=2000 by price": (
+            lambda: indexes["price"].range(high=2000, limit=limit),
+            lambda: sorted((p for p in products if p["price"] <= 2000), key=lambda p: (p["price"], p["id"]))[:limit],
+        ),
+        "price<=2000 page 100": (
+            lambda: indexes["price"].range(high=2000, skip=100 * limit, limit=limit),
+            lambda: sorted((p for p in products if p["price"] <= 2000),
+                           key=lambda p: (p["price"], p["id"]))[100 * limit:101 * limit],
+        ),
+        "stock<10 by -stock": (
+            lambda: indexes["stock"].range(high=9, descending=True, limit=limit),
+            lambda: sorted((p for p in products if p["stock"] <= 9), key=lambda p: (-p["stock"], -p["id"]))[:limit],
+        ),
+    }
+    print(f"{'query':<24}{'index p50 ms':>14}{'index p99 ms':>14}{'scan+sort ms':>14}")
+    for name, (indexed, scan) in queries.items():
+        assert [p["id"] for p in scan()] == indexed()[1]
+        samples = _timed(indexed, args.repeat)
+        scanned = _timed(scan, args.scan_repeat)
+        p99 = samples[min(len(samples) - 1, len(samples) * 99 // 100)]
+        print(f"{name:<24}{samples[len(samples) // 2] * 1000:>14.3f}{p99 * 1000:>14.3f}"
+              f"{scanned[len(scanned) // 2] * 1000:>14.1f}")
+
+    targets = [rng.randint(1, args.products) for _ in range(args.repeat)]
+
+    def update() -> None:
+        indexes["stock"].update(targets.pop(), rng.randint(0, 1000))
+
+    samples = _timed(update, args.repeat)
+    print(f"stock update: p50 {samples[len(samples) // 2] * 1000:.3f}ms  max {samples[-1] * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
+import inspect
 import json
-from dataclasses import dataclass
+import zlib
+from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
-from pydantic import ValidationError
-from typing import Any, Dict, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 from fastapi import HTTPException
+from fastapi import Response as HTTPResponse
+from fastapi.responses import StreamingResponse
 
 from api import ecommerce_api
 
@@ -19,13 +25,40 @@ class Response:
 
     status_code: int
     _data: Any
-
-    def __post_init__(self):
-        self.text = json.dumps(self._data, ensure_ascii=False) if self._data is not None else ""
+    # 响应头，键统一为小写，例如 "etag"
+    headers: Dict[str, str] = field(default_factory=dict)
+    # stream=True 时尚未读取的响应体（已解压），由 iter_content/iter_lines 逐块消费
+    _stream: Optional[Iterator[bytes]] = None
+
+    @cached_property
+    def text(self) -> str:
+        # 仅在读取时序列化，避免每个请求都付出 json.dumps 的开销；文本响应原样返回
+        if self._stream is not None:
+            return b"".join(self.iter_content()).decode("utf-8")
+        if isinstance(self._data, str):
+            return self._data
+        return json.dumps(self._data, ensure_ascii=False) if self._data is not None else ""
 
     def json(self) -> Any:
         return self._data
 
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:  # noqa: ARG002
+        """按接口产出的块返回响应体，与 requests 一样已处理 gzip 内容编码"""
+        if self._stream is None:
+            yield self.text.encode("utf-8")
+            return
+        stream, self._stream = self._stream, iter(())
+        yield from stream
+
+    def iter_lines(self) -> Iterator[bytes]:
+        pending = b""
+        for chunk in self.iter_content():
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
     def raise_for_status(self):
         if 400 <= self.status_code:
             detail = self._data.get("detail") if isinstance(self._data, dict) else self.text
@@ -33,6 +66,72 @@ class Response:
         return self
 
 
+def _iter_streaming_body(response: StreamingResponse) -> Iterator[bytes]:
+    """逐块读取流式响应，每取一块驱动一次事件循环；离线模式没有长连接，只能用于会结束的流"""
+    loop = asyncio.new_event_loop()
+    chunks = response.body_iterator.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = loop.run_until_complete(chunks.__anext__())
+            except StopAsyncIteration:
+                return
+            yield chunk if isinstance(chunk, bytes) else chunk.encode(response.charset)
+    finally:
+        if hasattr(chunks, "aclose"):
+            loop.run_until_complete(chunks.aclose())
+        loop.close()
+
+
+def _decode_content(chunks: Iterator[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    if encoding != "gzip":
+        yield from chunks
+        return
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    yield decompressor.flush()
+
+
+def _from_http_response(response: HTTPResponse, stream: bool = False) -> Response:
+    """将接口直接返回的 FastAPI Response（如 304、预序列化 JSON、纯文本、SSE、NDJSON）转换为离线响应"""
+    headers = dict(response.headers)
+    if isinstance(response, StreamingResponse):
+        chunks = _decode_content(_iter_streaming_body(response), headers.get("content-encoding"))
+        if stream:
+            return Response(response.status_code, None, headers, chunks)
+        body = b"".join(chunks)
+    else:
+        body = _decode_content(iter([response.body]), headers.get("content-encoding"))
+        body = b"".join(body)
+    if not body:
+        return Response(response.status_code, None, headers)
+    if "application/json" not in headers.get("content-type", "application/json"):
+        return Response(response.status_code, body.decode(response.charset or "utf-8"), headers)
+    return Response(response.status_code, json.loads(body), headers)
+
+
+_query_adapters: Dict[Callable, Dict[str, Tuple[TypeAdapter, bool]]] = {}
+
+
+def _query_params(endpoint: Callable, params: Dict[str, Any], *names: str) -> Dict[str, Any]:
+    """按接口函数签名中的类型与 Query 约束校验查询参数，与 HTTP 请求一样不合法时返回 422；未提供的可选参数使用默认值"""
+    adapters = _query_adapters.get(endpoint)
+    if adapters is None:
+        adapters = _query_adapters[endpoint] = {
+            name: (TypeAdapter(parameter.annotation), parameter.default is inspect.Parameter.empty)
+            for name, parameter in inspect.signature(endpoint).parameters.items()
+        }
+    values = {}
+    for name in names:
+        adapter, required = adapters[name]
+        if name in params or required:
+            values[name] = adapter.validate_python(params.get(name))
+    return values
+
+
 class Session:
     """极简 Session，实现 get/post/put/delete 方法。"""
 
@@ -47,8 +146,8 @@ class Session:
 
     # 请求方法
     def get(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: int = 10,
-            headers: Optional[Dict[str, str]] = None, **kwargs) -> Response:  # noqa: ARG002
-        return self._request("GET", url, params=params, headers=headers)
+            headers: Optional[Dict[str, str]] = None, stream: bool = False, **kwargs) -> Response:  # noqa: ARG002
+        return self._request("GET", url, params=params, headers=headers, stream=stream)
 
     def post(self, url: str, json: Optional[Dict[str, Any]] = None, timeout: int = 10,
              headers: Optional[Dict[str, str]] = None, **kwargs) -> Response:  # noqa: ARG002
@@ -70,6 +169,7 @@ class Session:
             params: Optional[Dict[str, Any]] = None,
             json: Optional[Dict[str, Any]] = None,
             headers: Optional[Dict[str, str]] = None,
+            stream: bool = False,
     ) -> Response:
         parsed_url = urlparse(url)
         query_params = parse_qs(parsed_url.query)
@@ -86,6 +186,9 @@ class Session:
                 return Response(200, dashboard_path.read_text(encoding="utf-8"))
             return Response(404, {"detail": "未知路径"})
 
+        if parsed_url.path == "/api/metrics" and method == "GET":
+            return _from_http_response(ecommerce_api.get_metrics())
+
         if parsed_url.path.startswith("/api/auth/token"):
             try:
                 request = ecommerce_api.LoginRequest(**(json or {}))
@@ -94,18 +197,21 @@ class Session:
             except HTTPException as exc:
                 return Response(exc.status_code, {"detail": exc.detail})
 
+        request_headers = {**self.headers, **(headers or {})}
         token = None
-        if headers and "Authorization" in headers:
-            token = headers["Authorization"].replace("Bearer ", "")
-        elif "Authorization" in self.headers:
-            token = self.headers["Authorization"].replace("Bearer ", "")
+        if "Authorization" in request_headers:
+            token = request_headers["Authorization"].replace("Bearer ", "")
         try:
             current_user = ecommerce_api.get_current_user(token)
-            status_code, data = self._dispatch(method, parsed_url.path, normalized_params, json, current_user)
+            status_code, data = self._dispatch(
+                method, parsed_url.path, normalized_params, json, current_user, request_headers,
+            )
         except HTTPException as exc:  # FastAPI 抛出的业务异常
             return Response(exc.status_code, {"detail": exc.detail})
         except ValidationError as exc:
             return Response(422, {"detail": exc.errors()})
+        if isinstance(data, HTTPResponse):
+            return _from_http_response(data, stream)
         return Response(status_code, data)
 
     def _dispatch(
@@ -115,6 +221,7 @@ class Session:
             params: Dict[str, Any],
             json_data: Optional[Dict[str, Any]],
             current_user: dict,
+            headers: Dict[str, str],
     ) -> Tuple[int, Any]:
         segments = [segment for segment in path.split('/') if segment]
         if not segments or segments[0] != "api":
@@ -123,13 +230,93 @@ class Session:
         resource = segments[1]
 
         if resource == "products":
-            return self._handle_products(method, segments[2:], params, json_data, current_user)
+            return self._handle_products(method, segments[2:], params, json_data, current_user, headers)
         if resource == "cart":
-            return self._handle_cart(method, segments[2:], json_data, current_user)
+            return self._handle_cart(method, segments[2:], json_data, current_user, headers)
         if resource == "promotions":
-            return self._handle_promotions(method, segments[2:], current_user)
+            return self._handle_promotions(method, segments[2:], current_user, headers)
         if resource == "orders":
-            return self._handle_orders(method, segments[2:], json_data, current_user)
+            return self._handle_orders(method, segments[2:], json_data, current_user, headers)
+        if resource == "cache" and segments[2:] == ["stats"] and method == "GET":
+            return 200, ecommerce_api.get_cache_stats(current_user=current_user)
+        if resource == "admin" and segments[2:] == ["lock-profile"]:
+            from api import diagnostics
+
+            if method == "GET":
+                limit = params.get("limit")
+                return 200, diagnostics.get_lock_profile(
+                    limit=int(limit) if limit is not None else None, current_user=current_user,
+                )
+            if method == "POST":
+                config = diagnostics.LockProfileConfig(**(json_data or {}))
+                return 200, diagnostics.configure_lock_profile(config, current_user=current_user)
+        if resource == "admin" and segments[2:] == ["checkout-pipeline"]:
+            if method == "GET":
+                return 200, ecommerce_api.get_checkout_pipeline(current_user=current_user)
+            if method == "POST":
+                config = ecommerce_api.CheckoutPipelineConfig(**(json_data or {}))
+                return 200, ecommerce_api.configure_checkout_pipeline(config, current_user=current_user)
+        if resource == "admin" and segments[2:3] == ["flash-sales"]:
+            if method == "GET" and len(segments) == 3:
+                return 200, ecommerce_api.list_flash_sales(current_user=current_user)
+            if method == "POST" and len(segments) == 4:
+                config = ecommerce_api.FlashSaleConfig(**(json_data or {}))
+                return 201, ecommerce_api.start_flash_sale(int(segments[3]), config, current_user=current_user)
+            if method == "DELETE" and len(segments) == 4:
+                return 200, ecommerce_api.stop_flash_sale(int(segments[3]), current_user=current_user)
+        if resource == "admin" and segments[2:3] == ["low-stock"]:
+            if method == "GET" and len(segments) == 3:
+                limit = params.get("limit")
+                return 200, ecommerce_api.get_low_stock(
+                    limit=int(limit) if limit is not None else None, current_user=current_user,
+                )
+            if method == "GET" and segments[3:] == ["events"]:
+                # 离线模式没有长连接，只返回积压的事件
+                since = params.get("since")
+                return 200, ecommerce_api.stream_low_stock(
+                    since=int(since) if since is not None else None, follow=False,
+                    last_event_id=headers.get("Last-Event-ID"), current_user=current_user,
+                )
+            if method == "PUT" and len(segments) == 4:
+                config = ecommerce_api.LowStockThreshold(**(json_data or {}))
+                return 200, ecommerce_api.set_low_stock_threshold(int(segments[3]), config, current_user=current_user)
+            if method == "DELETE" and len(segments) == 4:
+                return 200, ecommerce_api.clear_low_stock_threshold(int(segments[3]), current_user=current_user)
+        if resource == "admin" and segments[2:] == ["catalog"] and method == "GET":
+            return 200, ecommerce_api.get_catalog_stats(current_user=current_user)
+        if resource == "admin" and segments[2:] == ["catalog", "snapshot"] and method == "POST":
+            return 200, ecommerce_api.write_catalog_snapshot(current_user=current_user)
+        if resource == "admin" and segments[2:] == ["orders", "archive"]:
+            if method == "GET":
+                return 200, ecommerce_api.get_order_archive(current_user=current_user)
+            if method == "POST":
+                request = ecommerce_api.OrderArchiveRequest(**(json_data or {}))
+                return 200, ecommerce_api.archive_orders(request, current_user=current_user)
+        if resource == "admin" and segments[2:] == ["profile"] and method == "GET":
+            from api import diagnostics
+
+            return 200, diagnostics.sample_profile(
+                seconds=float(params.get("seconds", 5.0)), interval_ms=float(params.get("interval_ms", 10.0)),
+                format=params.get("format", "json"),
+                include_idle=str(params.get("include_idle", "false")).lower() in ("1", "true"),
+                current_user=current_user,
+            )
+        if resource == "events" and len(segments) == 2 and method == "GET":
+            # 离线模式没有长连接，只返回积压的事件
+            since = params.get("since")
+            return 200, ecommerce_api.stream_changes(
+                since=int(since) if since is not None else None, follow=False, topics=params.get("topics"),
+                last_event_id=headers.get("Last-Event-ID"), current_user=current_user,
+            )
+        if resource == "export" and len(segments) == 3 and method == "GET":
+            gzip = str(params.get("gzip", "false")).lower() in ("1", "true")
+            if segments[2] == "orders":
+                return 200, ecommerce_api.export_orders(gzip=gzip, current_user=current_user)
+            if segments[2] == "products":
+                return 200, ecommerce_api.export_products(gzip=gzip, current_user=current_user)
+        if resource == "batch" and method == "POST":
+            envelope = ecommerce_api.BatchRequest(**(json_data or {}))
+            return 200, ecommerce_api.batch(envelope, current_user=current_user)
         if resource == "auth" and len(segments) > 2 and segments[1] == "token":
             requests = ecommerce_api.LoginRequest(**(json or {}))
             token_response = ecommerce_api.login(requests)
@@ -145,13 +332,23 @@ class Session:
             params: Dict[str, Any],
             json_data: Optional[Dict[str, Any]],
             current_user: dict,
+            headers: Dict[str, str],
     ) -> Tuple[int, Any]:
+        if_none_match = headers.get("If-None-Match")
         if method == "GET" and not segments:
-            category = params.get("category")
-            return 200, ecommerce_api.get_products(category=category, current_user=current_user)
+            query = _query_params(
+                ecommerce_api.get_products, params,
+                "category", "skip", "limit", "min_price", "max_price", "min_stock", "max_stock", "sort",
+            )
+            return 200, ecommerce_api.get_products(current_user=current_user, if_none_match=if_none_match, **query)
+        if method == "GET" and segments == ["search"]:
+            query = _query_params(ecommerce_api.search_products, params, "q", "category", "skip", "limit")
+            return 200, ecommerce_api.search_products(current_user=current_user, if_none_match=if_none_match, **query)
         if method == "GET" and segments:
             product_id = int(segments[0])
-            return 200, ecommerce_api.get_product(product_id, current_user=current_user)
+            return 200, ecommerce_api.get_product(
+                product_id, current_user=current_user, if_none_match=if_none_match,
+            )
         if method == "POST":
             product = ecommerce_api.ProductCreate(**(json_data or {}))
             return 201, ecommerce_api.create_product(product, current_user=current_user)
@@ -161,11 +358,11 @@ class Session:
             return 200, ecommerce_api.update_product(product_id, product, current_user=current_user)
         if method == "DELETE" and segments:
             product_id = int(segments[0])
-            return 200, ecommerce_api.delete_product(product_id)
+            return 200, ecommerce_api.delete_product(product_id, current_user=current_user)
         raise HTTPException(status_code=405, detail="不支持的请求")
 
-    def _handle_cart(self, method: str, segments: list[str], json_data: Optional[Dict[str, Any]], current_user: dict) -> \
-    Tuple[int, Any]:
+    def _handle_cart(self, method: str, segments: list[str], json_data: Optional[Dict[str, Any]], current_user: dict,
+                     headers: Dict[str, str]) -> Tuple[int, Any]:
         if not segments:
             raise HTTPException(status_code=404, detail="缺少用户 ID")
 
@@ -176,19 +373,27 @@ class Session:
         if len(segments) >= 2 and segments[1] == "items":
             if method == "POST":
                 item = ecommerce_api.CartItemAdd(**(json_data or {}))
-                return 200, ecommerce_api.add_to_cart(user_id, item, current_user=current_user)
+                return 200, ecommerce_api.add_to_cart(
+                    user_id, item, current_user=current_user, idempotency_key=headers.get("Idempotency-Key"),
+                )
             if method == "DELETE" and len(segments) == 3:
                 product_id = int(segments[2])
                 return 200, ecommerce_api.remove_from_cart(user_id, product_id, current_user=current_user)
 
         raise HTTPException(status_code=405, detail="不支持的购物车操作")
 
-    def _handle_promotions(self, method: str, segments: list[str], current_user: dict) -> Tuple[int, Any]:
+    def _handle_promotions(self, method: str, segments: list[str], current_user: dict,
+                           headers: Dict[str, str]) -> Tuple[int, Any]:
+        if_none_match = headers.get("If-None-Match")
         if method == "GET" and not segments:
-            return 200, ecommerce_api.get_promotions(current_user=current_user)
+            return 200, ecommerce_api.get_promotions(
+                current_user=current_user, if_none_match=if_none_match,
+            )
         if method == "GET" and segments:
             promotion_id = int(segments[0])
-            return 200, ecommerce_api.get_promotion(promotion_id, current_user=current_user)
+            return 200, ecommerce_api.get_promotion(
+                promotion_id, current_user=current_user, if_none_match=if_none_match,
+            )
         raise HTTPException(status_code=405, detail="不支持的促销操作")
 
     def _handle_orders(
@@ -197,10 +402,13 @@ class Session:
             segments: list[str],
             json_data: Optional[Dict[str, Any]],
             current_user: dict,
+            headers: Dict[str, str],
     ) -> Tuple[int, Any]:
         if method == "POST" and not segments:
             order = ecommerce_api.OrderCreate(**(json_data or {}))
-            return 201, ecommerce_api.create_order(order, current_user=current_user)
+            return 201, ecommerce_api.create_order(
+                order, current_user=current_user, idempotency_key=headers.get("Idempotency-Key"),
+            )
         if method == "GET" and segments:
             order_id = int(segments[0])
             return 200, ecommerce_api.get_order(order_id, current_user=current_user)
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.catalog_snapshot import CatalogFormatError, SnapshotCatalog, write_catalog
+from utils.http_client import ECommerceAPI
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _product(product_id: int, name: str, category: str = "配件") -> dict:
+    return {"id": product_id, "name": name, "price": product_id * 1.5, "stock": product_id, "reserved": 0,
+            "category": category}
+
+
+def test_snapshot_decodes_lazily_and_overlays_mutations(tmp_path):
+    path = tmp_path / "catalog.snap"
+    products = [_product(1, "iPhone 15", "电子产品"), _product(2, "AirPods"), _product(5, "数据线"), _product(9, "Case")]
+    assert write_catalog(path, products) == 4
+    catalog = SnapshotCatalog.open(path)
+    assert len(catalog) == 4 and catalog.stats()["materialized"] == 0
+
+    # 稀疏的 ID 走二分查找；peek 不会放入 overlay
+    assert catalog.peek(5) == products[2] and 3 not in catalog and catalog.get(3) is None
+    assert catalog.stats()["materialized"] == 0
+    product = catalog[5]
+    product["stock"] -= 1
+    assert catalog[5] is product and catalog.peek(5)["stock"] == 4
+
+    del catalog[9]
+    catalog[10] = _product(10, "Switch")
+    assert list(catalog) == [1, 2, 5, 10] and catalog.max_key() == 10
+    del catalog[10]
+    assert catalog.max_key() == 5 and len(catalog) == 3
+    catalog[9] = _product(9, "Case v2")
+    assert list(catalog) == [1, 2, 5, 9] and catalog[9]["name"] == "Case v2"
+    with pytest.raises(KeyError):
+        del catalog[3]
+
+    # 重写后的快照包含 overlay 中的修改
+    rewritten = tmp_path / "rewritten.snap"
+    write_catalog(rewritten, catalog.iter_records())
+    assert [p["stock"] for p in SnapshotCatalog.open(rewritten).iter_records()] == [1, 2, 4, 9]
+
+    with pytest.raises(ValueError):
+        write_catalog(tmp_path / "bad.snap", [products[1], products[0]])
+    (tmp_path / "garbage.snap").write_bytes(b"not a catalog" * 4)
+    with pytest.raises(CatalogFormatError):
+        SnapshotCatalog.open(tmp_path / "garbage.snap")
+
+
+def test_indexes_are_built_on_first_query():
+    admin = ECommerceAPI("http://localhost:8000")
+    admin.authenticate("admin", "adminpass")
+    assert ecommerce_api._indexes_ready is False
+    created = admin.create_product("Switch OLED", 2399.0, 8, "游戏").json()
+    assert [p["id"] for p in admin.search_products("switch").json()["products"]] == [created["id"]]
+    assert ecommerce_api._indexes_ready is True
+
+    admin.update_product(created["id"], "Switch Lite", 1499.0, 3, "游戏")
+    assert admin.search_products("lite").json()["total"] == 1
+    assert [p["id"] for p in admin.get_products(sort="stock", limit=2).json()["products"]] == [created["id"], 2]
+
+
+def test_rewritten_snapshot_is_loaded_on_startup(tmp_path, monkeypatch):
+    admin = ECommerceAPI("http://localhost:8000")
+    admin.authenticate("admin", "adminpass")
+    # 未配置快照路径时不写任何文件
+    assert ecommerce_api.CATALOG_SNAPSHOT_PATH is None
+    assert admin.client.post("/api/admin/catalog/snapshot").status_code == 409
+
+    path = tmp_path / "catalog.snap"
+    monkeypatch.setattr(ecommerce_api, "CATALOG_SNAPSHOT_PATH", path)
+    admin.add_to_cart(1, 1, 2)
+    admin.delete_product(2)
+    admin.create_product("Switch", 2099.0, 8, "游戏")
+    user = ECommerceAPI("http://localhost:8000")
+    user.authenticate("user1001", "pass1001")
+    assert user.client.post("/api/admin/catalog/snapshot").status_code == 403
+
+    written = admin.client.post("/api/admin/catalog/snapshot").json()
+    assert written["records"] == 3 and written["bytes"] == path.stat().st_size
+
+    script = (
+        "import json; from api import ecommerce_api as api\n"
+        "stats = api.products_db.stats()\n"
+        "api._ensure_indexes()\n"
+        "total, hits = api.search_index.search('switch', None, 0, 10)\n"
+        "print(json.dumps([stats['snapshot_records'], stats['materialized'], list(api.products_db), hits,\n"
+        "                  api.products_db[1], api.carts_db]))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True,
+                            env={**os.environ, "ECOMMERCE_CATALOG_SNAPSHOT": str(path)}).stdout
+    records, materialized, ids, hits, product, carts = json.loads(output.strip().splitlines()[-1])
+    assert (records, materialized, ids) == (3, 0, [1, 3, 4])
+    assert [hit[0] for hit in hits] == [4]
+    # 购物车不会随快照恢复，加购时预占的库存在重启后重新可售
+    assert carts == {} and (product["stock"], product["reserved"]) == (50, 0)
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.event_stream import EventRing
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def admin():
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("admin", "adminpass")
+    return client
+
+
+def _types(events):
+    return [event["type"] for event in events]
+
+
+def test_mutating_handlers_publish_in_order(admin):
+    # 重置数据不会让序号从 1 重新开始
+    base = ecommerce_api.change_feed.last_seq
+    admin.add_to_cart(1001, 1, 2)
+    admin.create_order(1001)
+    created = admin.create_product("Switch", 2099.0, 8, "游戏").json()
+    admin.update_product(created["id"], "Switch OLED", 2399.0, 8, "游戏")
+    admin.delete_product(created["id"])
+
+    events = admin.get_change_events()
+    assert _types(events) == [
+        "stock_changed", "stock_changed", "order_created",
+        "product_created", "product_updated", "product_deleted",
+    ]
+    assert [event["seq"] for event in events] == list(range(base + 1, base + 7))
+    assert events[0] == {"seq": base + 1, "type": "stock_changed", "product_id": 1, "stock": 50, "reserved": 2}
+    assert events[1]["stock"] == 48 and events[1]["reserved"] == 0
+    assert events[2]["items"] == [{"product_id": 1, "quantity": 2}]
+    assert events[4]["product"]["name"] == "Switch OLED"
+    assert events[5] == {"seq": base + 6, "type": "product_deleted", "product_id": created["id"]}
+
+    # 续读与按主题过滤
+    assert _types(admin.get_change_events(since=base + 3)) == ["product_created", "product_updated", "product_deleted"]
+    assert _types(admin.get_change_events(topics=["order"])) == ["order_created"]
+    resumed = admin.client.get("/api/events", headers={"Last-Event-ID": str(base + 5)}, params={"follow": "false"})
+    assert resumed.text.startswith(f"id: {base + 6}\nevent: product_deleted\n")
+    assert admin.client.get("/api/events", params={"topics": "carts"}).status_code == 422
+
+    user = ECommerceAPI("http://localhost:8000")
+    user.authenticate("user1001", "pass1001")
+    assert user.client.get("/api/events").status_code == 403
+
+
+def test_slow_consumer_gets_gap_and_resumes(admin, monkeypatch):
+    monkeypatch.setattr(ecommerce_api, "change_feed", EventRing(capacity=4))
+    for _ in range(6):
+        admin.add_to_cart(1001, 3, 1)
+    events = admin.get_change_events(since=0)
+    assert events[0] == {"seq": 2, "type": "gap", "missed": 2, "resume_from": 2}
+    assert [event["reserved"] for event in events[1:]] == [3, 4, 5, 6]
+    assert admin.get_change_events(since=6) == []
+
+
+def test_resuming_across_clear_reports_gap():
+    ring = EventRing()
+    for index in range(3):
+        ring.publish("stock_changed", product_id=index)
+    ring.clear()
+    ring.publish("order_created", order_id=1)
+    # 清空前读到 2 的消费者得知丢失了 seq 3，而不是跳过新的 seq 4
+    assert list(ring.iter_events(since=2, follow=False)) == [
+        {"seq": 3, "type": "gap", "missed": 1, "resume_from": 3},
+        {"seq": 4, "type": "order_created", "order_id": 1},
+    ]
+    assert [event["seq"] for event in ring.iter_events(since=0, follow=False)] == [4]
+
+
+def test_follow_stream_batches_backlog_and_waits_for_new_events():
+    ring = EventRing()
+    for index in range(5):
+        ring.publish("stock_changed", product_id=index)
+
+    async def follow():
+        stream = ecommerce_api._sse_ring_events(ring, 2, follow=True)
+        # 积压的事件合并为一次写出
+        backlog = await stream.__anext__()
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+        threading.Thread(target=ring.publish, args=("order_created",), kwargs={"order_id": 1}).start()
+        received = await asyncio.wait_for(pending, 2)
+        await stream.aclose()
+        return backlog, received
+
+    backlog, received = asyncio.run(follow())
+    assert backlog.count("event: stock_changed") == 3
+    assert received.startswith("id: 6\nevent: order_created\n")
@@ -0,0 +1,147 @@
+import importlib.util
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.coverage_engine import CoverageCollector, CoverageData, executable_lines
+
+SAMPLE_SOURCE = textwrap.dedent('''\
+    # 注释行不可执行
+
+    def branch(x):
+        """文档字符串"""
+        if x > 1:
+            return x * 2
+        return x
+
+
+    def loop():
+        total = 0
+        for i in range(3):
+            total += i
+        return total
+''')
+
+
+def _load_sample(tmp_path):
+    path = tmp_path / "sample_module.py"
+    path.write_text(SAMPLE_SOURCE, encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("sample_module", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return str(path.resolve()), module
+
+
+def test_executable_lines_skip_comments_and_blanks(tmp_path):
+    path, _ = _load_sample(tmp_path)
+    lines = executable_lines(path)
+    assert 1 not in lines and 2 not in lines and 8 not in lines
+    assert {3, 5, 6, 7, 10, 11, 12, 13, 14} <= lines
+
+
+def test_collector_records_only_source_root(tmp_path):
+    path, module = _load_sample(tmp_path)
+    collector = CoverageCollector(source_root=tmp_path)
+    collector.start()
+    try:
+        module.branch(0)
+        os.path.join("a", "b")
+    finally:
+        collector.stop()
+
+    data = collector.data
+    assert list(data.lines) == [path]
+    assert {5, 7} <= data.lines[path]
+    assert 6 not in data.lines[path]
+    assert data.summary()["files"][path]["executed"] == len(data.lines[path] & executable_lines(path))
+
+
+def test_coverage_data_merge_round_trip(tmp_path):
+    path, _ = _load_sample(tmp_path)
+    first = CoverageData({path: {5, 7}})
+    second = CoverageData.from_dict({path: [5, 6, 11]})
+    first.update(second)
+    assert CoverageData.from_dict(first.to_dict()).lines == {path: {5, 6, 7, 11}}
+
+
+def test_nested_collectors_keep_outer_running(tmp_path):
+    path, module = _load_sample(tmp_path)
+    outer = CoverageCollector(source_root=tmp_path)
+    outer.start()
+    try:
+        inner = CoverageCollector(source_root=tmp_path)
+        inner.start()
+        try:
+            module.branch(0)
+        finally:
+            inner.stop()
+        module.loop()
+    finally:
+        outer.stop()
+
+    assert {5, 7} <= inner.data.lines[path]
+    assert 11 not in inner.data.lines[path]
+    assert {11, 12, 13, 14} <= outer.data.lines[path]
+
+
+def test_switch_context_records_lines_per_context(tmp_path):
+    path, module = _load_sample(tmp_path)
+    collector = CoverageCollector(source_root=tmp_path)
+    collector.start()
+    try:
+        collector.switch_context("first")
+        module.branch(0)
+        collector.switch_context("second")
+        module.branch(0)
+        module.loop()
+        collector.switch_context(None)
+    finally:
+        collector.stop()
+
+    contexts = collector.context_data()
+    assert {5, 7} <= contexts["first"].lines[path]
+    assert 11 not in contexts["first"].lines[path]
+    assert {5, 7, 11, 12} <= contexts["second"].lines[path]
+    assert collector.data.lines[path] == contexts["first"].lines[path] | contexts["second"].lines[path]
+
+
+def test_generated_code_is_not_tracked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collector = CoverageCollector(source_root=tmp_path)
+    collector.start()
+    try:
+        exec(compile("value = 1\n", "<string>", "exec"), {})
+    finally:
+        collector.stop()
+    assert collector.data.lines == {}
+
+
+def _record(tmp_path, module, use_monitoring):
+    collector = CoverageCollector(source_root=tmp_path)
+    collector.use_monitoring = use_monitoring
+    collector.start()
+    try:
+        collector.switch_context("first")
+        module.branch(0)
+        collector.switch_context("second")
+        module.branch(2)
+        module.loop()
+        collector.switch_context(None)
+    finally:
+        collector.stop()
+    # sys.monitoring 在 PY_START 时就登记文件，忽略没有执行任何行的空集合
+    return {name: {path: lines for path, lines in data.lines.items() if lines}
+            for name, data in collector.context_data().items()}
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="sys.monitoring 需要 Python 3.12+")
+def test_monitoring_and_settrace_record_same_lines(tmp_path):
+    path, module = _load_sample(tmp_path)
+    monitored = _record(tmp_path, module, use_monitoring=True)
+    traced = _record(tmp_path, module, use_monitoring=False)
+    assert monitored == traced
+    assert monitored["first"][path] == {5, 7}
+    assert {5, 6, 11, 12, 13, 14} <= monitored["second"][path]
@@ -0,0 +1,85 @@
+import os
+import sys
+import textwrap
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.coverage_engine import CoverageData
+from api.coverage_report import analyze_file, generate_html_report, static_branches
+
+SAMPLE_SOURCE = textwrap.dedent('''\
+    def branch(x):
+        if x > 1:
+            return x * 2
+        return x
+
+
+    def loop(items):
+        total = 0
+        for item in items:
+            total += item
+        return total
+''')
+
+
+def _write_sample(tmp_path, name="sample_report.py", source=SAMPLE_SOURCE):
+    path = tmp_path / name
+    path.write_text(source, encoding="utf-8")
+    return str(path.resolve())
+
+
+def test_static_branches_from_conditional_jumps(tmp_path):
+    path = _write_sample(tmp_path)
+    branches = static_branches(path)
+    assert branches[2] == {3, 4}
+    assert 10 in branches[9]
+    assert 1 not in branches
+
+
+def test_analyze_file_marks_partial_branches(tmp_path):
+    path = _write_sample(tmp_path)
+    stats = analyze_file(path, {1, 2, 4, 7})
+    assert stats["partial"] == {2: [3]}
+    assert 3 in stats["missing"] and 8 in stats["missing"]
+    assert stats["branches_covered"] == 1
+    assert stats["branches"] == sum(len(destinations) for destinations in static_branches(path).values())
+
+
+def test_report_is_regenerated_incrementally(tmp_path):
+    first = _write_sample(tmp_path)
+    second = _write_sample(tmp_path, "other_report.py", "VALUE = 1\n")
+    output = tmp_path / "report"
+
+    coverage = CoverageData({first: {1, 2, 4, 7}, second: {1}})
+    stats = generate_html_report(coverage, output, stdout="2 passed", root=tmp_path)
+    assert (stats["rendered"], stats["skipped"]) == (2, 0)
+    [page] = (output / "files").glob("sample_report_py_*.html")
+    text = page.read_text(encoding="utf-8")
+    assert 'class="partial"' in text and 'class="miss"' in text and 'class="run"' in text
+    [other_page] = (output / "files").glob("other_report_py_*.html")
+    index = (output / "index.html").read_text(encoding="utf-8")
+    assert f"files/{other_page.name}" in index and "2 passed" in index
+
+    assert generate_html_report(coverage, output, root=tmp_path)["rendered"] == 0
+
+    coverage.add_lines(first, {3})
+    stats = generate_html_report(coverage, output, root=tmp_path)
+    assert (stats["rendered"], stats["skipped"]) == (1, 1)
+
+    # 部分运行不删除页面，汇总仍包含上次的文件
+    stats = generate_html_report(CoverageData({first: {1}}), output, root=tmp_path, prune=False)
+    assert stats["removed"] == 0 and other_page.exists()
+    assert f"files/{other_page.name}" in (output / "index.html").read_text(encoding="utf-8")
+
+    stats = generate_html_report(CoverageData({first: {1}}), output, root=tmp_path)
+    assert stats["removed"] == 1
+    assert not other_page.exists()
+
+
+def test_page_names_keep_paths_distinct(tmp_path):
+    (tmp_path / "api").mkdir()
+    (tmp_path / "api_a").mkdir()
+    first = _write_sample(tmp_path / "api", "a_b.py", "VALUE = 1\n")
+    second = _write_sample(tmp_path / "api_a", "b.py", "VALUE = 2\n")
+    output = tmp_path / "report"
+    stats = generate_html_report(CoverageData({first: {1}, second: {1}}), output, root=tmp_path)
+    assert stats["rendered"] == 2 and len(list((output / "files").glob("*.html"))) == 2
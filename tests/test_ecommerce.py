@@ -19,6 +19,7 @@
 import sys
 import pytest
 import os
+import subprocess
 
 # 添加项目路径
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -410,3 +411,95 @@ class TestDashBoard:
         #         cart_after = api.get_cart(user_id, auth_token=user_token).json()
         #         assert len(cart_after["items"]) == 0
         assert "可视化测试面板" in response.text
+
+
+class TestProductListCache:
+    def test_cache_hits_reported(self, admin_client: ECommerceAPI):
+        admin_client.get_products(category="配件")
+        admin_client.get_products(category="配件")
+        stats = admin_client.client.get("/api/cache/stats").json()["product_list"]
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_cache_stats_requires_admin(self, user_client: ECommerceAPI):
+        assert user_client.client.get("/api/cache/stats").status_code == 403
+
+    def test_writes_invalidate_only_affected_categories(self, admin_client: ECommerceAPI):
+        admin_client.get_products(category="配件")
+        admin_client.get_products(category="电子产品")
+        admin_client.add_to_cart(1001, product_id=1, quantity=3)
+
+        accessories = admin_client.get_products(category="配件")
+        electronics = admin_client.get_products(category="电子产品").json()
+        assert accessories.json()["count"] == 1
+        assert electronics["products"][0]["reserved"] == 3
+        stats = admin_client.client.get("/api/cache/stats").json()["product_list"]
+        assert (stats["hits"], stats["misses"]) == (1, 3)
+
+    def test_update_and_delete_invalidate(self, admin_client: ECommerceAPI):
+        assert admin_client.get_products(category="配件").json()["count"] == 1
+        admin_client.update_product(1, name="iPhone 15", price=5999.0, stock=50, category="配件")
+        assert admin_client.get_products(category="配件").json()["count"] == 2
+        admin_client.delete_product(3)
+        body = admin_client.get_products(category="配件").json()
+        assert [product["id"] for product in body["products"]] == [1]
+
+    def test_etag_matches_cached_body_while_invalidation_is_pending(self, admin_client: ECommerceAPI,
+                                                                    monkeypatch):
+        admin_client.client.get("/api/products")
+        pending = []
+        invalidate = ecommerce_api.product_list_cache.invalidate
+        # 写入方已递增版本号但尚未失效列表缓存时读取
+        monkeypatch.setattr(ecommerce_api.product_list_cache, "invalidate", pending.append)
+        admin_client.update_product(1, name="iPhone 15", price=4999.0, stock=50, category="电子产品")
+        stale = admin_client.client.get("/api/products")
+        for categories in pending:
+            invalidate(categories)
+
+        assert stale.json()["products"][0]["price"] != 4999.0
+        assert stale.headers["etag"] != ecommerce_api._catalog_etag()
+        fresh = admin_client.client.get("/api/products", headers={"If-None-Match": stale.headers["etag"]})
+        assert fresh.status_code == 200
+        assert fresh.json()["products"][0]["price"] == 4999.0
+
+    def test_pagination(self, user_client: ECommerceAPI):
+        body = user_client.client.get("/api/products", params={"skip": 1, "limit": 1}).json()
+        assert body["total"] == 3
+        assert [product["id"] for product in body["products"]] == [2]
+
+
+class TestJsonResponse:
+    @pytest.fixture
+    def restore_backend(self):
+        from api import json_response
+        backend = json_response.json_backend
+        yield json_response
+        json_response.set_json_backend(backend)
+
+    @pytest.mark.parametrize("backend", ["stdlib", "orjson"])
+    def test_backends_render_same_records(self, restore_backend, user_client: ECommerceAPI, backend: str):
+        if backend not in restore_backend.JSON_BACKENDS:
+            pytest.skip("orjson 未安装")
+        restore_backend.set_json_backend(backend)
+        user_client.add_to_cart(1001, product_id=1, quantity=1)
+        order = user_client.create_order(1001, promotion_id=2).json()
+        rendered = user_client.get_order(order["id"])
+        assert rendered.json() == order
+        assert user_client.get_products(category="电子产品").json()["count"] == 2
+
+    def test_unavailable_env_backend_falls_back(self):
+        # 模拟未安装 orjson：环境变量指定的实现不可用时，json_backend 报告实际使用的 stdlib
+        script = (
+            "import sys; sys.modules['orjson'] = None\n"
+            "from api import json_response\n"
+            "print(json_response.json_backend, json_response.dumps({'a': 1}).decode())\n"
+        )
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True,
+                                env={**os.environ, "ECOMMERCE_JSON_BACKEND": "orjson"}).stdout
+        assert output.split() == ["stdlib", '{"a":1}']
+
+    def test_unknown_backend_rejected(self, restore_backend):
+        with pytest.raises(ValueError):
+            restore_backend.set_json_backend("yaml")
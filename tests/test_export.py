@@ -0,0 +1,163 @@
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.ecommerce_api import CartItemAdd, FlashSaleConfig, OrderCreate
+from api.export import SnapshotStore, ndjson_stream
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def admin():
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("admin", "adminpass")
+    return client
+
+
+def test_snapshot_sees_state_at_open_time():
+    store = {key: {"id": key, "value": key} for key in range(1, 6)}
+    snapshots = SnapshotStore(store)
+    snapshot = snapshots.open()
+    stream = ndjson_stream(snapshot, lambda record: json.dumps(record).encode(), chunk_size=2)
+
+    first = next(stream)
+    # 快照之后的修改、删除、新建与已删除键的复用都不可见
+    for key, change in ((3, "update"), (4, "delete"), (6, "create"), (4, "create")):
+        snapshots.preserve(key)
+        if change == "update":
+            store[key]["value"] = -1
+        elif change == "delete":
+            del store[key]
+        else:
+            store[key] = {"id": key, "value": "new"}
+    rest = b"".join(stream)
+
+    records = [json.loads(line) for line in (first + rest).splitlines()]
+    assert records == [{"id": key, "value": key} for key in range(1, 6)]
+    # 导出结束后快照关闭，之后的写入不再复制旧值
+    assert snapshots.active == 0
+    snapshots.preserve(1)
+    assert snapshot.preimages == {}
+
+
+def test_export_endpoints_stream_ndjson(admin):
+    admin.add_to_cart(1001, 1, 2)
+    first = admin.create_order(1001).json()
+    admin.add_to_cart(1002, 3, 1)
+    second = admin.create_order(1002).json()
+
+    assert [order["id"] for order in admin.export_orders()] == [first["id"], second["id"]]
+    products = list(admin.export_products(gzip=True))
+    assert [product["id"] for product in products] == [1, 2, 3]
+    assert products[0]["stock"] == 48
+
+    raw = admin.client.get("/api/export/products", params={"gzip": "true"})
+    assert raw.headers["content-type"] == "application/x-ndjson"
+    assert raw.headers["content-encoding"] == "gzip"
+    assert len(raw.text.splitlines()) == 3
+
+    user = ECommerceAPI("http://localhost:8000")
+    user.authenticate("user1001", "pass1001")
+    with pytest.raises(HTTPException) as excinfo:
+        user.export_orders()
+    assert excinfo.value.status_code == 403
+
+
+def test_export_is_consistent_while_orders_are_placed(admin, monkeypatch):
+    monkeypatch.setattr(ecommerce_api, "EXPORT_CHUNK_SIZE", 1)
+    products = admin.export_products()
+    assert next(products)["stock"] == 50
+    # 导出进行中下单，商品 2、3 的库存变化不会出现在这次导出里
+    admin.add_to_cart(1001, 2, 5)
+    admin.add_to_cart(1001, 3, 5)
+    admin.create_order(1001)
+    assert [(p["id"], p["stock"], p["reserved"]) for p in products] == [(2, 30, 0), (3, 100, 0)]
+    assert ecommerce_api.product_snapshots.active == 0
+    assert [p["stock"] for p in admin.export_products()] == [50, 25, 95]
+
+
+
+def test_unlocked_writer_is_ordered_against_snapshot_open():
+    store = {1: {"id": 1, "value": 0}}
+    snapshots = SnapshotStore(store)
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_write():
+        with snapshots.writing(1):
+            entered.set()
+            release.wait(2)
+            store[1]["value"] = 1
+
+    writer = threading.Thread(target=slow_write)
+    writer.start()
+    entered.wait(2)
+    opened = []
+    opener = threading.Thread(target=lambda: opened.append(snapshots.open()))
+    opener.start()
+    opener.join(0.05)
+    # 写入进行中不能打开快照，否则快照会包含快照时刻之后的写入
+    assert not opened
+    release.set()
+    writer.join()
+    opener.join()
+    with snapshots.writing(1):
+        store[1]["value"] = 2
+    assert [json.loads(line) for chunk in opened[0].iter_chunks(json.dumps) for line in chunk] == [
+        {"id": 1, "value": 1},
+    ]
+
+
+def test_export_during_concurrent_flash_sale_orders():
+    admin = ecommerce_api.users_db["admin"]
+    ecommerce_api.start_flash_sale(1, FlashSaleConfig(shards=4), current_user=admin)
+    stock = ecommerce_api.products_db[1]["stock"]
+    done = threading.Event()
+    exports = []
+
+    def checkout(user_id: int) -> None:
+        # 库存售罄后加购物车同样会返回 400
+        try:
+            ecommerce_api.add_to_cart(user_id, CartItemAdd(product_id=1, quantity=1), current_user=admin)
+            ecommerce_api.create_order(OrderCreate(user_id=user_id), current_user=admin)
+        except HTTPException:
+            pass
+
+    def export() -> None:
+        while not done.is_set():
+            with ecommerce_api.global_lock:
+                orders = ecommerce_api.order_snapshots.open(ecommerce_api.order_counter - 1)
+            exports.append([json.loads(line) for chunk in orders.iter_chunks(json.dumps) for line in chunk])
+            orders.close()
+
+    exporter = threading.Thread(target=export, daemon=True)
+    exporter.start()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(checkout, range(6000, 6000 + stock + 10)))
+    finally:
+        done.set()
+        exporter.join(10)
+    assert not exporter.is_alive()
+
+    assert exports and ecommerce_api.order_snapshots.active == 0
+    for orders in exports:
+        ids = [order["id"] for order in orders]
+        # 每次导出的订单号有序且不重复，每条订单都是完整写入后的记录
+        assert ids == sorted(set(ids)) and all(order["items"] for order in orders)
+    assert len(exports[-1]) <= stock
+    final = ecommerce_api.order_snapshots.open(ecommerce_api.order_counter - 1)
+    assert sum(len(chunk) for chunk in final.iter_chunks(json.dumps)) == len(ecommerce_api.orders_db) == stock
+    final.close()
@@ -0,0 +1,198 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.flash_sale import SaleClosed, ShardedStock
+from offline_requests import Session
+
+ADMIN = ecommerce_api.users_db["admin"]
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _session(username: str, password: str) -> Session:
+    session = Session()
+    token = session.post("/api/auth/token", json={"username": username, "password": password}).json()
+    session.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    return session
+
+
+def _shard_totals(sale: ShardedStock) -> dict:
+    shards = sale.stats()["shards"]
+    return {field: sum(shard[field] for shard in shards) for field in ("available", "reserved", "sold")}
+
+
+def test_sharded_stock_rebalances_and_never_oversells():
+    sale = ShardedStock(1, stock=10, reserved=0, shards=4)
+    # 单个分片只有 2~3 件，一次预留 5 件需要再平衡
+    assert sale.reserve(5, hint=0)
+    assert sale.rebalances == 1
+    assert _shard_totals(sale) == {"available": 5, "reserved": 5, "sold": 0}
+    assert not sale.reserve(6, hint=1)
+    assert sale.reserve(5, hint=2)
+    assert not sale.reserve(1, hint=3)
+    assert sale.commit(5, hint=3)
+    assert sale.release(5, hint=0)
+    assert sale.totals() == (5, 0)
+    assert sale.close() == (5, 0)
+    with pytest.raises(SaleClosed):
+        sale.reserve(1, hint=0)
+
+
+def test_concurrent_reservations_match_stock():
+    sale = ShardedStock(1, stock=500, reserved=0, shards=8)
+
+    def reserve(user_id: int) -> int:
+        return sum(sale.reserve(1, user_id) for _ in range(50))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        reserved = sum(executor.map(reserve, range(16)))
+
+    assert reserved == 500
+    assert _shard_totals(sale) == {"available": 0, "reserved": 500, "sold": 0}
+
+
+def test_flash_sale_concurrent_checkout_keeps_oversell_guarantee():
+    ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=4), current_user=ADMIN)
+    stock = ecommerce_api.products_db[1]["stock"]
+
+    def checkout(user_id: int) -> bool:
+        try:
+            ecommerce_api.add_to_cart(user_id, ecommerce_api.CartItemAdd(product_id=1, quantity=1),
+                                      current_user=ADMIN)
+            ecommerce_api.create_order(ecommerce_api.OrderCreate(user_id=user_id), current_user=ADMIN)
+            return True
+        except HTTPException as exc:
+            assert exc.detail == "库存不足"
+            return False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=60) as executor:
+        results = list(executor.map(checkout, range(5000, 5080)))
+
+    assert sum(results) == stock
+    assert len(ecommerce_api.orders_db) == stock
+    assert len({order["id"] for order in ecommerce_api.orders_db.values()}) == stock
+    product = ecommerce_api.stop_flash_sale(1, current_user=ADMIN)
+    assert product["stock"] == 0
+    assert product["reserved"] == 0
+    assert ecommerce_api.products_db[1]["stock"] == 0
+
+
+def test_flash_sale_reservations_merge_back_when_sale_ends():
+    ecommerce_api.add_to_cart(1001, ecommerce_api.CartItemAdd(product_id=1, quantity=2), current_user=ADMIN)
+    ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=3), current_user=ADMIN)
+    ecommerce_api.add_to_cart(1002, ecommerce_api.CartItemAdd(product_id=1, quantity=3), current_user=ADMIN)
+    ecommerce_api.add_to_cart(1002, ecommerce_api.CartItemAdd(product_id=1, quantity=1), current_user=ADMIN)
+    assert ecommerce_api.carts_db[1002]["items"][0]["quantity"] == 4
+    assert ecommerce_api.products_db[1]["reserved"] == 6
+
+    # 开启前的预留也能正常下单，包含普通商品的购物车走普通路径
+    ecommerce_api.add_to_cart(1001, ecommerce_api.CartItemAdd(product_id=3, quantity=1), current_user=ADMIN)
+    order = ecommerce_api.create_order(ecommerce_api.OrderCreate(user_id=1001), current_user=ADMIN)
+    assert [item["product_id"] for item in order["items"]] == [1, 3]
+    ecommerce_api.remove_from_cart(1002, 1, current_user=ADMIN)
+
+    product = ecommerce_api.stop_flash_sale(1, current_user=ADMIN)
+    assert product["stock"] == 48
+    assert product["reserved"] == 0
+    assert ecommerce_api.products_db[3]["stock"] == 99
+    assert ecommerce_api.products_db[3]["reserved"] == 0
+
+
+def test_stop_during_traffic_falls_back_to_normal_path():
+    ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=4), current_user=ADMIN)
+    stop = threading.Event()
+    added = []
+
+    def shopper(user_id: int) -> None:
+        while not stop.is_set():
+            try:
+                ecommerce_api.add_to_cart(user_id, ecommerce_api.CartItemAdd(product_id=1, quantity=1),
+                                          current_user=ADMIN)
+                added.append(1)
+                ecommerce_api.remove_from_cart(user_id, 1, current_user=ADMIN)
+                added.append(-1)
+            except HTTPException:
+                pass
+
+    threads = [threading.Thread(target=shopper, args=(6000 + index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    ecommerce_api.stop_flash_sale(1, current_user=ADMIN)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    in_carts = sum(item["quantity"] for cart in ecommerce_api.carts_db.values() for item in cart["items"])
+    assert ecommerce_api.products_db[1]["reserved"] == in_carts == sum(added)
+    assert ecommerce_api.products_db[1]["stock"] == 50
+
+
+def test_remove_from_cart_releases_flash_stock_once(monkeypatch):
+    ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=4), current_user=ADMIN)
+    sale = ecommerce_api.flash_sales[1]
+    ecommerce_api.add_to_cart(3001, ecommerce_api.CartItemAdd(product_id=1, quantity=2), current_user=ADMIN)
+    available = _shard_totals(sale)["available"]
+    calls = []
+    original = sale.release
+
+    def release(quantity, hint):
+        calls.append(quantity)
+        # 第一次释放失败：模拟分片中的预留已被其他路径取走
+        return original(quantity, hint) if len(calls) > 1 else False
+
+    monkeypatch.setattr(sale, "release", release)
+    cart = ecommerce_api.remove_from_cart(3001, 1, current_user=ADMIN)
+    assert cart["items"] == []
+    assert calls == [2]
+    assert _shard_totals(sale)["available"] == available
+
+
+def test_get_cart_does_not_restore_cart_cleared_by_flash_checkout():
+    ecommerce_api.start_flash_sale(1, ecommerce_api.FlashSaleConfig(shards=4), current_user=ADMIN)
+    ecommerce_api.add_to_cart(3002, ecommerce_api.CartItemAdd(product_id=1, quantity=1), current_user=ADMIN)
+    responses = []
+    # 持有购物车锁模拟秒杀下单进行中：get_cart 必须等下单清空购物车后才能读取并写回
+    with ecommerce_api._get_cart_lock(3002):
+        reader = threading.Thread(target=lambda: responses.append(ecommerce_api.get_cart(3002, current_user=ADMIN)))
+        reader.start()
+        reader.join(0.05)
+        assert not responses
+        ecommerce_api.carts_db[3002] = {"user_id": 3002, "items": []}
+    reader.join()
+    assert ecommerce_api.carts_db[3002]["items"] == []
+    with pytest.raises(HTTPException):
+        ecommerce_api.create_order(ecommerce_api.OrderCreate(user_id=3002), current_user=ADMIN)
+
+
+def test_flash_sale_admin_endpoints():
+    admin = _session("admin", "adminpass")
+    response = admin.post("/api/admin/flash-sales/1", json={"shards": 4})
+    assert response.status_code == 201
+    assert len(response.json()["shards"]) == 4
+    assert admin.post("/api/admin/flash-sales/1", json={}).status_code == 409
+    assert admin.put("/api/products/1", json={
+        "name": "iPhone 15", "price": 1.0, "stock": 1, "category": "电子产品",
+    }).status_code == 409
+    assert admin.delete("/api/products/1").status_code == 409
+    assert [sale["product_id"] for sale in admin.get("/api/admin/flash-sales").json()["flash_sales"]] == [1]
+
+    user = _session("user1001", "pass1001")
+    assert user.post("/api/admin/flash-sales/2", json={}).status_code == 403
+    assert user.post("/api/cart/1001/items", json={"product_id": 1, "quantity": 2}).status_code == 200
+    assert user.get("/api/products/1").json()["reserved"] == 2
+
+    assert admin.delete("/api/admin/flash-sales/1").json()["reserved"] == 2
+    assert admin.delete("/api/admin/flash-sales/1").status_code == 404
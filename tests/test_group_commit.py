@@ -0,0 +1,104 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.group_commit import GroupCommitQueue, QueueClosed
+from offline_requests import Session
+
+ADMIN = ecommerce_api.users_db["admin"]
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+    ecommerce_api.reset_state()
+
+
+def test_queue_batches_items_and_isolates_failures():
+    release = threading.Event()
+    batches = []
+
+    def commit(items):
+        release.wait(5)
+        batches.append(list(items))
+        return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+    pipeline = GroupCommitQueue(commit, max_batch=4, max_wait=0.001)
+    # 第一个任务占住提交线程，后续任务在队列中凑批
+    futures = [pipeline.submit(1)]
+    time.sleep(0.05)
+    futures += [pipeline.submit(item) for item in (2, -3, 4, 5, 6)]
+    release.set()
+
+    assert futures[0].result(5) == 2
+    assert futures[1].result(5) == 4
+    with pytest.raises(ValueError):
+        futures[2].result(5)
+    assert [future.result(5) for future in futures[3:]] == [8, 10, 12]
+    assert batches[0] == [1]
+    assert batches[1] == [2, -3, 4, 5]
+    assert max(len(batch) for batch in batches) <= 4
+
+    pipeline.close()
+    with pytest.raises(QueueClosed):
+        pipeline.submit(7)
+    assert pipeline.stats()["committed"] == 6
+
+
+def test_pipeline_checkout_under_contention_does_not_oversell():
+    ecommerce_api.configure_checkout_pipeline(
+        ecommerce_api.CheckoutPipelineConfig(enabled=True, max_batch=16, max_wait_ms=5), current_user=ADMIN,
+    )
+    stock = ecommerce_api.products_db[1]["stock"]
+    for user_id in range(7000, 7000 + stock):
+        ecommerce_api.add_to_cart(user_id, ecommerce_api.CartItemAdd(product_id=1, quantity=1), current_user=ADMIN)
+    # 另一部分用户的购物车引用不存在的商品，这些订单在同一批中单独失败
+    for user_id in range(8000, 8010):
+        ecommerce_api.carts_db[user_id] = {"user_id": user_id, "items": [
+            {"product_id": 99, "product_name": "已下架", "quantity": 1, "price": 1.0},
+        ]}
+
+    def place(user_id: int):
+        try:
+            return ecommerce_api.create_order(ecommerce_api.OrderCreate(user_id=user_id), current_user=ADMIN)
+        except HTTPException as exc:
+            return exc.status_code
+
+    users = list(range(7000, 7000 + stock)) + list(range(8000, 8010))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=60) as executor:
+        results = list(executor.map(place, users))
+
+    orders = [result for result in results if isinstance(result, dict)]
+    assert len(orders) == stock
+    assert results[stock:] == [404] * 10
+    assert ecommerce_api.products_db[1]["stock"] == 0
+    assert ecommerce_api.products_db[1]["reserved"] == 0
+    assert sorted(order["id"] for order in orders) == list(range(1, stock + 1))
+    stats = ecommerce_api.get_checkout_pipeline(current_user=ADMIN)
+    assert stats["committed"] == stock + 10
+    assert stats["batches"] <= stats["committed"]
+
+
+def test_checkout_pipeline_admin_endpoint():
+    admin = Session()
+    token = admin.post("/api/auth/token", json={"username": "admin", "password": "adminpass"}).json()
+    admin.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    assert admin.get("/api/admin/checkout-pipeline").json() == {"enabled": False}
+    data = admin.post("/api/admin/checkout-pipeline", json={"enabled": True, "max_batch": 8}).json()
+    assert data["enabled"] is True and data["max_batch"] == 8
+
+    assert admin.post("/api/cart/1001/items", json={"product_id": 3, "quantity": 2}).status_code == 200
+    response = admin.post("/api/orders", json={"user_id": 1001})
+    assert response.status_code == 201
+    assert response.json()["subtotal"] == 2 * 1899.0
+    assert admin.post("/api/orders", json={"user_id": 1001}).status_code == 400
+
+    assert admin.post("/api/admin/checkout-pipeline", json={"enabled": False}).json() == {"enabled": False}
@@ -0,0 +1,171 @@
+import json
+import logging
+import logging.handlers
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from utils import http_client
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def user_client() -> ECommerceAPI:
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("user1001", "pass1001")
+    return client
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+
+
+@pytest.fixture
+def client_logger():
+    logger = http_client.logger
+    saved = (logger.level, logger.propagate, list(logger.handlers))
+    handler = _ListHandler()
+    logger.addHandler(handler)
+    yield logger, handler
+    logger.setLevel(saved[0])
+    logger.propagate = saved[1]
+    logger.handlers[:] = saved[2]
+
+
+class TestClientLogging:
+    def test_response_body_not_serialized_when_debug_disabled(self, user_client, client_logger):
+        logger, handler = client_logger
+        logger.setLevel(logging.INFO)
+        response = user_client.get_products()
+        assert "text" not in response.__dict__
+        assert [record.http_status for record in handler.records if hasattr(record, "http_status")] == [200]
+
+    def test_sampling_disabled_skips_logging(self, user_client, client_logger):
+        logger, handler = client_logger
+        logger.setLevel(logging.DEBUG)
+        user_client.client.log_sample_rate = 0.0
+        user_client.get_products()
+        assert handler.records == []
+
+    def test_async_logging_delivers_records(self, user_client, client_logger):
+        logger, _ = client_logger
+        target = _ListHandler()
+        listener = http_client.enable_async_logging(target)
+        try:
+            user_client.get_product(1)
+        finally:
+            listener.stop()
+        messages = [record.getMessage() for record in target.records]
+        assert messages[0].startswith("GET http://localhost:8000/api/products/1")
+        assert messages[1] == "Status: 200"
+
+    def test_stopping_async_logging_restores_propagation(self, client_logger, caplog):
+        logger, _ = client_logger
+        logger.setLevel(logging.WARNING)
+        first = http_client.enable_async_logging(_ListHandler())
+        second = http_client.enable_async_logging(_ListHandler(), level=logging.DEBUG)
+        assert logger.propagate is False
+        first.stop()
+        second.stop()
+        assert logger.propagate is True and logger.level == logging.WARNING
+        assert not any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers)
+        with caplog.at_level(logging.WARNING, logger=logger.name):
+            logger.warning("after stop")
+        assert caplog.messages == ["after stop"]
+
+
+class TestBatch:
+    def test_batch_results_in_order(self, user_client: ECommerceAPI):
+        with user_client.batch() as batch:
+            calls = [user_client.get_product(product_id) for product_id in (3, 1, 99, 2)]
+            user_client.add_to_cart(1001, product_id=1, quantity=2)
+            user_client.get_products(category="配件")
+
+        statuses = [response.status_code for response in batch.responses]
+        assert statuses == [200, 200, 404, 200, 200, 200]
+        assert [call.result().json().get("id") for call in calls[:2]] == [3, 1]
+        assert batch.responses[4].json()["items"][0]["quantity"] == 2
+        assert batch.responses[5].json()["count"] == 1
+
+    def test_batch_item_errors_are_isolated(self, user_client: ECommerceAPI):
+        with user_client.batch() as batch:
+            user_client.add_to_cart(1001, product_id=1, quantity=-1)
+            user_client.get_cart(2001)
+            user_client.get_cart(1001)
+        assert [response.status_code for response in batch.responses] == [422, 403, 200]
+
+    def test_batch_missing_required_parameter_fails_only_that_item(self, user_client: ECommerceAPI):
+        response = user_client.client.post("/api/batch", json={"requests": [
+            {"method": "GET", "path": "/api/products/search"},
+            {"method": "GET", "path": "/api/products/search", "params": {"q": "pro", "limit": 0}},
+            {"method": "GET", "path": "/api/products/1"},
+        ]})
+        assert response.status_code == 200
+        responses = response.json()["responses"]
+        assert [item["status_code"] for item in responses] == [422, 422, 200]
+        assert [error["loc"] for error in responses[0]["body"]["detail"]] == [["query", "q"]]
+        assert [error["loc"] for error in responses[1]["body"]["detail"]] == [["query", "limit"]]
+
+    def test_batch_rejects_streaming_and_text_routes(self, user_client: ECommerceAPI):
+        requests = [{"method": "GET", "path": path} for path in ("/api/metrics", "/api/events", "/api/export/products")]
+        response = user_client.client.post("/api/batch", json={"requests": requests + [
+            {"method": "GET", "path": "/api/products/1"},
+        ]})
+        assert response.status_code == 200
+        responses = response.json()["responses"]
+        assert [item["status_code"] for item in responses] == [400, 400, 400, 200]
+        assert "/api/export/products" in json.dumps(responses[2], ensure_ascii=False)
+
+    def test_batch_envelope_requires_auth(self):
+        client = ECommerceAPI("http://localhost:8000")
+        with client.batch() as batch:
+            client.get_product(1)
+            client.get_product(2)
+        assert [response.status_code for response in batch.responses] == [401, 401]
+
+
+class TestConditionalGet:
+    def test_if_none_match_returns_304(self, user_client: ECommerceAPI):
+        first = user_client.get_product(1)
+        etag = first.headers["etag"]
+        second = user_client.client.get("/api/products/1", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.json() is None
+
+        user_client.add_to_cart(1001, product_id=1, quantity=1)
+        third = user_client.client.get("/api/products/1", headers={"If-None-Match": etag})
+        assert third.status_code == 200
+        assert third.headers["etag"] != etag
+
+    def test_catalog_etag_changes_on_write(self, user_client: ECommerceAPI):
+        etag = user_client.get_products().headers["etag"]
+        assert user_client.client.get("/api/products", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+        user_client.add_to_cart(1001, product_id=3, quantity=1)
+        assert user_client.client.get("/api/products", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_client_cache_revalidates(self):
+        client = ECommerceAPI("http://localhost:8000", cache_reads=True)
+        client.authenticate("user1001", "pass1001")
+        first = client.get_promotions()
+        assert client.get_promotions() is first
+
+        products = client.get_products()
+        assert client.get_products() is products
+        client.add_to_cart(1001, product_id=2, quantity=1)
+        refreshed = client.get_products()
+        assert refreshed is not products
+        assert refreshed.status_code == 200
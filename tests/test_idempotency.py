@@ -0,0 +1,189 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.idempotency import IdempotencyMismatch, IdempotencyStore
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def api():
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("user1001", "pass1001")
+    return client
+
+
+def _asgi_post(path: str, body: dict, headers=()):
+    """直接调用 ASGI 应用，验证请求头经过 FastAPI 的参数解析"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers]
+        + [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(ecommerce_api.app(scope, receive, send))
+    response_headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return messages[0]["status"], response_headers, json.loads(b"".join(m.get("body", b"") for m in messages[1:]))
+
+
+def test_store_expires_and_evicts_oldest(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("api.idempotency.time.monotonic", lambda: clock[0])
+    store = IdempotencyStore(ttl=10, max_entries=2)
+    first, owner = store.begin("a", "fp-a")
+    assert owner
+    store.complete(first, 200, b"{}")
+    assert store.begin("a", "fp-a") == (first, False)
+    with pytest.raises(IdempotencyMismatch):
+        store.begin("a", "fp-other")
+
+    store.complete(store.begin("b", "fp-b")[0], 200, b"{}")
+    store.complete(store.begin("c", "fp-c")[0], 200, b"{}")
+    assert len(store) == 2
+    assert store.begin("a", "fp-a")[1]
+
+    clock[0] += 11
+    assert store.begin("b", "fp-b")[1]
+    # 执行中的 a 与刚登记的 b 都保留
+    assert len(store) == 2
+
+
+def test_in_flight_records_survive_ttl_and_cap(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("api.idempotency.time.monotonic", lambda: clock[0])
+    store = IdempotencyStore(ttl=10, max_entries=2)
+    slow, owner = store.begin("slow", "fp-slow")
+    assert owner
+    for key in ("b", "c", "d"):
+        store.complete(store.begin(key, f"fp-{key}")[0], 200, b"{}")
+    # 超出上限时只淘汰已完成的记录
+    assert store.begin("slow", "fp-slow") == (slow, False)
+    assert len(store) == 2
+
+    clock[0] += 11
+    # 超过 ttl 的执行中请求仍然阻止重复执行，完成后才会过期
+    assert store.begin("slow", "fp-slow") == (slow, False)
+    store.complete(slow, 201, b"{}")
+    assert store.begin("slow", "fp-slow")[1]
+
+
+def test_retried_cart_write_is_applied_once(api):
+    first = api.add_to_cart(1001, 1, 2, idempotency_key="cart-1")
+    retry = api.add_to_cart(1001, 1, 2, idempotency_key="cart-1")
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert ecommerce_api.carts_db[1001]["items"][0]["quantity"] == 2
+    assert ecommerce_api.products_db[1]["reserved"] == 2
+
+    # 同一个键用于不同的请求体
+    assert api.add_to_cart(1001, 1, 3, idempotency_key="cart-1").status_code == 422
+    # 不带键的请求照常执行
+    assert api.add_to_cart(1001, 1, 2).json()["items"][0]["quantity"] == 4
+
+
+def test_keys_are_scoped_per_user(api):
+    other = ECommerceAPI("http://localhost:8000")
+    other.authenticate("user1002", "pass1002")
+    assert api.add_to_cart(1001, 1, 1, idempotency_key="same").status_code == 200
+    assert other.add_to_cart(1002, 1, 1, idempotency_key="same").status_code == 200
+    assert ecommerce_api.products_db[1]["reserved"] == 2
+
+
+def test_business_errors_are_replayed(api):
+    empty = api.create_order(1001, idempotency_key="order-1")
+    assert empty.status_code == 400
+    api.add_to_cart(1001, 1, 1)
+    retry = api.create_order(1001, idempotency_key="order-1")
+    assert retry.status_code == 400
+    assert retry.json() == empty.json()
+    assert api.create_order(1001, idempotency_key="order-2").status_code == 201
+
+
+def test_concurrent_duplicate_orders_create_one_order(api):
+    api.add_to_cart(1001, 1, 1)
+    api.add_to_cart(1001, 3, 2)
+    barrier = threading.Barrier(16)
+
+    def submit(_):
+        barrier.wait()
+        return api.create_order(1001, promotion_id=2, idempotency_key="checkout-42")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(submit, range(16)))
+
+    assert [response.status_code for response in responses] == [201] * 16
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum("idempotent-replayed" in response.headers for response in responses) == 15
+    assert len(ecommerce_api.orders_db) == 1
+    assert ecommerce_api.products_db[1]["stock"] == 49
+    assert ecommerce_api.products_db[3]["stock"] == 98
+
+
+def test_duplicate_waits_for_in_flight_request(api, monkeypatch):
+    api.add_to_cart(1001, 1, 1)
+    started = threading.Event()
+    calls = []
+    commit = ecommerce_api._commit_order
+
+    def slow_commit(order):
+        calls.append(order.user_id)
+        started.set()
+        time.sleep(0.05)
+        return commit(order)
+
+    monkeypatch.setattr(ecommerce_api, "_commit_order", slow_commit)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(api.create_order, 1001, idempotency_key="slow")
+        started.wait(1)
+        second = executor.submit(api.create_order, 1001, idempotency_key="slow")
+        assert second.result().json() == first.result().json()
+    assert calls == [1001]
+
+
+def test_failed_attempt_can_be_retried_with_same_key(api, monkeypatch):
+    api.add_to_cart(1001, 1, 1)
+
+    def broken(order):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ecommerce_api, "_commit_order", broken)
+    with pytest.raises(RuntimeError):
+        api.create_order(1001, idempotency_key="retry-me")
+    monkeypatch.undo()
+    assert api.create_order(1001, idempotency_key="retry-me").status_code == 201
+
+
+def test_idempotency_key_header_over_asgi():
+    token = ecommerce_api.create_access_token({"sub": "user1001"})
+    headers = [("Authorization", f"Bearer {token}"), ("Idempotency-Key", "asgi-1")]
+    assert _asgi_post("/api/cart/1001/items", {"product_id": 2, "quantity": 1}, headers)[0] == 200
+    status_code, _, order = _asgi_post("/api/orders", {"user_id": 1001}, headers)
+    assert status_code == 201
+    replay_status, replay_headers, replay = _asgi_post("/api/orders", {"user_id": 1001}, headers)
+    assert (replay_status, replay) == (201, order)
+    assert replay_headers["idempotent-replayed"] == "true"
+    assert len(ecommerce_api.orders_db) == 1
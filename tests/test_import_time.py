@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_import_does_not_load_diagnostics_modules():
+    # 耗时受负载影响，这里只检查禁止的模块；设置 ECOMMERCE_IMPORT_BUDGET_MS 时同时检查耗时预算
+    result = subprocess.run([sys.executable, os.path.join(ROOT, "benchmarks", "bench_import_time.py"), "--runs", "1"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "imported at module level" not in result.stdout
+
+
+def test_import_has_no_filesystem_side_effects():
+    script = (
+        "import json, os, pathlib, tempfile\n"
+        "calls = []\n"
+        "pathlib.Path.mkdir = lambda self, *args, **kwargs: calls.append(str(self))\n"
+        "os.makedirs = lambda path, *args, **kwargs: calls.append(str(path))\n"
+        "tempfile.mkdtemp = lambda *args, **kwargs: calls.append('mkdtemp')\n"
+        "import api.ecommerce_api\n"
+        "print(json.dumps(calls))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(output.stdout.strip().splitlines()[-1]) == []
+
+
+def test_lifespan_installs_diagnostics_routes():
+    messages = []
+    inbox = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+
+    async def receive():
+        return inbox.pop(0)
+
+    async def send(message):
+        messages.append(message["type"])
+
+    asyncio.run(ecommerce_api.app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, receive, send))
+    assert messages == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    paths = {getattr(route, "path", None) for route in ecommerce_api.app.routes}
+    assert {"/api/tests/run", "/api/admin/lock-profile", "/api/admin/profile", "/test_dashboard"} <= paths
+    # 再次启动不会重复挂载
+    ecommerce_api.install_diagnostics(ecommerce_api.app)
+    assert [route.path for route in ecommerce_api.app.routes if getattr(route, "path", None) == "/api/tests/run"] == [
+        "/api/tests/run",
+    ]
@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from utils.load_generator import LoadConfig, ZipfPicker, percentile, run_load
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def test_offline_load_run_reports_latency_and_passes_checks():
+    report = run_load(LoadConfig(concurrency=4, sessions=40, stock=10, seed=7))
+
+    assert report["sessions"] == 40
+    assert report["checks"]["passed"], report["checks"]
+    assert report["errors"] == {}
+    assert report["status_codes"]["login 200"] == 40
+    latency = report["latency"]["all"]
+    assert latency["count"] == report["requests"]
+    assert latency["p50_ms"] <= latency["p95_ms"] <= latency["p99_ms"] <= latency["max_ms"]
+    # 库存只有 10，订单数不可能超过库存
+    assert sum(item["quantity"] for order in ecommerce_api.orders_db.values() for item in order["items"]) <= 30
+    assert all(product["stock"] >= 0 for product in ecommerce_api.products_db.values())
+
+
+def test_open_model_reports_arrival_delay():
+    report = run_load(LoadConfig(concurrency=2, sessions=10, rate=500, seed=1))
+    assert report["sessions"] == 10
+    assert report["arrival_delay"]["count"] == 10
+    assert report["checks"]["passed"]
+
+
+def test_zipf_picker_skews_towards_first_items():
+    rng = random.Random(0)
+    counts = Counter(ZipfPicker([1, 2, 3, 4], 1.5).pick(rng) for _ in range(2000))
+    assert counts[1] > counts[2] > counts[4]
+    uniform = Counter(ZipfPicker([1, 2], 0).pick(rng) for _ in range(2000))
+    assert abs(uniform[1] - uniform[2]) < 300
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0.0
@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.lock_profiler import SpaceSaving
+from offline_requests import Session
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _session(username: str, password: str) -> Session:
+    session = Session()
+    token = session.post("/api/auth/token", json={"username": username, "password": password}).json()
+    session.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    return session
+
+
+def test_space_saving_keeps_heavy_hitters():
+    table = SpaceSaving(capacity=3)
+    for _ in range(50):
+        table.add("hot", 0.01, 0.001, True)
+    for key in range(100):
+        table.add(key, 0.0001, 0.0001, False)
+
+    assert len(table.entries) == 3
+    assert table.evictions > 0
+    top = table.top()
+    assert top[0]["key"] == "hot"
+    assert top[0]["acquisitions"] == 50
+    assert top[0]["contended"] == 50
+    assert top[0]["error_ms"] == 0
+
+
+def test_profile_records_contended_product_lock():
+    admin = _session("admin", "adminpass")
+    assert admin.post("/api/admin/lock-profile", json={"enabled": True, "capacity": 8}).status_code == 200
+
+    product_lock = ecommerce_api._get_product_lock(1)
+    product_lock.acquire()
+    worker = threading.Thread(target=lambda: ecommerce_api.add_to_cart(
+        1001, ecommerce_api.CartItemAdd(product_id=1, quantity=1),
+        current_user=ecommerce_api.users_db["user1001"],
+    ))
+    worker.start()
+    time.sleep(0.05)
+    product_lock.release()
+    worker.join()
+
+    profile = admin.get("/api/admin/lock-profile", params={"limit": 5}).json()
+    assert profile["enabled"] is True
+    hot = profile["locks"]["product"]["top"][0]
+    assert hot["key"] == 1
+    assert hot["contended"] == 1
+    assert hot["wait_max_ms"] >= 40
+    assert profile["locks"]["global"]["top"][0]["key"] is None
+
+    admin.post("/api/admin/lock-profile", json={"enabled": False})
+    ecommerce_api.add_to_cart(1001, ecommerce_api.CartItemAdd(product_id=1, quantity=1),
+                              current_user=ecommerce_api.users_db["user1001"])
+    stopped = admin.get("/api/admin/lock-profile").json()
+    assert stopped["enabled"] is False
+    assert stopped["locks"]["product"]["top"][0]["acquisitions"] == hot["acquisitions"]
+
+
+def test_lock_profile_requires_admin():
+    user = _session("user1001", "pass1001")
+    assert user.get("/api/admin/lock-profile").status_code == 403
+    assert user.post("/api/admin/lock-profile", json={"enabled": True}).status_code == 403
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.event_stream import EventRing
+from api.low_stock import LowStockMonitor
+from offline_requests import Session
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _session(username: str, password: str) -> Session:
+    session = Session()
+    token = session.post("/api/auth/token", json={"username": username, "password": password}).json()
+    session.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    return session
+
+
+def _parse_sse(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((int(fields["id"]), fields["event"]))
+    return events
+
+
+def test_heap_matches_full_scan_under_random_updates():
+    monitor = LowStockMonitor()
+    rng = random.Random(5)
+    thresholds = {pid: rng.randint(1, 20) for pid in range(200)}
+    available = {pid: rng.randint(0, 40) for pid in thresholds}
+    for pid, threshold in thresholds.items():
+        monitor.set_threshold(pid, threshold, available[pid])
+    for _ in range(5000):
+        pid = rng.randrange(200)
+        available[pid] = rng.randint(0, 40)
+        monitor.update(pid, available[pid])
+
+    expected = sorted((available[pid] - thresholds[pid], pid) for pid in thresholds
+                      if available[pid] < thresholds[pid])
+    assert [(e["available"] - e["threshold"], e["product_id"]) for e in monitor.below()] == expected
+    assert len(monitor.below(limit=3)) == 3
+    # 延迟删除的过期条目会被定期清理
+    assert len(monitor._heap) <= 2 * len(thresholds) + 64
+
+    monitor.clear_threshold(expected[0][1])
+    assert expected[0][1] not in [e["product_id"] for e in monitor.below()]
+
+
+def test_crossings_publish_events_and_ring_reports_gaps():
+    ring = EventRing(capacity=3)
+    monitor = LowStockMonitor(ring)
+    monitor.set_threshold(1, 10, 12)
+    monitor.update(1, 11)
+    monitor.update(1, 9)
+    monitor.update(1, 3)
+    monitor.update(1, 10)
+    assert [(e["seq"], e["type"], e["available"]) for e in ring.read()[0]] == [(1, "low_stock", 9), (2, "restocked", 10)]
+
+    for available in (9, 10, 9, 10):
+        monitor.update(1, available)
+    events, missed = ring.read(since=1)
+    assert missed == 2
+    assert [e["seq"] for e in events] == [4, 5, 6]
+    replay = list(ring.iter_events(since=1, follow=False))
+    assert replay[0] == {"seq": 3, "type": "gap", "missed": 2, "resume_from": 3}
+    assert [e["seq"] for e in replay[1:]] == [4, 5, 6]
+
+
+def test_follow_wakes_up_on_publish():
+    ring = EventRing()
+    received = []
+    stream = ring.iter_events(timeout=5)
+
+    def consume():
+        received.append(next(stream))
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    ring.publish("low_stock", product_id=1)
+    consumer.join(2)
+    assert received[0]["type"] == "low_stock"
+
+
+def test_async_subscribers_do_not_hold_threads():
+    ring = EventRing()
+
+    async def subscribe_all():
+        streams = [ecommerce_api._sse_ring_events(ring, 0, follow=True) for _ in range(100)]
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0.05)
+        # 100 个订阅者都挂起在事件循环上，没有额外的线程
+        assert not any(task.done() for task in pending) and threading.active_count() == threads
+        publisher = threading.Thread(target=ring.publish, args=("low_stock",), kwargs={"product_id": 1})
+        publisher.start()
+        received = await asyncio.wait_for(asyncio.gather(*pending), 2)
+        publisher.join()
+        for stream in streams:
+            await stream.aclose()
+        return received
+
+    threads = threading.active_count()
+    received = asyncio.run(subscribe_all())
+    assert len(received) == 100 and all(text.startswith("id: 1\nevent: low_stock\n") for text in received)
+    assert not ring._waiters
+
+
+def test_low_stock_endpoints_track_cart_and_orders():
+    admin = _session("admin", "adminpass")
+    user = _session("user1001", "pass1001")
+    assert admin.put("/api/admin/low-stock/1", json={"threshold": 45}).json()["low"] is False
+    assert admin.put("/api/admin/low-stock/99", json={"threshold": 5}).status_code == 404
+    assert user.get("/api/admin/low-stock").status_code == 403
+
+    user.post("/api/cart/1001/items", json={"product_id": 1, "quantity": 10})
+    listing = admin.get("/api/admin/low-stock").json()
+    assert listing["products"] == [
+        {"product_id": 1, "available": 40, "threshold": 45, "low": True, "name": "iPhone 15"},
+    ]
+    # 下单只是把预留转为售出，可用库存不变
+    user.post("/api/orders", json={"user_id": 1001})
+    assert admin.get("/api/admin/low-stock").json()["count"] == 1
+
+    admin.put("/api/products/1", json={"name": "iPhone 15", "price": 5999.0, "stock": 100, "category": "电子产品"})
+    assert admin.get("/api/admin/low-stock").json()["count"] == 0
+
+    stream = admin.get("/api/admin/low-stock/events")
+    assert stream.headers["content-type"].startswith("text/event-stream")
+    (first, low), (second, restocked) = _parse_sse(stream.text)
+    assert (low, restocked, second) == ("low_stock", "restocked", first + 1)
+    resumed = admin.get("/api/admin/low-stock/events", headers={"Last-Event-ID": str(first)})
+    assert _parse_sse(resumed.text) == [(second, "restocked")]
+
+    assert admin.delete("/api/admin/low-stock/1").status_code == 200
+    assert admin.delete("/api/admin/low-stock/1").status_code == 404
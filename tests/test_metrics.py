@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.metrics import REGISTRY, InstrumentedLock, MetricsRegistry
+from offline_requests import Session
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _asgi_get(path: str, headers=()):
+    """直接调用 ASGI 应用，经过完整的中间件与路由"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(ecommerce_api.app(scope, receive, send))
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_per_thread_counters_merge_on_scrape():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "jobs", ("kind",))
+    histogram = registry.histogram("job_seconds", "job time", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            counter.inc("a")
+        histogram.observe(0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.value("jobs_total", "a") == 4000
+    text = registry.render_prometheus()
+    assert '# TYPE jobs_total counter' in text
+    assert 'jobs_total{kind="a"} 4000' in text
+    assert 'job_seconds_bucket{le="0.1"} 0' in text
+    assert 'job_seconds_bucket{le="1"} 4' in text
+    assert 'job_seconds_bucket{le="+Inf"} 4' in text
+    assert 'job_seconds_count 4' in text
+
+
+def test_shards_of_finished_threads_are_folded():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "jobs")
+    histogram = registry.histogram("job_seconds", "job time", buckets=(0.1, 1.0))
+
+    def work():
+        counter.inc()
+        histogram.observe(0.5)
+
+    for _ in range(200):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    # 已结束线程的分片并入退役汇总，计数不丢失
+    assert len(registry._shards) <= 1
+    assert registry.value("jobs_total") == 200
+    assert registry.value("job_seconds") == 200
+    assert registry._shards == []
+    counter.inc()
+    assert registry.value("jobs_total") == 201
+
+
+def test_instrumented_lock_records_wait_and_hold():
+    lock = InstrumentedLock("unit-test")
+    with lock:
+        assert lock.locked()
+        # 未获取到锁时不记录
+        assert lock.acquire(blocking=False) is False
+    assert lock.acquire(blocking=False) is True
+    lock.release()
+    assert REGISTRY.value("lock_wait_seconds", "unit-test") == 2
+    assert REGISTRY.value("lock_hold_seconds", "unit-test") == 2
+
+
+def test_middleware_labels_by_route_template():
+    before = REGISTRY.value("http_requests_total", "GET", "/api/products/{product_id}", "401")
+    status, _ = _asgi_get("/api/products/1")
+    assert status == 401
+    status, _ = _asgi_get("/api/products/2")
+    assert REGISTRY.value("http_requests_total", "GET", "/api/products/{product_id}", "401") == before + 2
+
+    status, body = _asgi_get("/api/metrics")
+    assert status == 200
+    text = body.decode()
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/products/{product_id}"}' in text
+    assert 'auth_decode_seconds' in text
+
+
+def test_metrics_endpoint_reports_locks_auth_and_cache():
+    session = Session()
+    token = session.post("/api/auth/token", json={"username": "user1001", "password": "pass1001"}).json()
+    session.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    session.get("/api/products")
+    session.get("/api/products")
+    assert session.post("/api/cart/1001/items", json={"product_id": 1, "quantity": 1}).status_code == 200
+
+    response = Session().get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'lock_wait_seconds_count{lock="global"}' in text
+    assert 'lock_hold_seconds_count{lock="product"}' in text
+    assert 'auth_decode_seconds_count{outcome="ok"}' in text
+    assert 'cache_lookups{cache="product_list",result="hit"} 1' in text
+    assert 'cache_hit_ratio{cache="product_list"} 0.5' in text
@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.order_archive import OrderArchive
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _order(order_id: int, created_at: datetime) -> dict:
+    return {"id": order_id, "user_id": 1001, "items": [], "total": order_id * 10.0, "status": "pending",
+            "created_at": created_at.isoformat()}
+
+
+def test_archive_moves_contiguous_old_orders_into_segments(tmp_path):
+    now = datetime.utcnow()
+    store = {order_id: _order(order_id, now - timedelta(days=2)) for order_id in range(1, 11)}
+    store[9] = _order(9, now)
+    archive = OrderArchive(tmp_path, segment_records=3, cache_segments=2)
+
+    # 遇到较新的订单 9 即停止，订单 10 虽然过期也留在内存里
+    assert archive.archive(store, 10, now - timedelta(days=1)) == 8
+    assert sorted(store) == [9, 10]
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "orders-000001.ndjson.gz", "orders-000002.ndjson.gz", "orders-000003.ndjson.gz",
+    ]
+    assert [archive.get(order_id)["total"] for order_id in range(1, 9)] == [order_id * 10.0 for order_id in range(1, 9)]
+    assert archive.get(9) is None and archive.get(0) is None and archive.get(100) is None
+
+    stats = archive.stats()
+    assert (stats["segments"], stats["archived_orders"], stats["watermark"]) == (3, 8, 8)
+    # 顺序读取每个分段只解压一次，LRU 只保留最近的两个分段
+    assert (stats["cache_misses"], stats["cache_hits"], stats["cached_segments"]) == (3, 5, 2)
+    archive.get(1)
+    assert archive.stats()["cache_misses"] == 4
+
+    store[9]["created_at"] = (now - timedelta(days=2)).isoformat()
+    assert archive.archive(store, 10, now - timedelta(days=1)) == 2
+    assert store == {} and len(archive) == 10
+    archive.clear()
+    assert list(tmp_path.iterdir()) == [] and archive.get(1) is None
+
+
+def test_archived_orders_stay_readable_through_api():
+    admin = ECommerceAPI("http://localhost:8000")
+    admin.authenticate("admin", "adminpass")
+    user = ECommerceAPI("http://localhost:8000")
+    user.authenticate("user1001", "pass1001")
+    user.add_to_cart(1001, 1, 1)
+    first = user.create_order(1001).json()
+    user.add_to_cart(1001, 3, 2)
+    second = user.create_order(1001).json()
+
+    assert user.archive_orders(older_than_seconds=0).status_code == 403
+    # 默认只归档七天前的订单
+    assert admin.archive_orders().json()["archived"] == 0
+    result = admin.archive_orders(older_than_seconds=0).json()
+    assert (result["archived"], result["hot_orders"], result["archived_orders"]) == (2, 0, 2)
+    assert ecommerce_api.orders_db == {}
+
+    assert user.get_order(first["id"]).json() == first
+    assert user.get_order(second["id"]).json() == second
+    other = ECommerceAPI("http://localhost:8000")
+    other.authenticate("user1002", "pass1002")
+    assert other.get_order(first["id"]).status_code == 403
+    assert user.get_order(99).status_code == 404
+
+    user.add_to_cart(1001, 2, 1)
+    third = user.create_order(1001).json()
+    assert [order["id"] for order in admin.export_orders()] == [first["id"], second["id"], third["id"]]
+    assert admin.client.get("/api/admin/orders/archive").json()["hot_orders"] == 1
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.sampling_profiler import SAMPLER, to_collapsed
+from offline_requests import Session
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+def _session(username: str, password: str) -> Session:
+    session = Session()
+    token = session.post("/api/auth/token", json={"username": username, "password": password}).json()
+    session.update_headers({"Authorization": f"Bearer {token['access_token']}"})
+    return session
+
+
+def test_sampler_captures_handlers_auth_and_lock_waits():
+    token = ecommerce_api.create_access_token({"sub": "user1001"})
+    stop = threading.Event()
+
+    def decode_loop():
+        while not stop.is_set():
+            ecommerce_api.decode_access_token(token)
+
+    def blocked_add():
+        ecommerce_api.add_to_cart(1001, ecommerce_api.CartItemAdd(product_id=1, quantity=1),
+                                  current_user=ecommerce_api.users_db["user1001"])
+
+    product_lock = ecommerce_api._get_product_lock(1)
+    product_lock.acquire()
+    threads = [threading.Thread(target=decode_loop), threading.Thread(target=blocked_add)]
+    for thread in threads:
+        thread.start()
+    try:
+        result = SAMPLER.run(0.3, interval=0.005)
+    finally:
+        product_lock.release()
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert result["samples"] > 0
+    collapsed = to_collapsed(result)
+    assert "api.ecommerce_api:decode_access_token" in collapsed
+    assert "api.ecommerce_api:_add_to_cart;api.metrics:InstrumentedLock.acquire;lock-wait:product[1]" in collapsed
+    inclusive = {item["frame"] for item in result["top_inclusive"]}
+    assert "api.ecommerce_api:add_to_cart" in inclusive
+    # 采样线程自身不会出现在结果中
+    assert "api.sampling_profiler" not in collapsed
+
+
+def test_profile_endpoint_formats_and_permissions():
+    admin = _session("admin", "adminpass")
+    response = admin.get("/api/admin/profile", params={"seconds": 0.05, "format": "collapsed"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert isinstance(response.text, str)
+
+    data = admin.get("/api/admin/profile", params={"seconds": 0.05}).json()
+    assert {"samples", "stacks", "top_self", "top_inclusive"} <= set(data)
+
+    user = _session("user1001", "pass1001")
+    assert user.get("/api/admin/profile", params={"seconds": 0.05}).status_code == 403
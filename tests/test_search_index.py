@@ -0,0 +1,98 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.search_index import SearchIndex, query_terms, tokenize
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def admin():
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("admin", "adminpass")
+    return client
+
+
+def _ids(response):
+    return [product["id"] for product in response.json()["products"]]
+
+
+def test_tokenize_mixed_cjk_and_latin():
+    assert tokenize("iPhone 15 Pro 电子产品") == [
+        "iphone", "15", "pro", "电", "子", "产", "品", "电子", "子产", "产品",
+    ]
+    # 全角字符按半角处理
+    assert tokenize("ＡｉｒＰｏｄｓ") == ["airpods"]
+    assert query_terms("iph 电子 a 品") == [("iph", True), ("电子", False), ("a", False), ("品", False)]
+
+
+def test_ranking_prefix_and_incremental_updates():
+    index = SearchIndex()
+    index.rebuild([
+        {"id": 1, "name": "Pro Max", "category": "手机"},
+        {"id": 2, "name": "Projector", "category": "家电"},
+        {"id": 3, "name": "Mini", "category": "手机"},
+    ])
+    # 精确命中排在前缀命中之前
+    total, hits = index.search("pro")
+    assert total == 2
+    assert [product_id for product_id, _ in hits] == [1, 2]
+    assert index.search("手机", category="手机")[0] == 2
+    assert [product_id for product_id, _ in index.search("pro 手机")[1]] == [1]
+
+    index.upsert(3, "Pro Mini", "手机")
+    assert [product_id for product_id, _ in index.search("pro mi")[1]] == [3]
+    assert [product_id for product_id, _ in index.search("pro")[1]] == [1, 3, 2]
+    index.remove(1)
+    index.remove(2)
+    assert [product_id for product_id, _ in index.search("pro")[1]] == [3]
+    assert index.search("projector") == (0, [])
+    assert index.stats()["documents"] == 1
+
+
+def test_search_endpoint_follows_catalog_writes(admin):
+    assert _ids(admin.search_products("pro")) == [2, 3]
+    assert _ids(admin.search_products("iph")) == [1]
+    assert _ids(admin.search_products("电子")) == [1, 2]
+    assert _ids(admin.search_products("pro", category="配件")) == [3]
+    first_page = admin.search_products("pro", limit=1).json()
+    assert (first_page["count"], first_page["total"]) == (1, 2)
+
+    created = admin.create_product("iPad Pro 平板", 6999.0, 10, "电子产品").json()
+    assert _ids(admin.search_products("平板")) == [created["id"]]
+    admin.update_product(created["id"], "Galaxy Tab", 4999.0, 10, "电子产品")
+    assert _ids(admin.search_products("平板")) == []
+    assert _ids(admin.search_products("gal")) == [created["id"]]
+    admin.delete_product(created["id"])
+    assert _ids(admin.search_products("gal")) == []
+
+    # 路由声明在 /api/products/{product_id} 之前
+    route = next(route for route in ecommerce_api.app.routes if getattr(route, "path", "") == "/api/products/search")
+    detail = next(route for route in ecommerce_api.app.routes if getattr(route, "path", "") == "/api/products/{product_id}")
+    assert ecommerce_api.app.routes.index(route) < ecommerce_api.app.routes.index(detail)
+
+
+def test_invalid_query_parameters_are_rejected_like_http(admin):
+    # 与 HTTP 路由的 Query 声明一致：不合法的参数返回 422，而不是抛出异常
+    for endpoint, params in (
+        ("/api/products", {"sort": "name"}),
+        ("/api/products", {"skip": -1}),
+        ("/api/products", {"min_price": "cheap"}),
+        ("/api/products/search", {}),
+        ("/api/products/search", {"q": ""}),
+        ("/api/products/search", {"q": "pro", "limit": 101}),
+    ):
+        assert admin.client.get(endpoint, params=params).status_code == 422, (endpoint, params)
+    expected = sorted(ecommerce_api.products_db.values(), key=lambda product: -product["price"])[:2]
+    assert _ids(admin.client.get("/api/products", params={"sort": "-price", "limit": "2"})) == [
+        product["id"] for product in expected
+    ]
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api import ecommerce_api
+from api.sorted_index import SortedIndex
+from utils.http_client import ECommerceAPI
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    ecommerce_api.reset_state()
+    yield
+
+
+@pytest.fixture
+def admin():
+    client = ECommerceAPI("http://localhost:8000")
+    client.authenticate("admin", "adminpass")
+    return client
+
+
+def _ids(response):
+    assert response.status_code == 200
+    return [product["id"] for product in response.json()["products"]]
+
+
+def test_sorted_index_ranges_and_pages():
+    index = SortedIndex("price")
+    index.rebuild([{"id": pid, "price": price} for pid, price in [(1, 30), (2, 10), (3, 20), (4, 20), (5, 40)]])
+    assert index.range() == (5, [2, 3, 4, 1, 5])
+    assert index.range(20, 30) == (3, [3, 4, 1])
+    assert index.range(20, 30, descending=True) == (3, [1, 4, 3])
+    assert index.range(low=15, skip=1, limit=2) == (4, [4, 1])
+    assert index.range(low=15, descending=True, skip=1, limit=2) == (4, [1, 4])
+    assert index.range(high=15, descending=True, skip=3, limit=2) == (1, [])
+    assert index.range(50, 10) == (0, [])
+
+    index.update(2, 35)
+    index.update(6, 5)
+    index.remove(5)
+    assert index.range() == (5, [6, 3, 4, 1, 2])
+    assert list(index.iter_range(20, 35, descending=True)) == [2, 1, 4, 3]
+
+
+def test_price_range_sorted_report(admin):
+    admin.create_product("USB-C 线", 99.0, 500, "配件")
+    admin.create_product("键盘", 599.0, 5, "配件")
+    assert _ids(admin.get_products(max_price=2000, sort="price")) == [4, 5, 3]
+    assert _ids(admin.get_products(sort="-price", limit=2)) == [2, 1]
+    page = admin.get_products(sort="-price", skip=2, limit=2).json()
+    assert [p["id"] for p in page["products"]] == [3, 5]
+    assert (page["count"], page["total"]) == (2, 5)
+    assert _ids(admin.get_products(category="配件", sort="-price")) == [3, 5, 4]
+    assert _ids(admin.get_products(min_price=500, max_stock=60, sort="price")) == [5, 1, 2]
+
+
+def test_stock_threshold_follows_orders_and_edits(admin):
+    assert _ids(admin.get_products(max_stock=40)) == [2]
+    admin.add_to_cart(1, 1, 15)
+    admin.create_order(1)
+    # 下单扣减库存后，有序索引与列表缓存一起更新
+    assert _ids(admin.get_products(max_stock=40, sort="stock")) == [2, 1]
+    admin.update_product(2, "MacBook Pro", 12999.0, 100, "电子产品")
+    assert _ids(admin.get_products(max_stock=40, sort="stock")) == [1]
+    admin.delete_product(1)
+    assert _ids(admin.get_products(max_stock=40)) == []
+    assert _ids(admin.get_products(min_stock=0, sort="-stock")) == [3, 2]
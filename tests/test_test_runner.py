@@ -0,0 +1,159 @@
+import asyncio
+import os
+import sys
+import textwrap
+import threading
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.coverage_engine import executable_lines
+from api.test_runner import JobLimitError, PytestJob, PytestJobManager, merge_shard_results
+
+SAMPLE_TESTS = textwrap.dedent('''\
+    def test_passes():
+        assert 1 + 1 == 2
+
+
+    def test_fails():
+        assert 1 + 1 == 3
+''')
+
+
+@pytest.fixture(scope="module")
+def job_manager(tmp_path_factory):
+    manager = PytestJobManager(tmp_path_factory.mktemp("coverage"), max_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_streams_progress_and_keeps_result(job_manager, tmp_path):
+    test_file = tmp_path / "test_sample_job.py"
+    test_file.write_text(SAMPLE_TESTS, encoding="utf-8")
+
+    job = job_manager.submit(["-q", "-p", "no:cacheprovider", str(test_file)], collect_coverage=False)
+    events = [event for event in job_manager.iter_events(job.id, timeout=60) if event is not None]
+
+    assert [event["type"] for event in events] == ["collected", "test", "test", "finished"]
+    assert events[0]["total"] == 2
+    assert {event["nodeid"].split("::")[-1]: event["outcome"] for event in events[1:3]} == {
+        "test_passes": "passed",
+        "test_fails": "failed",
+    }
+    result = job_manager.get(job.id).to_dict()
+    assert result["status"] == "failed"
+    assert result["outcomes"] == {"failed": 1, "passed": 1}
+    assert "1 failed, 1 passed" in result["result"]["stdout"]
+    assert (job_manager.coverage_dir / "index.html").exists()
+
+
+def test_resume_from_event_index(job_manager, tmp_path):
+    test_file = tmp_path / "test_sample_resume.py"
+    test_file.write_text(SAMPLE_TESTS, encoding="utf-8")
+    job = job_manager.submit(["-q", "-p", "no:cacheprovider", str(test_file)], collect_coverage=False)
+    all_events = [event for event in job_manager.iter_events(job.id, timeout=60) if event is not None]
+    resumed = list(job_manager.iter_events(job.id, start=2))
+    assert resumed == all_events[2:]
+
+
+def test_parallel_job_merges_shards(job_manager, tmp_path):
+    test_file = tmp_path / "test_sample_parallel.py"
+    test_file.write_text(SAMPLE_TESTS + textwrap.dedent('''
+
+        def test_passes_again():
+            assert True
+
+
+        def test_passes_once_more():
+            assert True
+    '''), encoding="utf-8")
+    job = job_manager.submit(["-q", "-p", "no:cacheprovider", str(test_file)], collect_coverage=False, workers=2)
+    events = [event for event in job_manager.iter_events(job.id, timeout=60) if event is not None]
+
+    assert [event["type"] for event in events].count("collected") == 1
+    assert events[0] == {"type": "collected", "total": 4, "seq": 0}
+    nodeids = [event["nodeid"] for event in events if event["type"] == "test"]
+    assert len(nodeids) == len(set(nodeids)) == 4
+    assert [event["seq"] for event in events] == list(range(len(events)))
+    result = job_manager.get(job.id).to_dict()
+    assert result["workers"] == 2
+    assert result["status"] == "failed"
+    assert result["outcomes"] == {"failed": 1, "passed": 3}
+    assert "shard 1/2" in result["result"]["stdout"] and "shard 2/2" in result["result"]["stdout"]
+
+
+def test_concurrent_jobs_are_rejected(job_manager, tmp_path):
+    test_file = tmp_path / "test_sample_limit.py"
+    test_file.write_text(SAMPLE_TESTS, encoding="utf-8")
+    args = ["-q", "-p", "no:cacheprovider", str(test_file)]
+    job = job_manager.submit(args, collect_coverage=False)
+    with pytest.raises(JobLimitError):
+        job_manager.submit(args, collect_coverage=False)
+    list(job_manager.iter_events(job.id, timeout=60))
+    assert job_manager.get(job.id).finished
+
+
+def test_event_handling_error_fails_job_and_keeps_pump_alive(job_manager, tmp_path, monkeypatch):
+    test_file = tmp_path / "test_sample_report_error.py"
+    test_file.write_text(SAMPLE_TESTS, encoding="utf-8")
+    args = ["-q", "-p", "no:cacheprovider", str(test_file)]
+
+    def broken_report(event, prune=False):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(job_manager, "_write_coverage_index", broken_report)
+    job = job_manager.submit(args, collect_coverage=False)
+    events = [event for event in job_manager.iter_events(job.id, timeout=60) if event is not None]
+    assert events[-1]["status"] == "error"
+    assert "disk full" in job_manager.get(job.id).result["stderr"]
+
+    monkeypatch.undo()
+    job = job_manager.submit(args, collect_coverage=False)
+    list(job_manager.iter_events(job.id, timeout=60))
+    assert job_manager.get(job.id).status == "failed"
+
+
+def test_async_progress_subscribers_do_not_hold_threads(tmp_path):
+    manager = PytestJobManager(tmp_path)
+    job = PytestJob(id="async-job", args=["-q"])
+    manager._jobs[job.id] = job
+
+    async def subscribe_all():
+        streams = [manager.aiter_events(job.id) for _ in range(50)]
+        pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await asyncio.sleep(0.05)
+        # 50 个订阅者都挂起在事件循环上，没有额外的线程
+        assert not any(task.done() for task in pending) and threading.active_count() == threads
+        # 事件由事件线程追加，这里在另一个线程中模拟
+        pump = threading.Thread(target=manager._handle_event, args=(job.id, 0, {"type": "collected", "total": 1}))
+        pump.start()
+        first = await asyncio.wait_for(asyncio.gather(*pending), 2)
+        pump.join()
+        threading.Thread(target=manager._fail, args=(job.id, "stopped")).start()
+        rest = await asyncio.wait_for(asyncio.gather(*[_drain(stream) for stream in streams]), 2)
+        return first, rest
+
+    async def _drain(stream):
+        return [event["type"] async for event in stream if event is not None]
+
+    threads = threading.active_count()
+    first, rest = asyncio.run(subscribe_all())
+    assert [event["type"] for event in first] == ["collected"] * 50
+    assert rest == [["finished"]] * 50
+    assert not manager._waiters and job.status == "error"
+
+
+def test_merge_shard_results_unions_coverage():
+    path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api", "response_cache.py"))
+    executable = sorted(executable_lines(path))
+    half = len(executable) // 2
+
+    def shard(return_code, lines):
+        return {"type": "finished", "return_code": return_code, "stdout": "out", "stderr": "",
+                "coverage_percent": None, "coverage_data": {path: lines}}
+
+    merged = merge_shard_results([shard(0, executable[:half]), shard(5, executable[half:])])
+    assert merged["return_code"] == 0
+    assert merged["coverage_percent"] == 100.0
+    assert merge_shard_results([shard(0, []), shard(1, [])])["return_code"] == 1
+    assert merge_shard_results([shard(5, []), shard(5, [])])["return_code"] == 5
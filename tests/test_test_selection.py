@@ -0,0 +1,166 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.test_selection import diff_lines, plan_run, suite_coverage, update_map
+
+MODULE_SOURCE = textwrap.dedent('''\
+    RATE = 2
+
+
+    def double(x):
+        return x * RATE
+
+
+    def describe(x):
+        if x > 10:
+            return "big"
+        return "small"
+''')
+
+TEST_SOURCE = textwrap.dedent('''\
+    from api.mod import describe, double
+
+
+    def test_double():
+        assert double(2) == 4
+
+
+    def test_describe():
+        assert describe(1) == "small"
+''')
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "api").mkdir()
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "api" / "mod.py").write_text(MODULE_SOURCE, encoding="utf-8")
+    (tmp_path / "tests" / "test_mod.py").write_text(TEST_SOURCE, encoding="utf-8")
+    return tmp_path
+
+
+def _record_run(project, coverage=None, outcomes=None):
+    module = str(project / "api" / "mod.py")
+    coverage = coverage or {
+        "tests/test_mod.py::test_double": {module: [5]},
+        "tests/test_mod.py::test_describe": {module: [9, 11]},
+    }
+    outcomes = outcomes or {nodeid: "passed" for nodeid in coverage}
+    map_path = project / "coverage" / "test_map.json"
+    plan = plan_run(map_path, root=project)
+    update_map(map_path, plan, coverage, outcomes, root=project)
+    return map_path
+
+
+def _edit(project, old, new):
+    path = project / "api" / "mod.py"
+    path.write_text(path.read_text(encoding="utf-8").replace(old, new), encoding="utf-8")
+
+
+def test_first_run_is_full(project):
+    plan = plan_run(project / "coverage" / "test_map.json", root=project)
+    assert plan.nodeids is None
+    assert plan.describe()["mode"] == "full"
+
+
+def test_unchanged_sources_select_nothing(project):
+    map_path = _record_run(project)
+    assert plan_run(map_path, root=project).nodeids == []
+
+
+def test_edit_in_function_body_selects_covering_tests(project):
+    map_path = _record_run(project)
+    _edit(project, 'return "small"', 'return "tiny"')
+    assert plan_run(map_path, root=project).nodeids == ["tests/test_mod.py::test_describe"]
+
+
+def test_edit_in_uncovered_branch_selects_nothing(project):
+    map_path = _record_run(project)
+    _edit(project, 'return "big"', 'return "huge"')
+    assert plan_run(map_path, root=project).nodeids == []
+
+
+def test_module_level_edit_falls_back_to_full_run(project):
+    map_path = _record_run(project)
+    _edit(project, "RATE = 2", "RATE = 3")
+    plan = plan_run(map_path, root=project)
+    assert plan.nodeids is None
+    assert "api/mod.py" in plan.reason
+
+
+def test_edit_to_line_run_only_outside_tests_falls_back_to_full_run(project):
+    map_path = _record_run(project)
+    plan = plan_run(map_path, root=project)
+    module = str(project / "api" / "mod.py")
+    # 第 10 行只在导入阶段执行过，记在默认上下文中，没有用例覆盖
+    update_map(map_path, plan, {
+        "tests/test_mod.py::test_double": {module: [5]},
+        "tests/test_mod.py::test_describe": {module: [9, 11]},
+    }, {}, root=project, coverage={module: [1, 4, 5, 8, 9, 10, 11]})
+    _edit(project, 'return "big"', 'return "huge"')
+    plan = plan_run(map_path, root=project)
+    assert plan.nodeids is None
+    assert "api/mod.py" in plan.reason and "10" in plan.reason
+
+
+def test_new_test_file_falls_back_to_full_run(project):
+    map_path = _record_run(project)
+    (project / "tests" / "test_other.py").write_text("def test_other():\n    pass\n", encoding="utf-8")
+    assert plan_run(map_path, root=project).nodeids is None
+
+
+def test_changed_test_file_and_failed_tests_are_rerun(project):
+    map_path = _record_run(project, outcomes={
+        "tests/test_mod.py::test_double": "failed",
+        "tests/test_mod.py::test_describe": "passed",
+    })
+    assert plan_run(map_path, root=project).nodeids == ["tests/test_mod.py::test_double"]
+
+    test_file = project / "tests" / "test_mod.py"
+    test_file.write_text(TEST_SOURCE + "\n\ndef test_more():\n    assert double(1) == 2\n", encoding="utf-8")
+    assert plan_run(map_path, root=project).nodeids == ["tests/test_mod.py"]
+
+
+def test_incremental_update_remaps_line_numbers(project):
+    module = str(project / "api" / "mod.py")
+    map_path = _record_run(project)
+    _edit(project, "def double(x):\n", "def double(x):\n    x = int(x)\n")
+    plan = plan_run(map_path, root=project)
+    assert plan.nodeids == ["tests/test_mod.py::test_double"]
+
+    data = update_map(map_path, plan, {"tests/test_mod.py::test_double": {module: [5, 6]}},
+                      {"tests/test_mod.py::test_double": "passed"}, root=project)
+    # 未重跑的用例行号随插入的一行整体下移
+    assert data["tests"]["tests/test_mod.py::test_describe"] == {"api/mod.py": [10, 12]}
+    assert data["tests"]["tests/test_mod.py::test_double"] == {"api/mod.py": [5, 6]}
+    assert plan_run(map_path, root=project).nodeids == []
+
+
+def test_incremental_update_merges_suite_coverage(project):
+    module = str(project / "api" / "mod.py")
+    test_file = str(project / "tests" / "test_mod.py")
+    map_path = project / "coverage" / "test_map.json"
+    nodeids = ["tests/test_mod.py::test_double", "tests/test_mod.py::test_describe"]
+    update_map(map_path, plan_run(map_path, root=project),
+               {nodeids[0]: {module: [5]}, nodeids[1]: {module: [9, 11]}}, dict.fromkeys(nodeids, "passed"),
+               root=project, coverage={module: [1, 4, 5, 8, 9, 11], test_file: [1, 4, 5, 8, 9]})
+    _edit(project, "def double(x):\n", "def double(x):\n    x = int(x)\n")
+    plan = plan_run(map_path, root=project)
+    assert plan.nodeids == [nodeids[0]]
+
+    data = update_map(map_path, plan, {nodeids[0]: {module: [5, 6]}}, {nodeids[0]: "passed"}, root=project,
+                      coverage={module: [1, 4, 5, 6], test_file: [1, 4, 5]})
+    # 只重跑了 test_double，test_describe 覆盖过的行换算到新行号后保留
+    assert data["coverage"] == {"api/mod.py": [1, 4, 5, 6, 9, 10, 12], "tests/test_mod.py": [1, 4, 5, 8, 9]}
+    assert suite_coverage(data, project)[module] == [1, 4, 5, 6, 9, 10, 12]
+
+
+def test_diff_lines_reports_changes_and_mapping():
+    changed, inserts, mapping = diff_lines([1, 2, 3, 4], [1, 9, 3, 5, 4])
+    assert changed == {2}
+    assert inserts == [3]
+    assert mapping == {1: 1, 3: 3, 4: 5}
@@ -190,29 +190,143 @@
 4. 提供统一的 HTTP 客户端层，直接调用电商 API
 """
 
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+import json
 import logging
+import logging.handlers
+import queue
+import random
 
 from offline_requests import Session, Response
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 日志由调用方（测试、脚本）自行配置，模块导入时不再调用 basicConfig
 logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时直接丢弃日志，保证请求线程不会因为日志阻塞"""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]", saved_state: Tuple[int, bool]):
+        super().__init__(log_queue)
+        # 切换为队列模式之前 logger 的 (level, propagate)，停止时恢复
+        self.saved_state = saved_state
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 进程内队列无需 pickle，保留原始 msg/args，格式化交给监听线程
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class _ClientLogListener(logging.handlers.QueueListener):
+    """停止时同时卸下客户端 logger 上的队列 handler，并恢复 level 与 propagate"""
+
+    def __init__(self, log_queue, handler: _DroppingQueueHandler, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.queue_handler = handler
+
+    def stop(self) -> None:
+        super().stop()
+        # 已被后一次 enable_async_logging 替换时，logger 的状态由新的监听器负责恢复
+        if self.queue_handler in logger.handlers:
+            logger.removeHandler(self.queue_handler)
+            logger.setLevel(self.queue_handler.saved_state[0])
+            logger.propagate = self.queue_handler.saved_state[1]
+
+
+def enable_async_logging(
+    *handlers: logging.Handler,
+    level: int = logging.INFO,
+    max_queue_size: int = 10000,
+) -> logging.handlers.QueueListener:
+    """
+    将客户端日志切换为队列模式：请求线程只负责把日志记录放入队列，
+    格式化与 I/O 由 QueueListener 的后台线程完成，日志不再阻塞请求路径。
+
+    :param handlers: 实际输出日志的 handler，默认输出到 stderr
+    :param level: 客户端 logger 的日志级别
+    :param max_queue_size: 队列容量，队列满时丢弃新日志而不是阻塞请求
+    :return: 已启动的 QueueListener，调用方负责在结束时 stop()；stop() 会恢复 logger 原来的 level 与 propagate
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue_size)
+    saved_state = (logger.level, logger.propagate)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            if isinstance(handler, _DroppingQueueHandler):
+                # 重复调用时沿用第一次调用之前的状态
+                saved_state = handler.saved_state
+            logger.removeHandler(handler)
+    queue_handler = _DroppingQueueHandler(log_queue, saved_state)
+    listener = _ClientLogListener(log_queue, queue_handler, *(handlers or (logging.StreamHandler(),)))
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+    # 不再向 root logger 传播，避免同一条日志在请求线程里被同步输出
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
+class BatchCall:
+    """批量模式下的占位响应，信封提交后通过 result() 取得真实响应"""
+
+    def __init__(self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None,
+                 json: Optional[Dict[str, Any]] = None):
+        self.method = method
+        self.endpoint = endpoint
+        self.params = params
+        self.json = json
+        self.response: Optional[Response] = None
+
+    def to_item(self) -> Dict[str, Any]:
+        return {"method": self.method, "path": self.endpoint, "params": self.params or {}, "body": self.json}
+
+    def result(self) -> Response:
+        if self.response is None:
+            raise RuntimeError("批量请求尚未提交")
+        return self.response
+
+
+class RequestBatch:
+    """收集中的批量请求，responses 与调用顺序一致"""
+
+    def __init__(self):
+        self.calls: List[BatchCall] = []
+
+    @property
+    def responses(self) -> List[Response]:
+        return [call.result() for call in self.calls]
 
 
 class APIClient:
     """封装的 HTTP 客户端"""
 
-    def __init__(self, base_url: str, timeout: int = 10, auth_token: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: int = 10,
+        auth_token: Optional[str] = None,
+        log_sample_rate: float = 1.0,
+    ):
         """
         初始化 HTTP 客户端，支持默认的 Bearer Token 认证
 
         :param base_url: 服务端基础地址，例如 "http://localhost:8000"
         :param timeout: 超时时间（秒）
         :param auth_token: 默认使用的认证 token，可为空
+        :param log_sample_rate: 请求日志采样率（0~1），1 表示每个请求都记录
         """
         self.base_url = base_url.rstrip("/")  # 清除尾部 '/'
         self.timeout = timeout
+        self.log_sample_rate = log_sample_rate
+        # 非空时处于批量模式，请求只被记录，不会立即发送
+        self._batch: Optional[RequestBatch] = None
         # 使用会话，提高性能，支持 cookie 和 headers 复用
         self.session = Session()
         # 默认请求头（会自动附加在所有请求中）
@@ -233,21 +347,33 @@ class APIClient:
             endpoint = "/" + endpoint
         return endpoint
 
+    def _should_log(self) -> bool:
+        """判断本次请求是否需要记录日志：先检查级别，再按采样率抽样"""
+        if not logger.isEnabledFor(logging.INFO):
+            return False
+        rate = self.log_sample_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
     def _log_request(self, method: str, url: str, **kwargs: Any) -> None:
-        """记录请求基础信息"""
-        logger.info(f"{method.upper()} {url}")
-        if "params" in kwargs and kwargs["params"] is not None:
-            logger.debug(f"Query Params: {kwargs['params']}")
-        if "json" in kwargs and kwargs["json"] is not None:
-            logger.debug(f"Request Body: {kwargs['json']}")
-
-    def _log_response(self, response: Response) -> None:
-        """记录响应"""
-        logger.info(f"Status: {response.status_code}")
-        try:
-            logger.debug(f"Response: {response.json()}")
-        except Exception:
-            logger.debug(f"Response: {response.text}")
+        """记录请求基础信息，参数以 extra 字段传递，格式化推迟到 handler 中"""
+        logger.info(
+            "%s %s", method, url,
+            extra={"http_method": method, "http_url": url},
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            if kwargs.get("params") is not None:
+                logger.debug("Query Params: %s", kwargs["params"])
+            if kwargs.get("json") is not None:
+                logger.debug("Request Body: %s", kwargs["json"])
+
+    def _log_response(self, method: str, url: str, response: Response, read_body: bool = True) -> None:
+        """记录响应，响应体只在 DEBUG 级别开启时才会被读取；流式响应（read_body=False）不读取响应体"""
+        logger.info(
+            "Status: %s", response.status_code,
+            extra={"http_method": method, "http_url": url, "http_status": response.status_code},
+        )
+        if read_body and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response: %s", response.text)
 
     def _build_headers(self, auth_token: Optional[str] = None) -> Dict[str, str]:
         """
@@ -273,14 +399,19 @@ class APIClient:
     ) -> Response:
         """GET 请求"""
         endpoint = self._normalize_endpoint(endpoint)
+        if self._batch is not None:
+            return self._enqueue(BatchCall("GET", endpoint, params=params), auth_token, kwargs)
         url = f"{self.base_url}{endpoint}"
-        self._log_request("GET", url, params=params)
+        should_log = self._should_log()
+        if should_log:
+            self._log_request("GET", url, params=params)
         extra_headers = kwargs.pop("headers", {})
         headers = self._build_headers(auth_token=auth_token)
         headers.update(extra_headers)
 
         response = self.session.get(url, params=params, timeout=self.timeout, headers=headers, **kwargs)
-        self._log_response(response)
+        if should_log:
+            self._log_response("GET", url, response, read_body=not kwargs.get("stream"))
         return response
 
     def post(
@@ -292,14 +423,19 @@ class APIClient:
     ) -> Response:
         """POST 请求"""
         endpoint = self._normalize_endpoint(endpoint)
+        if self._batch is not None:
+            return self._enqueue(BatchCall("POST", endpoint, json=json), auth_token, kwargs)
         url = f"{self.base_url}{endpoint}"
-        self._log_request("POST", url, json=json)
+        should_log = self._should_log()
+        if should_log:
+            self._log_request("POST", url, json=json)
         extra_headers = kwargs.pop("headers", {})
         headers = self._build_headers(auth_token=auth_token)
         headers.update(extra_headers)
 
         response = self.session.post(url, json=json, timeout=self.timeout, headers=headers, **kwargs)
-        self._log_response(response)
+        if should_log:
+            self._log_response("POST", url, response)
         return response
 
     def put(
@@ -311,14 +447,19 @@ class APIClient:
     ) -> Response:
         """PUT 请求"""
         endpoint = self._normalize_endpoint(endpoint)
+        if self._batch is not None:
+            return self._enqueue(BatchCall("PUT", endpoint, json=json), auth_token, kwargs)
         url = f"{self.base_url}{endpoint}"
-        self._log_request("PUT", url, json=json)
+        should_log = self._should_log()
+        if should_log:
+            self._log_request("PUT", url, json=json)
         extra_headers = kwargs.pop("headers", {})
         headers = self._build_headers(auth_token=auth_token)
         headers.update(extra_headers)
 
         response = self.session.put(url, json=json, timeout=self.timeout, headers=headers, **kwargs)
-        self._log_response(response)
+        if should_log:
+            self._log_response("PUT", url, response)
         return response
 
     def delete(
@@ -329,32 +470,155 @@ class APIClient:
     ) -> Response:
         """DELETE 请求"""
         endpoint = self._normalize_endpoint(endpoint)
+        if self._batch is not None:
+            return self._enqueue(BatchCall("DELETE", endpoint), auth_token, kwargs)
         url = f"{self.base_url}{endpoint}"
-        self._log_request("DELETE", url)
+        should_log = self._should_log()
+        if should_log:
+            self._log_request("DELETE", url)
         extra_headers = kwargs.pop("headers", {})
         headers = self._build_headers(auth_token=auth_token)
         headers.update(extra_headers)
 
         response = self.session.delete(url, timeout=self.timeout, headers=headers, **kwargs)
-        self._log_response(response)
+        if should_log:
+            self._log_response("DELETE", url, response)
         return response
 
+    # ========== 批量请求 ==========
+
+    def begin_batch(self) -> RequestBatch:
+        """进入批量模式，之后的请求返回 BatchCall 占位对象"""
+        if self._batch is not None:
+            raise RuntimeError("已经处于批量模式")
+        self._batch = RequestBatch()
+        return self._batch
+
+    def abort_batch(self) -> None:
+        """放弃当前收集的批量请求"""
+        self._batch = None
+
+    def send_batch(self, auth_token: Optional[str] = None) -> RequestBatch:
+        """
+        将收集的请求作为一个信封发送到 /api/batch，并按顺序回填每个 BatchCall
+
+        信封整体只鉴权一次；若信封本身失败（例如 401），每个子请求都会得到同一个失败响应。
+        """
+        batch = self._batch
+        if batch is None:
+            raise RuntimeError("当前不在批量模式")
+        self._batch = None
+        if not batch.calls:
+            return batch
+        envelope = {"requests": [call.to_item() for call in batch.calls]}
+        response = self.post("/api/batch", json=envelope, auth_token=auth_token)
+        if response.status_code != 200:
+            for call in batch.calls:
+                call.response = response
+            return batch
+        for call, item in zip(batch.calls, response.json()["responses"]):
+            call.response = Response(item["status_code"], item["body"])
+        return batch
+
+    def _enqueue(self, call: BatchCall, auth_token: Optional[str], kwargs: Dict[str, Any]) -> BatchCall:
+        if auth_token is not None or kwargs.get("headers"):
+            raise ValueError("批量模式下的子请求共享信封的鉴权，不支持单独设置 token 或请求头")
+        self._batch.calls.append(call)
+        return call
+
     def close(self) -> None:
         """关闭会话"""
         self.session.close()
 
 
+def parse_sse_events(text: str) -> List[Dict[str, Any]]:
+    """解析 SSE 文本中每条消息的 data（JSON），忽略心跳注释"""
+    events = []
+    for block in text.split("\n\n"):
+        data = [line[len("data:"):].strip() for line in block.splitlines() if line.startswith("data:")]
+        if data:
+            events.append(json.loads("\n".join(data)))
+    return events
+
+
+def _idempotency_kwargs(idempotency_key: Optional[str]) -> Dict[str, Any]:
+    """Idempotency-Key 请求头；批量模式不支持单独的请求头，需要幂等时不要放进批量信封"""
+    return {"headers": {"Idempotency-Key": idempotency_key}} if idempotency_key else {}
+
+
 class ECommerceAPI:
     """电商业务 API 客户端（在测试中直接使用这个类）"""
 
-    def __init__(self, base_url: str = "http://localhost:8000", auth_token: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        auth_token: Optional[str] = None,
+        log_sample_rate: float = 1.0,
+        cache_reads: bool = False,
+        cache_size: int = 1024,
+    ):
         """
         初始化电商 API 客户端
 
         :param base_url: 服务基础地址
         :param auth_token: 初始 token（可选），一般在未鉴权时为空
+        :param log_sample_rate: 请求日志采样率，透传给 APIClient
+        :param cache_reads: 是否为商品、促销读接口启用 ETag 缓存，每次请求都会携带 If-None-Match 自动重新验证
+        :param cache_size: ETag 缓存最多保留的响应数量
         """
-        self.client = APIClient(base_url, auth_token=auth_token)
+        self.client = APIClient(base_url, auth_token=auth_token, log_sample_rate=log_sample_rate)
+        # 商品/促销读接口的 ETag 缓存：(endpoint, 查询参数) -> (ETag, 上一次的 200 响应)
+        self.cache_reads = cache_reads
+        self.cache_size = cache_size
+        self._read_cache: "OrderedDict[Tuple[str, Tuple], Tuple[str, Response]]" = OrderedDict()
+
+    # ========== 批量请求 ==========
+
+    @contextmanager
+    def batch(self, auth_token: Optional[str] = None) -> Iterator[RequestBatch]:
+        """
+        批量模式：with 块内的接口调用只被收集，退出时作为一个信封一次发送
+
+            with api.batch() as batch:
+                for product_id in product_ids:
+                    api.get_product(product_id)
+            products = [response.json() for response in batch.responses]
+
+        with 块内各方法返回 BatchCall，提交后可调用 result() 取得各自的响应。
+        """
+        request_batch = self.client.begin_batch()
+        try:
+            yield request_batch
+        except BaseException:
+            self.client.abort_batch()
+            raise
+        self.client.send_batch(auth_token=auth_token)
+
+    def _conditional_get(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        auth_token: Optional[str] = None,
+    ) -> Response:
+        """带 ETag 重新验证的 GET：服务端返回 304 时直接复用上一次的响应"""
+        if not self.cache_reads or self.client._batch is not None:
+            return self.client.get(endpoint, params=params, auth_token=auth_token)
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        cached = self._read_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        response = self.client.get(endpoint, params=params, auth_token=auth_token, headers=headers)
+        if response.status_code == 304 and cached:
+            self._read_cache.move_to_end(key)
+            return cached[1]
+        etag = response.headers.get("etag")
+        if response.status_code == 200 and etag:
+            self._read_cache[key] = (etag, response)
+            self._read_cache.move_to_end(key)
+            if len(self._read_cache) > self.cache_size:
+                self._read_cache.popitem(last=False)
+        else:
+            self._read_cache.pop(key, None)
+        return response
 
     # ========== 鉴权相关 ==========
 
@@ -385,12 +649,46 @@ class ECommerceAPI:
 
     # ========== 商品相关 ==========
 
-    def get_products(self, category: Optional[str] = None, auth_token: Optional[str] = None) -> Response:
-        params = {"category": category} if category else None
-        return self.client.get("/api/products", params=params, auth_token=auth_token)
+    def get_products(
+        self,
+        category: Optional[str] = None,
+        auth_token: Optional[str] = None,
+        *,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_stock: Optional[int] = None,
+        max_stock: Optional[int] = None,
+        sort: Optional[str] = None,
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> Response:
+        """商品列表；价格/库存为闭区间过滤，sort 取 price、-price、stock、-stock"""
+        filters = {
+            "category": category, "min_price": min_price, "max_price": max_price,
+            "min_stock": min_stock, "max_stock": max_stock, "sort": sort, "limit": limit,
+        }
+        params = {key: value for key, value in filters.items() if value is not None and value != ""}
+        if skip:
+            params["skip"] = skip
+        return self._conditional_get("/api/products", params=params or None, auth_token=auth_token)
 
     def get_product(self, product_id: int, auth_token: Optional[str] = None) -> Response:
-        return self.client.get(f"/api/products/{product_id}", auth_token=auth_token)
+        return self._conditional_get(f"/api/products/{product_id}", auth_token=auth_token)
+
+    def search_products(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        auth_token: Optional[str] = None,
+    ) -> Response:
+        params: Dict[str, Any] = {"q": query, "skip": skip}
+        if category:
+            params["category"] = category
+        if limit is not None:
+            params["limit"] = limit
+        return self._conditional_get("/api/products/search", params=params, auth_token=auth_token)
 
     def create_product(
         self,
@@ -439,9 +737,12 @@ class ECommerceAPI:
         product_id: int,
         quantity: int,
         auth_token: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Response:
+        """加购；重试时传入同一个 idempotency_key，服务端返回第一次的结果而不会重复加购"""
         data = {"product_id": product_id, "quantity": quantity}
-        return self.client.post(f"/api/cart/{user_id}/items", json=data, auth_token=auth_token)
+        return self.client.post(f"/api/cart/{user_id}/items", json=data, auth_token=auth_token,
+                                **_idempotency_kwargs(idempotency_key))
 
     def remove_from_cart(self, user_id: int, product_id: int, auth_token: Optional[str] = None) -> Response:
         return self.client.delete(f"/api/cart/{user_id}/items/{product_id}", auth_token=auth_token)
@@ -449,10 +750,10 @@ class ECommerceAPI:
     # ========== 促销相关 ==========
 
     def get_promotions(self, auth_token: Optional[str] = None) -> Response:
-        return self.client.get("/api/promotions", auth_token=auth_token)
+        return self._conditional_get("/api/promotions", auth_token=auth_token)
 
     def get_promotion(self, promotion_id: int, auth_token: Optional[str] = None) -> Response:
-        return self.client.get(f"/api/promotions/{promotion_id}", auth_token=auth_token)
+        return self._conditional_get(f"/api/promotions/{promotion_id}", auth_token=auth_token)
 
     # ========== 订单相关 ==========
 
@@ -461,13 +762,52 @@ class ECommerceAPI:
         user_id: int,
         promotion_id: Optional[int] = None,
         auth_token: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Response:
+        """下单；重试时传入同一个 idempotency_key，服务端返回第一次的结果而不会重复下单"""
         data = {"user_id": user_id, "promotion_id": promotion_id}
-        return self.client.post("/api/orders", json=data, auth_token=auth_token)
+        return self.client.post("/api/orders", json=data, auth_token=auth_token,
+                                **_idempotency_kwargs(idempotency_key))
 
     def get_order(self, order_id: int, auth_token: Optional[str] = None) -> Response:
         return self.client.get(f"/api/orders/{order_id}", auth_token=auth_token)
 
+    def archive_orders(self, older_than_seconds: Optional[int] = None, auth_token: Optional[str] = None) -> Response:
+        """把创建超过 older_than_seconds 秒的订单归档到压缩分段（管理员），归档后 get_order 仍可读取"""
+        return self.client.post("/api/admin/orders/archive", json={"older_than_seconds": older_than_seconds},
+                                auth_token=auth_token)
+
+    # ========== 变更事件 ==========
+
+    def get_change_events(
+        self,
+        since: int = 0,
+        topics: Optional[List[str]] = None,
+        auth_token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """读取 since 之后积压的变更事件（不保持连接），下次用最后一个事件的 seq 续读"""
+        params: Dict[str, Any] = {"since": since, "follow": "false"}
+        if topics:
+            params["topics"] = ",".join(topics)
+        response = self.client.get("/api/events", params=params, auth_token=auth_token)
+        response.raise_for_status()
+        return parse_sse_events(response.text)
+
+    def export_orders(self, gzip: bool = False, auth_token: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """流式导出全部订单，逐条产出；内存占用与订单总数无关"""
+        return self._iter_export("/api/export/orders", gzip, auth_token)
+
+    def export_products(self, gzip: bool = False, auth_token: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """流式导出全部商品，逐条产出"""
+        return self._iter_export("/api/export/products", gzip, auth_token)
+
+    def _iter_export(self, endpoint: str, gzip: bool, auth_token: Optional[str]) -> Iterator[Dict[str, Any]]:
+        params = {"gzip": "true"} if gzip else None
+        response = self.client.get(endpoint, params=params, auth_token=auth_token, stream=True)
+        # 请求在调用时发出，快照时刻即调用时刻；错误状态立即抛出，响应体随迭代逐块读取
+        response.raise_for_status()
+        return (json.loads(line) for line in response.iter_lines() if line)
+
     def close(self) -> None:
         """关闭底层 HTTP 会话"""
         self.client.close()
@@ -0,0 +1,414 @@
+"""
+电商 API 压测工具
+
+模拟真实的购物会话：登录 → 浏览商品列表与详情 → 加购 → 下单（或放弃并移出购物车），
+可以对离线 Session（进程内直接调用接口函数）或运行中的 uvicorn 实例施压。
+
+- 并发：--concurrency 个工作线程；
+- 到达率：指定 --rate 时按泊松过程（每秒 rate 个会话）开放式到达，否则每个线程连续执行会话（封闭模型）；
+- 商品倾斜：按 Zipf 分布挑选商品，--zipf 0 为均匀分布，数值越大热点越集中；
+- 报告：吞吐量、各操作的 p50/p95/p99 延迟、状态码分布，以及超卖/库存守恒/预留一致性检查，输出为 JSON。
+
+运行：
+    python -m utils.load_generator --target offline --sessions 500 --concurrency 8
+    python -m utils.load_generator --target http://localhost:8000 --rate 50 --duration 30 --output load.json
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from bisect import bisect
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.http_client import ECommerceAPI
+
+OFFLINE_TARGET = "offline"
+DEFAULT_USERS = ["user1001:pass1001", "user1002:pass1002", "user1003:pass1003", "user2001:pass2001"]
+
+
+@dataclass
+class LoadConfig:
+    target: str = OFFLINE_TARGET  # "offline" 或服务地址，例如 http://localhost:8000
+    concurrency: int = 8
+    sessions: Optional[int] = 200  # 会话总数上限，None 表示只受 duration 限制
+    duration: Optional[float] = None  # 运行时长上限（秒）
+    rate: Optional[float] = None  # 每秒到达的会话数，None 表示封闭模型
+    zipf: float = 1.1
+    browse_views: int = 3  # 每个会话浏览的商品详情数
+    max_items: int = 2  # 每个会话加购的商品种类上限
+    checkout_ratio: float = 0.7  # 下单的会话比例，其余放弃并移出购物车
+    promotion_ratio: float = 0.5  # 下单时使用促销的比例
+    stock: Optional[int] = None  # 运行前把每个商品的库存重置为该值
+    users: List[str] = field(default_factory=lambda: list(DEFAULT_USERS))  # "用户名:密码"
+    admin: str = "admin:adminpass"
+    seed: Optional[int] = None
+    timeout: float = 10.0
+
+
+class ZipfPicker:
+    """按 Zipf 分布挑选元素：第 k 个元素的权重为 1 / k^s"""
+
+    def __init__(self, items: Sequence[Any], s: float):
+        if not items:
+            raise ValueError("ZipfPicker needs at least one item")
+        self.items = list(items)
+        self._cumulative = list(accumulate(1.0 / (rank ** s) for rank in range(1, len(self.items) + 1)))
+
+    def pick(self, rng: random.Random) -> Any:
+        index = bisect(self._cumulative, rng.random() * self._cumulative[-1])
+        return self.items[min(index, len(self.items) - 1)]
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """最近秩法百分位，输入需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _Recorder:
+    """每个线程各自记录延迟与状态码，结束时汇总，记录路径上没有锁竞争"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[dict] = []
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {"latency": {}, "status": Counter(), "errors": Counter()}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record(self, operation: str, seconds: float, status_code: int) -> None:
+        shard = self._shard()
+        shard["latency"].setdefault(operation, []).append(seconds)
+        shard["status"][f"{operation} {status_code}"] += 1
+
+    def error(self, operation: str, exc: BaseException) -> None:
+        self._shard()["errors"][f"{operation} {type(exc).__name__}"] += 1
+
+    def merged(self) -> Tuple[Dict[str, List[float]], Counter, Counter]:
+        latency: Dict[str, List[float]] = {}
+        status: Counter = Counter()
+        errors: Counter = Counter()
+        with self._lock:
+            for shard in self._shards:
+                for operation, values in shard["latency"].items():
+                    latency.setdefault(operation, []).extend(values)
+                status.update(shard["status"])
+                errors.update(shard["errors"])
+        return latency, status, errors
+
+
+def _latency_summary(values: List[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def _split_account(account: str) -> Tuple[str, str]:
+    username, _, password = account.partition(":")
+    return username, password
+
+
+class LoadGenerator:
+    """按 LoadConfig 运行购物会话并生成报告"""
+
+    def __init__(self, config: LoadConfig):
+        self.config = config
+        self.recorder = _Recorder()
+        self._local = threading.local()
+        self._orders_lock = threading.Lock()
+        self._orders: List[dict] = []
+        self._user_ids: Dict[str, int] = {}
+        self._session_counter = 0
+        self._counter_lock = threading.Lock()
+        self._products: Optional[ZipfPicker] = None
+        self._categories: List[str] = []
+
+    # ---------- 客户端 ----------
+
+    def _new_api(self) -> ECommerceAPI:
+        live = self.config.target != OFFLINE_TARGET
+        api = ECommerceAPI(self.config.target if live else "http://offline", log_sample_rate=0.0)
+        if live:
+            import requests
+
+            session = requests.Session()
+            session.headers.update(api.client.session.headers)
+            api.client.session = session
+        api.client.timeout = self.config.timeout
+        return api
+
+    def _thread_api(self) -> ECommerceAPI:
+        # 每个工作线程复用一个客户端（live 模式下复用 keep-alive 连接）
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._local.api = self._new_api()
+        return api
+
+    def _timed(self, operation: str, call: Callable[[], Any]) -> Optional[Any]:
+        start = time.perf_counter()
+        try:
+            response = call()
+        except Exception as exc:  # 连接错误、401 等都计入错误，不中断压测
+            self.recorder.error(operation, exc)
+            return None
+        self.recorder.record(operation, time.perf_counter() - start, getattr(response, "status_code", 200))
+        return response
+
+    # ---------- 准备与检查 ----------
+
+    def _admin_api(self) -> ECommerceAPI:
+        api = self._new_api()
+        api.authenticate(*_split_account(self.config.admin))
+        return api
+
+    def _snapshot(self, api: ECommerceAPI) -> Dict[int, dict]:
+        response = api.get_products()
+        response.raise_for_status()
+        return {product["id"]: product for product in response.json()["products"]}
+
+    def _prepare(self, admin: ECommerceAPI) -> Dict[int, dict]:
+        products = self._snapshot(admin)
+        if not products:
+            raise RuntimeError("catalog is empty, nothing to load test")
+        if self.config.stock is not None:
+            for product in products.values():
+                admin.update_product(product["id"], product["name"], product["price"], self.config.stock,
+                                     product["category"]).raise_for_status()
+            products = self._snapshot(admin)
+        self._products = ZipfPicker(sorted(products), self.config.zipf)
+        self._categories = sorted({product["category"] for product in products.values()})
+        for account in self.config.users:
+            username, password = _split_account(account)
+            # 先登录一次确认账号可用；user_id 按用户名约定 "user<id>" 解析，无法解析的账号跳过
+            api = self._new_api()
+            api.authenticate(username, password)
+            if username.startswith("user") and username[4:].isdigit():
+                self._user_ids[account] = int(username[4:])
+            api.close()
+        if not self._user_ids:
+            raise RuntimeError("no usable shopper accounts (expected usernames like user1001)")
+        return products
+
+    def _checks(self, admin: ECommerceAPI, before: Dict[int, dict]) -> dict:
+        after = self._snapshot(admin)
+        ordered: Counter = Counter()
+        totals_ok = True
+        for order in self._orders:
+            subtotal = 0.0
+            for item in order["items"]:
+                ordered[item["product_id"]] += item["quantity"]
+                subtotal += item["quantity"] * item["price"]
+            if abs(subtotal - order["subtotal"]) > 1e-6 or abs(order["total"] - max(order["subtotal"] - order["discount"], 0)) > 1e-6:
+                totals_ok = False
+
+        reserved_in_carts: Counter = Counter()
+        for user_id in set(self._user_ids.values()):
+            response = admin.get_cart(user_id)
+            if response.status_code == 200:
+                for item in response.json()["items"]:
+                    reserved_in_carts[item["product_id"]] += item["quantity"]
+
+        oversold = [pid for pid, product in after.items()
+                    if product["stock"] < 0 or not 0 <= product.get("reserved", 0) <= product["stock"]]
+        stock_mismatch = {
+            pid: {"sold": before[pid]["stock"] - product["stock"], "ordered": ordered.get(pid, 0)}
+            for pid, product in after.items()
+            if pid in before and before[pid]["stock"] - product["stock"] != ordered.get(pid, 0)
+        }
+        reserved_mismatch = {
+            pid: {"reserved": product.get("reserved", 0), "in_carts": reserved_in_carts.get(pid, 0)}
+            for pid, product in after.items()
+            if product.get("reserved", 0) != reserved_in_carts.get(pid, 0)
+        }
+        return {
+            "passed": not oversold and not stock_mismatch and not reserved_mismatch and totals_ok,
+            # 库存与预留都不能为负，预留不能超过库存
+            "no_oversell": not oversold,
+            "oversold_products": oversold,
+            # 库存减少量等于本次压测中成功订单的购买量（假设压测期间没有其他写入方）
+            "stock_conserved": not stock_mismatch,
+            "stock_mismatch": stock_mismatch,
+            # 预留量等于压测账号购物车中的数量（假设只有压测账号持有购物车）
+            "reserved_matches_carts": not reserved_mismatch,
+            "reserved_mismatch": reserved_mismatch,
+            "order_totals_consistent": totals_ok,
+        }
+
+    # ---------- 购物会话 ----------
+
+    def _next_session(self) -> Optional[int]:
+        with self._counter_lock:
+            if self.config.sessions is not None and self._session_counter >= self.config.sessions:
+                return None
+            self._session_counter += 1
+            return self._session_counter
+
+    def _shopper_session(self, index: int) -> None:
+        config = self.config
+        rng = random.Random(None if config.seed is None else config.seed * 1_000_003 + index)
+        api = self._thread_api()
+        account = list(self._user_ids)[index % len(self._user_ids)]
+        user_id = self._user_ids[account]
+
+        if self._timed("login", lambda: api.authenticate(*_split_account(account))) is None:
+            return
+        category = rng.choice(self._categories + [None])
+        self._timed("list_products", lambda: api.get_products(category))
+        for _ in range(config.browse_views):
+            product_id = self._products.pick(rng)
+            self._timed("get_product", lambda: api.get_product(product_id))
+
+        added = []
+        for _ in range(rng.randint(1, max(config.max_items, 1))):
+            product_id = self._products.pick(rng)
+            response = self._timed("add_to_cart", lambda: api.add_to_cart(user_id, product_id, 1))
+            if response is not None and response.status_code == 200:
+                added.append(product_id)
+        if not added:
+            return
+
+        if rng.random() < config.checkout_ratio:
+            self._timed("get_cart", lambda: api.get_cart(user_id))
+            promotion_id = rng.choice([1, 2]) if rng.random() < config.promotion_ratio else None
+            response = self._timed("create_order", lambda: api.create_order(user_id, promotion_id))
+            if response is not None and response.status_code == 201:
+                with self._orders_lock:
+                    self._orders.append(response.json())
+                return
+        # 放弃购物车：移出本次加购的商品，释放预留库存（共享账号时可能已被其他会话的订单带走）
+        for product_id in dict.fromkeys(added):
+            self._timed("remove_from_cart", lambda: api.remove_from_cart(user_id, product_id))
+
+    def _closed_worker(self, deadline: Optional[float]) -> None:
+        while deadline is None or time.perf_counter() < deadline:
+            index = self._next_session()
+            if index is None:
+                return
+            self._shopper_session(index)
+
+    def _run_open(self, executor: ThreadPoolExecutor, deadline: Optional[float], delays: List[float]) -> None:
+        rng = random.Random(self.config.seed)
+        futures = []
+        next_arrival = time.perf_counter()
+        while deadline is None or next_arrival < deadline:
+            index = self._next_session()
+            if index is None:
+                break
+            pause = next_arrival - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+
+            def run(index=index, scheduled=next_arrival):
+                # 排队等待空闲线程的时间反映服务端（或压测机）是否已饱和
+                delays.append(time.perf_counter() - scheduled)
+                self._shopper_session(index)
+
+            futures.append(executor.submit(run))
+            next_arrival += rng.expovariate(self.config.rate)
+        for future in futures:
+            future.result()
+
+    def run(self) -> dict:
+        config = self.config
+        admin = self._admin_api()
+        before = self._prepare(admin)
+        delays: List[float] = []
+        started = time.perf_counter()
+        deadline = started + config.duration if config.duration else None
+        with ThreadPoolExecutor(max_workers=config.concurrency, thread_name_prefix="shopper") as executor:
+            if config.rate:
+                self._run_open(executor, deadline, delays)
+            else:
+                for future in [executor.submit(self._closed_worker, deadline) for _ in range(config.concurrency)]:
+                    future.result()
+        elapsed = time.perf_counter() - started
+
+        latency, status, errors = self.recorder.merged()
+        requests_total = sum(len(values) for values in latency.values())
+        report = {
+            "config": {key: value for key, value in asdict(config).items() if key not in ("users", "admin")},
+            "started_at": time.time() - elapsed,
+            "elapsed_s": round(elapsed, 3),
+            "sessions": self._session_counter,
+            "requests": requests_total,
+            "orders": len(self._orders),
+            "throughput": {
+                "sessions_per_s": round(self._session_counter / elapsed, 2) if elapsed else None,
+                "requests_per_s": round(requests_total / elapsed, 2) if elapsed else None,
+            },
+            "latency": {
+                "all": _latency_summary([value for values in latency.values() for value in values]),
+                **{operation: _latency_summary(values) for operation, values in sorted(latency.items())},
+            },
+            "status_codes": dict(sorted(status.items())),
+            "errors": dict(sorted(errors.items())),
+            "checks": self._checks(admin, before),
+        }
+        if config.rate:
+            report["arrival_delay"] = _latency_summary(delays)
+        admin.close()
+        return report
+
+
+def run_load(config: LoadConfig) -> dict:
+    return LoadGenerator(config).run()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default=OFFLINE_TARGET, help='"offline" 或服务地址，例如 http://localhost:8000')
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=None, help="会话总数，默认 200；只指定 --duration 时不限")
+    parser.add_argument("--duration", type=float, default=None)
+    parser.add_argument("--rate", type=float, default=None, help="每秒到达的会话数，不指定时为封闭模型")
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--browse-views", type=int, default=3)
+    parser.add_argument("--max-items", type=int, default=2)
+    parser.add_argument("--checkout-ratio", type=float, default=0.7)
+    parser.add_argument("--promotion-ratio", type=float, default=0.5)
+    parser.add_argument("--stock", type=int, default=None, help="运行前把每个商品的库存重置为该值")
+    parser.add_argument("--user", action="append", dest="users", help='压测账号 "用户名:密码"，可重复')
+    parser.add_argument("--admin", default="admin:adminpass")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="报告输出文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    options = vars(args)
+    output = options.pop("output")
+    if not options["users"]:
+        options.pop("users")
+    if options["sessions"] is None and options["duration"] is None:
+        options["sessions"] = 200
+    report = run_load(LoadConfig(**options))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if report["checks"]["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())